@@ -0,0 +1,111 @@
+"""Recall and latency of the IVF-PQ index against brute-force search.
+
+Run from backend/app, either on synthetic clustered vectors or on an index built by
+RAGChatbot (queries are then perturbed copies of indexed vectors):
+
+    python -m ml.ann_benchmark --vectors 1000000 --dim 384 --nprobe 4,8,16,32,64 --rerank 0,64,256
+    python -m ml.ann_benchmark --index-dir vectorstore/ivfpq --queries 500
+
+Prints JSON with recall@k and p50/p95 query latency for brute force and every
+nprobe/rerank combination.
+"""
+import os
+import json
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+import numpy as np
+
+from ml.ann_index import IVFPQIndex, build_ivfpq_index, brute_force_search, normalize
+
+def synthetic_batches(count, dim, clusters=1000, noise=0.35, batch_size=65536, seed=0):
+    """Gaussian clusters, which resemble embedded text far more than uniform noise does."""
+    rng = np.random.default_rng(seed)
+    centers = normalize(rng.normal(size=(clusters, dim)))
+    for start in range(0, count, batch_size):
+        size = min(batch_size, count - start)
+        vectors = centers[rng.integers(0, clusters, size)] + noise * rng.normal(size=(size, dim)) / np.sqrt(dim)
+        yield [str(i) for i in range(start, start + size)], vectors.astype(np.float32)
+
+def latency_summary(seconds):
+    ms = np.asarray(seconds) * 1000
+    return {"p50_ms": round(float(np.percentile(ms, 50)), 3), "p95_ms": round(float(np.percentile(ms, 95)), 3), "mean_ms": round(float(ms.mean()), 3)}
+
+def run_benchmark(index, queries, k, nprobes, reranks):
+    exact = []
+    timings = []
+    for query in queries:
+        started = time.perf_counter()
+        rows, _ = brute_force_search(index.vectors, query, k)
+        timings.append(time.perf_counter() - started)
+        exact.append(set(rows.tolist()))
+    results = {"brute_force": latency_summary(timings), "ann": []}
+
+    for nprobe in nprobes:
+        for rerank in reranks:
+            hits = 0
+            timings = []
+            for query, truth in zip(queries, exact):
+                started = time.perf_counter()
+                rows, _ = index.search_rows(query, k, nprobe=nprobe, rerank=rerank)
+                timings.append(time.perf_counter() - started)
+                hits += len(truth.intersection(rows.tolist()))
+            entry = {"nprobe": nprobe, "rerank": rerank, f"recall@{k}": round(hits / (k * len(queries)), 4)}
+            entry.update(latency_summary(timings))
+            results["ann"].append(entry)
+            logging.info(f"🔄 nprobe={nprobe} rerank={rerank}: recall@{k}={entry[f'recall@{k}']} p50={entry['p50_ms']}ms")
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the IVF-PQ index against brute-force search")
+    parser.add_argument("--index-dir", help="Benchmark an existing index instead of synthetic vectors")
+    parser.add_argument("--vectors", type=int, default=200000, help="Synthetic vectors to index")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--nlist", type=int, help="Inverted lists (default: 4 * sqrt(vectors))")
+    parser.add_argument("--m", type=int, help="PQ codes per vector (default: dim / 8)")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nprobe", default="1,4,8,16,32,64", help="Comma-separated nprobe values")
+    parser.add_argument("--rerank", default="0,64,256", help="Comma-separated rerank candidate counts")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    build_dir = None
+    try:
+        if args.index_dir:
+            index = IVFPQIndex(args.index_dir)
+        else:
+            build_dir = tempfile.mkdtemp(prefix="ann-benchmark-")
+            started = time.time()
+            build_ivfpq_index(synthetic_batches(args.vectors, args.dim, seed=args.seed), os.path.join(build_dir, "index"), nlist=args.nlist, m=args.m, seed=args.seed)
+            build_seconds = time.time() - started
+            index = IVFPQIndex(os.path.join(build_dir, "index"))
+
+        rng = np.random.default_rng(args.seed + 1)
+        rows = np.sort(rng.choice(index.count, min(args.queries, index.count), replace=False))
+        # Perturbed copies of indexed vectors, so a query is near but not on its nearest neighbour
+        queries = normalize(np.asarray(index.vectors[rows]) + 0.1 * rng.normal(size=(len(rows), index.dim)) / np.sqrt(index.dim))
+
+        report = {"index": index.stats(), "dim": index.dim, "queries": len(queries), "k": args.k}
+        if build_dir:
+            report["build_seconds"] = round(build_seconds, 1)
+        report.update(run_benchmark(
+            index, queries, args.k,
+            [int(value) for value in args.nprobe.split(",")],
+            [int(value) for value in args.rerank.split(",")]
+        ))
+    finally:
+        if build_dir:
+            shutil.rmtree(build_dir, ignore_errors=True)
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+"""Memory-mapped IVF-PQ approximate nearest neighbour index for large chunk collections.
+
+Vectors are L2-normalized, so nearest by L2 distance is also nearest by cosine similarity.
+A coarse k-means quantizer splits them into nlist inverted lists; within each list every
+vector is stored as m one-byte product-quantization codes of its residual. A query scans
+the nprobe closest lists with per-query distance tables, then re-ranks the best rerank
+candidates exactly against the full vectors. nprobe and rerank trade recall for latency.
+
+An index is a directory:
+
+    meta.json          dimensions, list/code parameters and the caller's fingerprint
+    centroids.npy      coarse centroids (nlist x dim)
+    codebooks.npy      PQ codebooks (m x ksub x dim/m)
+    list_offsets.npy   first row of every inverted list, plus the row count
+    vectors.f32        normalized vectors, grouped by list (count x dim float32)
+    codes.u8           PQ codes in the same row order (count x m)
+    ids.bin            UTF-8 ids of the rows, back to back
+    id_offsets.i64     byte offset of every id in ids.bin, plus the total length
+
+The large files are opened with np.memmap, so worker processes serving the same index
+share one copy of its pages through the OS page cache.
+"""
+import os
+import json
+import time
+import shutil
+import logging
+import tempfile
+from contextlib import contextmanager
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: builds are not serialized across processes
+    fcntl = None
+
+INDEX_VERSION = 1
+DEFAULT_NPROBE = 16
+DEFAULT_RERANK = 64
+
+def normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+def assign(x, centroids, chunk_rows=16384):
+    """Index of the nearest centroid for every row of x."""
+    centroid_norms = (centroids ** 2).sum(1)
+    labels = np.empty(len(x), dtype=np.int32)
+    for start in range(0, len(x), chunk_rows):
+        block = np.asarray(x[start:start + chunk_rows], dtype=np.float32)
+        labels[start:start + len(block)] = (centroid_norms - 2 * block @ centroids.T).argmin(1)
+    return labels
+
+def kmeans(x, k, niter=20, seed=0):
+    """Lloyd's k-means; empty clusters are re-seeded with random points."""
+    rng = np.random.default_rng(seed)
+    centroids = x[rng.choice(len(x), k, replace=False)].copy()
+    for _ in range(niter):
+        labels = assign(x, centroids)
+        counts = np.bincount(labels, minlength=k)
+        order = np.argsort(labels, kind="stable")
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        filled = counts > 0
+        centroids[filled] = np.add.reduceat(x[order], starts[filled], axis=0) / counts[filled, None]
+        if not filled.all():
+            centroids[~filled] = x[rng.choice(len(x), int((~filled).sum()))]
+    return centroids
+
+def default_nlist(count):
+    return int(min(65536, max(1, 4 * np.sqrt(count))))
+
+def default_subquantizers(dim):
+    """The most subquantizers that still leaves at least 8 dimensions each."""
+    return next((m for m in range(dim // 8, 0, -1) if dim % m == 0), 1)
+
+def pq_encode(residuals, codebooks):
+    m, _, dsub = codebooks.shape
+    codes = np.empty((len(residuals), m), dtype=np.uint8)
+    for j in range(m):
+        codes[:, j] = assign(residuals[:, j * dsub:(j + 1) * dsub], codebooks[j])
+    return codes
+
+def brute_force_search(vectors, query, k=5, chunk_rows=65536):
+    """Exact top-k rows of vectors by cosine similarity, scanning in chunks. Returns (rows, scores)."""
+    query = normalize(query)
+    best_rows = np.empty(0, dtype=np.int64)
+    best_scores = np.empty(0, dtype=np.float32)
+    for start in range(0, len(vectors), chunk_rows):
+        scores = np.asarray(vectors[start:start + chunk_rows], dtype=np.float32) @ query
+        top = np.argpartition(-scores, min(k, len(scores)) - 1)[:k]
+        best_rows = np.concatenate((best_rows, top + start))
+        best_scores = np.concatenate((best_scores, scores[top]))
+        keep = np.argsort(-best_scores, kind="stable")[:k]
+        best_rows, best_scores = best_rows[keep], best_scores[keep]
+    return best_rows, best_scores
+
+def build_ivfpq_index(batches, index_dir, nlist=None, m=None, niter=20, max_train=200000, fingerprint=None, seed=0):
+    """Builds an index from an iterable of (ids, vectors) batches and swaps it into index_dir.
+
+    Returns the number of indexed vectors. Vectors are streamed to disk first, so only the
+    training sample and one chunk at a time are held in memory. Processes that may build the
+    same index concurrently should hold build_lock(index_dir) around the build.
+    """
+    started = time.time()
+    parent = os.path.dirname(os.path.abspath(index_dir))
+    os.makedirs(parent, exist_ok=True)
+    build_dir = tempfile.mkdtemp(prefix=".ivfpq-build-", dir=parent)
+    try:
+        raw_path = os.path.join(build_dir, "raw.f32")
+        ids = []
+        dim = None
+        with open(raw_path, "wb") as f:
+            for batch_ids, batch_vectors in batches:
+                if not len(batch_ids):
+                    continue
+                batch_vectors = normalize(batch_vectors)
+                dim = dim or batch_vectors.shape[1]
+                batch_vectors.tofile(f)
+                ids.extend(batch_ids)
+        count = len(ids)
+        if not count:
+            raise ValueError("No vectors to index")
+        raw = np.memmap(raw_path, dtype=np.float32, mode="r", shape=(count, dim))
+
+        rng = np.random.default_rng(seed)
+        nlist = min(nlist or default_nlist(count), count)
+        m = m or default_subquantizers(dim)
+        if dim % m:
+            raise ValueError(f"Vector dimension {dim} is not divisible by {m} subquantizers")
+        dsub = dim // m
+        train_rows = np.sort(rng.choice(count, min(count, max_train), replace=False))
+        sample = np.asarray(raw[train_rows])
+        centroids = kmeans(sample, nlist, niter, seed)
+        residuals = sample - centroids[assign(sample, centroids)]
+        ksub = min(256, len(sample))
+        codebooks = np.stack([kmeans(np.ascontiguousarray(residuals[:, j * dsub:(j + 1) * dsub]), ksub, niter, seed) for j in range(m)])
+        del sample, residuals
+
+        # Rows are written grouped by inverted list, so each list is one contiguous range
+        labels = assign(raw, centroids)
+        order = np.argsort(labels, kind="stable")
+        list_offsets = np.concatenate(([0], np.cumsum(np.bincount(labels, minlength=nlist)))).astype(np.int64)
+        id_offsets = np.empty(count + 1, dtype=np.int64)
+        id_offsets[0] = 0
+        with open(os.path.join(build_dir, "vectors.f32"), "wb") as vectors_file, \
+                open(os.path.join(build_dir, "codes.u8"), "wb") as codes_file, \
+                open(os.path.join(build_dir, "ids.bin"), "wb") as ids_file:
+            for start in range(0, count, 65536):
+                rows = order[start:start + 65536]
+                block = np.asarray(raw[rows])
+                block.tofile(vectors_file)
+                pq_encode(block - centroids[labels[rows]], codebooks).tofile(codes_file)
+                for i, row in enumerate(rows, start):
+                    ids_file.write(ids[row].encode("utf-8"))
+                    id_offsets[i + 1] = ids_file.tell()
+        del raw
+        os.remove(raw_path)
+
+        np.save(os.path.join(build_dir, "centroids.npy"), centroids.astype(np.float32))
+        np.save(os.path.join(build_dir, "codebooks.npy"), codebooks.astype(np.float32))
+        np.save(os.path.join(build_dir, "list_offsets.npy"), list_offsets)
+        id_offsets.tofile(os.path.join(build_dir, "id_offsets.i64"))
+        meta = {"version": INDEX_VERSION, "count": count, "dim": dim, "nlist": nlist, "m": m, "ksub": ksub, "fingerprint": fingerprint}
+        with open(os.path.join(build_dir, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2)
+
+        # Swap the finished build in; processes that still map the old files keep reading them
+        if os.path.exists(index_dir):
+            old_dir = tempfile.mkdtemp(prefix=".ivfpq-old-", dir=parent)
+            os.rmdir(old_dir)
+            os.replace(index_dir, old_dir)
+            os.replace(build_dir, index_dir)
+            shutil.rmtree(old_dir, ignore_errors=True)
+        else:
+            os.replace(build_dir, index_dir)
+    except Exception:
+        shutil.rmtree(build_dir, ignore_errors=True)
+        raise
+    logging.info(f"✅ Built IVF-PQ index of {count} vectors ({nlist} lists, {m} codes each) in {time.time() - started:.1f}s.")
+    return count
+
+@contextmanager
+def build_lock(index_dir):
+    """Exclusive lock serializing index builds across processes sharing index_dir."""
+    os.makedirs(os.path.dirname(os.path.abspath(index_dir)), exist_ok=True)
+    with open(os.path.abspath(index_dir) + ".lock", "a") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+def read_meta(index_dir):
+    """The index's meta.json, or None if there is no complete index in index_dir."""
+    try:
+        with open(os.path.join(index_dir, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return meta if meta.get("version") == INDEX_VERSION else None
+
+class IVFPQIndex:
+    """Read-only search over an index directory written by build_ivfpq_index().
+
+    nprobe is the number of inverted lists scanned per query and rerank the number of
+    candidates re-scored exactly; rerank=0 returns the PQ-approximate ranking directly.
+    Both can also be overridden per query.
+    """
+
+    def __init__(self, index_dir, nprobe=DEFAULT_NPROBE, rerank=DEFAULT_RERANK):
+        meta = read_meta(index_dir)
+        if meta is None:
+            raise FileNotFoundError(f"No IVF-PQ index in {index_dir}")
+        self.index_dir = index_dir
+        self.meta = meta
+        self.count = meta["count"]
+        self.dim = meta["dim"]
+        self.nlist = meta["nlist"]
+        self.m = meta["m"]
+        self.nprobe = nprobe
+        self.rerank = rerank
+        self.centroids = np.load(os.path.join(index_dir, "centroids.npy"))
+        self.centroid_norms = (self.centroids ** 2).sum(1)
+        self.codebooks = np.load(os.path.join(index_dir, "codebooks.npy"))
+        self.list_offsets = np.load(os.path.join(index_dir, "list_offsets.npy"))
+        self.vectors = np.memmap(os.path.join(index_dir, "vectors.f32"), dtype=np.float32, mode="r", shape=(self.count, self.dim))
+        self.codes = np.memmap(os.path.join(index_dir, "codes.u8"), dtype=np.uint8, mode="r", shape=(self.count, self.m))
+        self.id_offsets = np.memmap(os.path.join(index_dir, "id_offsets.i64"), dtype=np.int64, mode="r", shape=(self.count + 1,))
+        self.ids = np.memmap(os.path.join(index_dir, "ids.bin"), dtype=np.uint8, mode="r")
+        self._subspaces = np.arange(self.m)
+        logging.info(f"✅ IVF-PQ index loaded: {self.count} vectors, nprobe={nprobe}, rerank={rerank}.")
+
+    def row_id(self, row):
+        return self.ids[self.id_offsets[row]:self.id_offsets[row + 1]].tobytes().decode("utf-8")
+
+    def search_rows(self, query, k=5, nprobe=None, rerank=None):
+        """Top-k (rows, cosine similarities) for one query vector."""
+        query = normalize(query)
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        rerank = self.rerank if rerank is None else rerank
+        coarse = self.centroid_norms - 2 * self.centroids @ query
+        probes = np.argpartition(coarse, nprobe - 1)[:nprobe]
+
+        # Squared distance from the query to every codeword, per subspace and per probed list
+        query_tables = ((self.codebooks - query.reshape(self.m, 1, -1)) ** 2).sum(-1)
+        centroid_terms = 2 * np.einsum("msd,lmd->lms", self.codebooks, self.centroids[probes].reshape(nprobe, self.m, -1))
+        candidate_rows = []
+        candidate_distances = []
+        for probe, list_id in enumerate(probes):
+            start, end = self.list_offsets[list_id], self.list_offsets[list_id + 1]
+            if start == end:
+                continue
+            # ||q - c - r||^2 = ||q - r||^2 + 2<c, r> + const; the constant is shared within the list
+            table = query_tables + centroid_terms[probe]
+            distances = table[self._subspaces, self.codes[start:end]].sum(1) + coarse[list_id]
+            candidate_rows.append(np.arange(start, end))
+            candidate_distances.append(distances)
+        if not candidate_rows:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        rows = np.concatenate(candidate_rows)
+        distances = np.concatenate(candidate_distances)
+
+        keep = max(k, rerank)
+        if len(rows) > keep:
+            top = np.argpartition(distances, keep - 1)[:keep]
+            rows, distances = rows[top], distances[top]
+        if rerank:
+            rows = np.sort(rows)  # Sequential reads from the mapped vectors
+            scores = np.asarray(self.vectors[rows]) @ query
+        else:
+            scores = 1 - distances / 2  # Cosine similarity of unit vectors from their squared distance
+        best = np.argsort(-scores, kind="stable")[:k]
+        return rows[best], scores[best]
+
+    def search(self, query, k=5, nprobe=None, rerank=None):
+        """Top-k (id, cosine similarity) pairs for one query vector."""
+        rows, scores = self.search_rows(query, k, nprobe, rerank)
+        return [(self.row_id(row), float(score)) for row, score in zip(rows, scores)]
+
+    def stats(self):
+        return {"vectors": self.count, "lists": self.nlist, "codes_per_vector": self.m, "nprobe": self.nprobe, "rerank": self.rerank}
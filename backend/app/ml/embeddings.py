@@ -0,0 +1,133 @@
+import time
+import queue
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from sentence_transformers import SentenceTransformer
+from langchain.embeddings.base import Embeddings
+
+class EmbeddingService(Embeddings):
+    """One sentence-embedding model shared by ingestion, the vector store and queries.
+
+    embed_documents() encodes in large batches. embed_query() answers from an LRU cache keyed
+    by normalized query text; misses from concurrent callers are gathered for a few
+    milliseconds and encoded together by a background thread.
+    """
+
+    _STOP = object()
+
+    def __init__(self, model_name, batch_size=128, query_batch_size=32, query_window_ms=5.0, cache_size=4096):
+        self.model_name = model_name
+        self.model = SentenceTransformer(model_name)
+        self.batch_size = batch_size
+        self.query_batch_size = max(1, query_batch_size)
+        self.query_window = max(0.0, query_window_ms) / 1000.0
+        self.cache_size = cache_size
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()  # normalized query -> embedding
+        self._pending = {}  # normalized query -> Future shared by concurrent callers
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._thread = None
+        logging.info(f"✅ Embedding model {model_name} loaded.")
+
+    @staticmethod
+    def normalize(text):
+        return " ".join(text.split()).casefold()
+
+    def embed_documents(self, texts):
+        """Embeds many texts in batches of batch_size."""
+        if not texts:
+            return []
+        return self.model.encode(list(texts), batch_size=self.batch_size, convert_to_numpy=True, show_progress_bar=False).tolist()
+
+    def embed_query(self, text):
+        key = self.normalize(text)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return self._cache[key]
+            self.misses += 1
+            future = self._pending.get(key)
+            if future is None:
+                future = Future()
+                self._pending[key] = future
+                self._start()
+                self._queue.put((key, text, future))
+        return future.result()
+
+    def _start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="query-embedder", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+        if thread is not None and thread.is_alive():
+            self._queue.put(self._STOP)
+            thread.join(timeout=5)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is self._STOP:
+                return
+            batch = [item]
+            stopping = False
+            deadline = time.monotonic() + self.query_window
+            while len(batch) < self.query_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is self._STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._encode_queries(batch)
+            if stopping:
+                return
+
+    def _encode_queries(self, batch):
+        try:
+            vectors = self.model.encode([text for _, text, _ in batch], batch_size=len(batch), convert_to_numpy=True, show_progress_bar=False).tolist()
+        except Exception as e:
+            with self._lock:
+                for key, _, _ in batch:
+                    self._pending.pop(key, None)
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+        with self._lock:
+            for (key, _, _), vector in zip(batch, vectors):
+                self._pending.pop(key, None)
+                self._cache[key] = vector
+                self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        for (_, _, future), vector in zip(batch, vectors):
+            future.set_result(vector)
+
+    def stats(self):
+        with self._lock:
+            return {"cached_queries": len(self._cache), "hits": self.hits, "misses": self.misses, "queued": self._queue.qsize()}
+
+_services = {}
+_services_lock = threading.Lock()
+
+def get_embedding_service(model_name):
+    """Returns the process-wide EmbeddingService for model_name, loading the model on first use."""
+    with _services_lock:
+        service = _services.get(model_name)
+        if service is None:
+            service = EmbeddingService(model_name)
+            _services[model_name] = service
+        return service
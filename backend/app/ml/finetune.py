@@ -0,0 +1,117 @@
+"""Offline fine-tuning job for the RAG chatbot's LLM.
+
+Runs separately from serving, e.g. from backend/app:
+
+    python -m ml.finetune --db-folder db
+
+Each PDF is tokenized once into fixed-length blocks cached on disk, keyed by the file's
+content hash, tokenizer and block size, so re-runs only tokenize new or changed files.
+Trainer checkpoints are written under <output-dir>/checkpoints and an interrupted run
+resumes from the latest one. A finished run is saved as <output-dir>/final-<timestamp>,
+which RAGChatbot picks up the next time it loads its LLM.
+"""
+import os
+import glob
+import time
+import shutil
+import hashlib
+import logging
+import argparse
+import torch
+from datasets import Dataset, concatenate_datasets, load_from_disk
+from langchain.document_loaders import PyPDFLoader
+from transformers import AutoModelForCausalLM, AutoTokenizer, DataCollatorForLanguageModeling, TrainingArguments, Trainer
+from transformers.trainer_utils import get_last_checkpoint
+
+from ml.rag import file_sha256, FINE_TUNED_DIR, FINAL_ARTIFACT_PREFIX
+
+def tokenized_shard(pdf_path, tokenizer, cache_dir, block_size):
+    """Returns the PDF's text as a dataset of block_size-token blocks, tokenizing it only if not cached."""
+    key = hashlib.sha256(f"{file_sha256(pdf_path)}:{tokenizer.name_or_path}:{block_size}".encode("utf-8")).hexdigest()[:32]
+    shard_dir = os.path.join(cache_dir, key)
+    if os.path.exists(os.path.join(shard_dir, "dataset_info.json")):
+        return load_from_disk(shard_dir)
+
+    text = "\n".join(page.page_content for page in PyPDFLoader(pdf_path).load())
+    ids = tokenizer(text, add_special_tokens=False)["input_ids"] + [tokenizer.eos_token_id]
+    # Full blocks only, except for documents shorter than one block
+    blocks = [ids[i:i + block_size] for i in range(0, len(ids) - block_size + 1, block_size)] or [ids]
+    shard = Dataset.from_dict({"input_ids": blocks})
+
+    tmp_dir = shard_dir + ".partial"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    shard.save_to_disk(tmp_dir)
+    os.replace(tmp_dir, shard_dir)
+    logging.info(f"📄 Tokenized {os.path.basename(pdf_path)} into {len(blocks)} blocks.")
+    return load_from_disk(shard_dir)
+
+def fine_tune(db_folder="db", base_model="NousResearch/SOUL-7B-Instruct", output_dir=FINE_TUNED_DIR, cache_dir="./fine_tune_cache",
+              block_size=1024, epochs=3, save_steps=200, restart=False):
+    """Fine-tunes base_model on the PDFs in db_folder and returns the directory of the saved model."""
+    pdf_files = sorted(glob.glob(os.path.join(db_folder, "*.pdf")))
+    if not pdf_files:
+        logging.warning("⚠️ No PDFs found in the db folder!")
+        return None
+
+    tokenizer = AutoTokenizer.from_pretrained(base_model)
+    if tokenizer.pad_token is None:
+        tokenizer.pad_token = tokenizer.eos_token
+    os.makedirs(cache_dir, exist_ok=True)
+    dataset = concatenate_datasets([tokenized_shard(pdf, tokenizer, cache_dir, block_size) for pdf in pdf_files]).shuffle(seed=42)
+    logging.info(f"📄 Training on {len(dataset)} blocks from {len(pdf_files)} PDFs.")
+
+    checkpoint_dir = os.path.join(output_dir, "checkpoints")
+    if restart:
+        shutil.rmtree(checkpoint_dir, ignore_errors=True)
+    last_checkpoint = get_last_checkpoint(checkpoint_dir) if os.path.isdir(checkpoint_dir) else None
+    if last_checkpoint:
+        logging.info(f"🔄 Resuming from {last_checkpoint}")
+
+    # Full-precision master weights; fp16 mixed precision does the speed-up on GPU
+    model = AutoModelForCausalLM.from_pretrained(base_model)
+    training_args = TrainingArguments(
+        output_dir=checkpoint_dir,
+        save_strategy="steps",
+        save_steps=save_steps,
+        save_total_limit=2,
+        per_device_train_batch_size=1,
+        num_train_epochs=epochs,
+        fp16=torch.cuda.is_available(),
+        logging_steps=10,
+        report_to=[]
+    )
+    trainer = Trainer(
+        model=model,
+        args=training_args,
+        train_dataset=dataset,
+        data_collator=DataCollatorForLanguageModeling(tokenizer, mlm=False)
+    )
+    logging.info(f"🔄 Fine-tuning {base_model}...")
+    trainer.train(resume_from_checkpoint=last_checkpoint)
+
+    # Write to a temporary directory first so serving never loads a half-saved model
+    final_dir = os.path.join(output_dir, f"{FINAL_ARTIFACT_PREFIX}{time.strftime('%Y%m%d-%H%M%S')}")
+    tmp_dir = final_dir + ".partial"
+    trainer.save_model(tmp_dir)
+    tokenizer.save_pretrained(tmp_dir)
+    os.replace(tmp_dir, final_dir)
+    # The run is complete, so there is nothing left to resume
+    shutil.rmtree(checkpoint_dir, ignore_errors=True)
+    logging.info(f"✅ Fine-tuning complete! Saved to {final_dir}")
+    return final_dir
+
+def main():
+    parser = argparse.ArgumentParser(description="Fine-tune the RAG chatbot's LLM on the legal PDFs")
+    parser.add_argument("--db-folder", default="db")
+    parser.add_argument("--base-model", default="NousResearch/SOUL-7B-Instruct")
+    parser.add_argument("--output-dir", default=FINE_TUNED_DIR)
+    parser.add_argument("--cache-dir", default="./fine_tune_cache", help="Where tokenized PDF shards are cached")
+    parser.add_argument("--block-size", type=int, default=1024, help="Tokens per training example")
+    parser.add_argument("--epochs", type=float, default=3)
+    parser.add_argument("--save-steps", type=int, default=200, help="Checkpoint interval for resuming")
+    parser.add_argument("--restart", action="store_true", help="Ignore existing checkpoints and start over")
+    args = parser.parse_args()
+    fine_tune(args.db_folder, args.base_model, args.output_dir, args.cache_dir, args.block_size, args.epochs, args.save_steps, args.restart)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+import os
+import re
+import queue
+import hashlib
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from langchain.docstore.document import Document
+from langchain.document_loaders import PyPDFLoader
+from transformers import AutoTokenizer
+
+# Chunk sizes are in tokens of the embedding model, so every chunk fits its input window
+CHUNK_TOKENS = 256
+CHUNK_OVERLAP = 32
+WRITE_BATCH_SIZE = 256
+
+_worker_tokenizer = None
+
+def _init_worker(tokenizer_name):
+    global _worker_tokenizer
+    _worker_tokenizer = AutoTokenizer.from_pretrained(tokenizer_name)
+
+def normalize_line(line):
+    # Digits are masked so "Page 3 of 40" and "Page 4 of 40" count as the same line
+    return re.sub(r"\d+", "#", " ".join(line.split()).lower())
+
+def strip_repeated_lines(pages, min_pages=3, min_fraction=0.5, max_words=15):
+    """Removes lines that recur on most pages of a document: running headers, footers, page numbers."""
+    if len(pages) < min_pages:
+        return pages
+    counts = {}
+    for text in pages:
+        # Running headers and footers are short; long lines are always kept
+        for line in {normalize_line(line) for line in text.splitlines() if 0 < len(line.split()) <= max_words}:
+            counts[line] = counts.get(line, 0) + 1
+    threshold = max(2, min_fraction * len(pages))
+    repeated = {line for line, count in counts.items() if count >= threshold}
+    if not repeated:
+        return pages
+    return ["\n".join(line for line in text.splitlines() if normalize_line(line) not in repeated) for text in pages]
+
+def chunk_pages(pages, tokenizer, chunk_tokens=CHUNK_TOKENS, overlap=CHUNK_OVERLAP):
+    """Splits a document into overlapping windows of chunk_tokens tokens.
+
+    Windows run across page boundaries, so short pages are merged instead of being embedded
+    alone. Each chunk keeps the original text and the number of the page it starts on.
+    Identical chunks within the document are kept once.
+    """
+    spans = []  # (page index, start char, end char) of every token
+    for page_index, text in enumerate(pages):
+        offsets = tokenizer(text, add_special_tokens=False, return_offsets_mapping=True, verbose=False)["offset_mapping"]
+        spans.extend((page_index, start, end) for start, end in offsets)
+
+    chunks = []
+    seen = set()
+    step = max(1, chunk_tokens - overlap)
+    for first in range(0, len(spans), step):
+        window = spans[first:first + chunk_tokens]
+        parts = []
+        part_start = 0
+        for i in range(1, len(window) + 1):
+            if i == len(window) or window[i][0] != window[part_start][0]:
+                page_index = window[part_start][0]
+                parts.append(pages[page_index][window[part_start][1]:window[i - 1][2]])
+                part_start = i
+        text = "\n".join(parts)
+        key = hashlib.sha1(" ".join(text.split()).lower().encode("utf-8")).hexdigest()
+        if key not in seen:
+            seen.add(key)
+            chunks.append((window[0][0], text))
+        if first + chunk_tokens >= len(spans):
+            break
+    return chunks
+
+def parse_and_chunk(source, pdf_path, chunk_tokens=CHUNK_TOKENS, overlap=CHUNK_OVERLAP):
+    """Runs in a worker process: extracts a PDF's pages and chunks them."""
+    documents = PyPDFLoader(pdf_path).load()
+    page_numbers = [document.metadata.get("page", i) for i, document in enumerate(documents)]
+    pages = strip_repeated_lines([document.page_content for document in documents])
+    chunks = [(page_numbers[page_index], text) for page_index, text in chunk_pages(pages, _worker_tokenizer, chunk_tokens, overlap)]
+    return {"source": source, "pages": len(documents), "chunks": chunks}
+
+class IngestionPipeline:
+    """Streams PDFs through parallel parsing and chunking into batched vector store writes.
+
+    A process pool parses and chunks up to max_pending files at a time. Finished files go
+    through a bounded queue to a writer thread that embeds and adds chunks in batches of
+    write_batch_size, so parsing of the next files overlaps with embedding of the last ones
+    and memory stays bounded however many files there are.
+    """
+
+    def __init__(self, vectorstore, tokenizer_name, workers=None, chunk_tokens=CHUNK_TOKENS, chunk_overlap=CHUNK_OVERLAP, write_batch_size=WRITE_BATCH_SIZE):
+        self.vectorstore = vectorstore
+        self.tokenizer_name = tokenizer_name
+        self.workers = workers or max(1, (os.cpu_count() or 2) - 1)
+        self.chunk_tokens = chunk_tokens
+        self.chunk_overlap = chunk_overlap
+        self.write_batch_size = write_batch_size
+        self.max_pending = self.workers * 2
+
+    def run(self, files, before_write, on_file_done):
+        """Ingests (source, pdf_path) pairs.
+
+        before_write(source) is called before a file's first chunk is written, and
+        on_file_done(result) once all of its chunks are in the vector store. Files that fail
+        to parse are logged and skipped; write errors stop the run and are raised.
+        """
+        results = queue.Queue(maxsize=self.max_pending)
+        errors = []
+        # Workers are spawned, not forked, and the pool exists before the writer thread starts: this
+        # process already runs the embedding model's torch threads, and a forked child can deadlock
+        # on a lock one of them held
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=self.workers, mp_context=context, initializer=_init_worker, initargs=(self.tokenizer_name,)) as pool:
+            writer = threading.Thread(target=self._write, args=(results, before_write, on_file_done, errors), name="ingest-writer", daemon=True)
+            writer.start()
+            try:
+                remaining = iter(files)
+                pending = {}
+
+                def submit_next():
+                    for source, pdf_path in remaining:
+                        future = pool.submit(parse_and_chunk, source, pdf_path, self.chunk_tokens, self.chunk_overlap)
+                        pending[future] = source
+                        return
+
+                for _ in range(self.max_pending):
+                    submit_next()
+                while pending and not errors:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        source = pending.pop(future)
+                        try:
+                            result = future.result()
+                        except Exception as e:
+                            logging.error(f"❌ Error parsing {source}: {e}")
+                        else:
+                            # Blocks while the writer is behind, which holds back further parsing
+                            results.put(result)
+                        submit_next()
+                for future in pending:
+                    future.cancel()
+            finally:
+                results.put(None)
+                writer.join()
+        if errors:
+            raise errors[0]
+
+    def _write(self, results, before_write, on_file_done, errors):
+        buffer = []
+        waiting = {}  # source -> [chunks not yet written, parse result]
+        while True:
+            result = results.get()
+            if result is None:
+                break
+            if errors:
+                continue  # Keep draining so the producer never blocks
+            try:
+                source = result["source"]
+                before_write(source)
+                if not result["chunks"]:
+                    on_file_done(result)
+                    continue
+                waiting[source] = [len(result["chunks"]), result]
+                buffer.extend(
+                    Document(page_content=text, metadata={"source": source, "page": page, "chunk": i})
+                    for i, (page, text) in enumerate(result["chunks"])
+                )
+                while len(buffer) >= self.write_batch_size:
+                    self._flush(buffer[:self.write_batch_size], waiting, on_file_done)
+                    del buffer[:self.write_batch_size]
+            except Exception as e:
+                errors.append(e)
+        if buffer and not errors:
+            try:
+                self._flush(buffer, waiting, on_file_done)
+            except Exception as e:
+                errors.append(e)
+
+    def _flush(self, documents, waiting, on_file_done):
+        ids = [f"{document.metadata['source']}:{document.metadata['chunk']}" for document in documents]
+        self.vectorstore.add_documents(documents, ids=ids)
+        for document in documents:
+            entry = waiting[document.metadata["source"]]
+            entry[0] -= 1
+            if entry[0] == 0:
+                del waiting[document.metadata["source"]]
+                on_file_done(entry[1])
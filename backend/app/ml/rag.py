@@ -1,91 +1,240 @@
 import os
 import glob
+import json
+import hashlib
 import logging
+import threading
 import chromadb
 import numpy as np
 import torch
-from sentence_transformers import SentenceTransformer
 from langchain.llms import HuggingFacePipeline
 from langchain.vectorstores import Chroma
-from langchain.embeddings import HuggingFaceEmbeddings
-from langchain.document_loaders import PyPDFLoader
 from langchain.chains import RetrievalQA
-from transformers import AutoModelForCausalLM, AutoTokenizer, TrainingArguments, Trainer
-from datasets import load_dataset
+from transformers import AutoModelForCausalLM, AutoTokenizer
+
+from ml.embeddings import get_embedding_service
+from ml.ingest import IngestionPipeline, CHUNK_TOKENS, CHUNK_OVERLAP
+from ml.ann_index import IVFPQIndex, build_ivfpq_index, build_lock, read_meta, DEFAULT_NPROBE, DEFAULT_RERANK
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# Persistent vector index: the manifest records which version of each PDF is embedded in the Chroma collection
+COLLECTION_NAME = "legal_documents"
+MANIFEST_FILE = "manifest.json"
+MANIFEST_VERSION = 2
+
+# "chroma" searches the Chroma collection itself; "ivfpq" searches a memory-mapped IVF-PQ index built from it
+VECTOR_INDEXES = ("chroma", "ivfpq")
+ANN_INDEX_DIR = "ivfpq"
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    """Content hash of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+# Fine-tuned weights are produced offline by ml/finetune.py; each finished run is saved as <dir>/final-<timestamp>
+FINE_TUNED_DIR = "./fine_tuned_soul7b"
+FINAL_ARTIFACT_PREFIX = "final-"
+
+def find_latest_artifacts(fine_tuned_dir=FINE_TUNED_DIR):
+    """Returns the newest complete fine-tuned model directory, or None if there is none."""
+    if not os.path.isdir(fine_tuned_dir):
+        return None
+    candidates = [
+        os.path.join(fine_tuned_dir, name) for name in os.listdir(fine_tuned_dir)
+        if name.startswith(FINAL_ARTIFACT_PREFIX) and not name.endswith(".partial")
+    ]
+    # Models saved straight into the directory by earlier versions
+    candidates.append(fine_tuned_dir)
+    candidates = [path for path in candidates if os.path.exists(os.path.join(path, "config.json"))]
+    if not candidates:
+        return None
+    return max(candidates, key=lambda path: os.path.getmtime(os.path.join(path, "config.json")))
+
 class RAGChatbot:
-    def __init__(self, db_folder="db", model_name="sentence-transformers/all-MiniLM-L6-v2", llm_name="NousResearch/SOUL-7B-Instruct"):
-        """Initialize the RAG system with embedding model, ChromaDB, and fine-tuned LLM."""
+    def __init__(self, db_folder="db", model_name="sentence-transformers/all-MiniLM-L6-v2", llm_name="NousResearch/SOUL-7B-Instruct", persist_directory="./vectorstore", fine_tuned_dir=FINE_TUNED_DIR,
+                 vector_index="chroma", ann_nprobe=DEFAULT_NPROBE, ann_rerank=DEFAULT_RERANK):
+        """Initialize the RAG system with embedding model and ChromaDB; the LLM loads on first use.
+        
+        vector_index="ivfpq" answers queries from an approximate index for large corpora; ann_nprobe
+        and ann_rerank trade its recall for latency.
+        """
+        if vector_index not in VECTOR_INDEXES:
+            raise ValueError(f"Unknown vector index {vector_index!r}, expected one of {VECTOR_INDEXES}")
         self.db_folder = db_folder
-        self.embedding_model = SentenceTransformer(model_name)
+        self.persist_directory = persist_directory
+        # Shared with every other user of this model in the process: ingestion, the vector store and queries
+        self.embedding_model_name = model_name
+        self.embeddings = get_embedding_service(model_name)
+        self.embedding_model = self.embeddings.model
         self.vectorstore = None
         self.retriever = None
+        self.vector_index = vector_index
+        self.ann_nprobe = ann_nprobe
+        self.ann_rerank = ann_rerank
+        self.ann_index = None
         self.llm_name = llm_name
-        try:
-            self.tokenizer = AutoTokenizer.from_pretrained(self.llm_name)
-            self.model = AutoModelForCausalLM.from_pretrained(self.llm_name, torch_dtype=torch.float16, device_map="auto")
-            self.llm = HuggingFacePipeline(model=self.model, tokenizer=self.tokenizer)
-            logging.info("✅ LLM model initialized successfully.")
-        except Exception as e:
-            logging.error(f"❌ Failed to load LLM model: {e}")
-            raise e
+        self.fine_tuned_dir = fine_tuned_dir
+        self.tokenizer = None
+        self.model = None
+        self.llm = None
+        self._llm_lock = threading.Lock()
         
         self._initialize_vectorstore()
-        self._fine_tune_model()
 
     def _initialize_vectorstore(self):
-        """Loads PDFs, creates document embeddings, and stores them in ChromaDB."""
-        documents = []
-        pdf_files = glob.glob(os.path.join(self.db_folder, "*.pdf"))
+        """Syncs the persistent ChromaDB index with the PDFs in db_folder, embedding only new or changed files."""
+        # Chunks must fit the embedding model's input window, less its two special tokens
+        chunk_tokens = min(CHUNK_TOKENS, self.embedding_model.max_seq_length - 2)
+        chunking = {"tokens": chunk_tokens, "overlap": CHUNK_OVERLAP}
+        pdf_files = sorted(glob.glob(os.path.join(self.db_folder, "*.pdf")))
         
         if not pdf_files:
             logging.warning("⚠️ No PDFs found in the db folder!")
-            return
         
         try:
+            self.vectorstore = self._open_collection()
+            manifest = self._load_manifest()
+            if (manifest.get("version") != MANIFEST_VERSION or manifest.get("embedding_model") != self.embedding_model_name
+                    or manifest.get("chunking") != chunking):
+                # Vectors from another embedding model or chunking (or an unknown state) can't be reused
+                logging.info("🔄 Building the vector index from scratch.")
+                self.vectorstore.delete_collection()
+                self.vectorstore = self._open_collection()
+                manifest = {"version": MANIFEST_VERSION, "embedding_model": self.embedding_model_name, "chunking": chunking, "files": {}}
+            indexed = manifest["files"]
+            
+            changed = {}
+            unchanged = 0
             for pdf_path in pdf_files:
-                loader = PyPDFLoader(pdf_path)
-                documents.extend(loader.load())
+                source = os.path.relpath(pdf_path, self.db_folder)
+                stat = os.stat(pdf_path)
+                entry = indexed.get(source)
+                if entry and entry["mtime"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+                    unchanged += 1
+                    continue
+                digest = file_sha256(pdf_path)
+                if entry and entry["sha256"] == digest:
+                    # Touched but not modified: just remember the new mtime
+                    entry.update(mtime=stat.st_mtime_ns, size=stat.st_size)
+                    unchanged += 1
+                    continue
+                changed[source] = (pdf_path, digest, stat)
             
-            logging.info(f"📄 Loaded {len(documents)} pages from {len(pdf_files)} PDFs.")
+            current = {os.path.relpath(pdf_path, self.db_folder) for pdf_path in pdf_files}
+            removed = [source for source in indexed if source not in current]
+            for source in removed:
+                self._delete_source(source)
+                del indexed[source]
+            self._save_manifest(manifest)
             
-            embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
-            self.vectorstore = Chroma.from_documents(documents, embeddings)
+            def on_file_done(result):
+                source = result["source"]
+                _, digest, stat = changed[source]
+                indexed[source] = {"sha256": digest, "mtime": stat.st_mtime_ns, "size": stat.st_size, "pages": result["pages"], "chunks": len(result["chunks"])}
+                # Saved after every file so an interrupted sync resumes where it stopped
+                self._save_manifest(manifest)
+                logging.info(f"📄 Embedded {len(result['chunks'])} chunks from {result['pages']} pages of {source}.")
+            
+            if changed:
+                pipeline = IngestionPipeline(self.vectorstore, self.embedding_model_name, chunk_tokens=chunk_tokens, chunk_overlap=CHUNK_OVERLAP)
+                # before_write also clears vectors left behind by an interrupted run
+                pipeline.run([(source, pdf_path) for source, (pdf_path, _, _) in changed.items()], self._delete_source, on_file_done)
+            
+            if hasattr(self.vectorstore, "persist"):
+                self.vectorstore.persist()
+            if self.vector_index == "ivfpq":
+                self._sync_ann_index(manifest)
             self.retriever = self.vectorstore.as_retriever()
-            logging.info("✅ Vector database initialized!")
+            logging.info(f"✅ Vector database initialized! {len(changed)} new or changed, {len(removed)} removed, {unchanged} unchanged PDFs.")
         except Exception as e:
             logging.error(f"❌ Error initializing vectorstore: {e}")
             raise e
     
-    def _fine_tune_model(self):
-        """Fine-tunes the SOUL-7B-Instruct model using PDF data."""
+    def _open_collection(self, path=None):
+        return Chroma(
+            collection_name=COLLECTION_NAME,
+            embedding_function=self.embeddings,
+            persist_directory=path or self.persist_directory
+        )
+    
+    def _delete_source(self, source):
+        """Removes every vector embedded from one PDF."""
+        ids = self.vectorstore.get(where={"source": source}, include=[])["ids"]
+        if ids:
+            self.vectorstore.delete(ids=ids)
+    
+    def _sync_ann_index(self, manifest, path=None):
+        """Opens the IVF-PQ index, rebuilding it from the Chroma collection if the indexed PDFs changed since it was built."""
+        index_dir = os.path.join(path or self.persist_directory, ANN_INDEX_DIR)
+        fingerprint = hashlib.sha256(json.dumps({
+            "embedding_model": manifest.get("embedding_model"),
+            "chunking": manifest.get("chunking"),
+            "files": {source: entry["sha256"] for source, entry in manifest.get("files", {}).items()}
+        }, sort_keys=True).encode("utf-8")).hexdigest()
+        def is_current():
+            meta = read_meta(index_dir)
+            return meta is not None and meta.get("fingerprint") == fingerprint
+        
+        if not is_current():
+            if not self.vectorstore.get(limit=1, include=[])["ids"]:
+                logging.warning("⚠️ The vector database is empty; not building an IVF-PQ index.")
+                self.ann_index = None
+                return
+            with build_lock(index_dir):
+                # Another worker may have built it while this one waited for the lock
+                if not is_current():
+                    logging.info("🔄 Building the IVF-PQ index.")
+                    build_ivfpq_index(self._iter_embeddings(), index_dir, fingerprint=fingerprint)
+        self.ann_index = IVFPQIndex(index_dir, nprobe=self.ann_nprobe, rerank=self.ann_rerank)
+    
+    def _iter_embeddings(self, batch_size=4096):
+        """Pages (ids, embeddings) out of the Chroma collection."""
+        offset = 0
+        while True:
+            batch = self.vectorstore.get(include=["embeddings"], limit=batch_size, offset=offset)
+            if not batch["ids"]:
+                return
+            yield batch["ids"], batch["embeddings"]
+            offset += len(batch["ids"])
+    
+    def _load_manifest(self, path=None):
+        manifest_path = os.path.join(path or self.persist_directory, MANIFEST_FILE)
+        if not os.path.exists(manifest_path):
+            return {}
         try:
-            dataset = load_dataset("text", data_files={"train": [os.path.join(self.db_folder, pdf) for pdf in os.listdir(self.db_folder) if pdf.endswith(".pdf")]})
-            training_args = TrainingArguments(
-                output_dir="./fine_tuned_soul7b",
-                evaluation_strategy="epoch",
-                save_strategy="epoch",
-                per_device_train_batch_size=1,
-                per_device_eval_batch_size=1,
-                num_train_epochs=3,
-                fp16=True
-            )
-            trainer = Trainer(
-                model=self.model,
-                args=training_args,
-                train_dataset=dataset["train"]
-            )
-            logging.info("🔄 Fine-tuning SOUL-7B-Instruct...")
-            trainer.train()
-            self.model.save_pretrained("./fine_tuned_soul7b")
-            self.tokenizer.save_pretrained("./fine_tuned_soul7b")
-            logging.info("✅ Fine-tuning complete!")
-        except Exception as e:
-            logging.error(f"❌ Error during fine-tuning: {e}")
-            raise e
+            with open(manifest_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logging.warning(f"⚠️ Unreadable vector index manifest, rebuilding: {e}")
+            return {}
+    
+    def _save_manifest(self, manifest):
+        os.makedirs(self.persist_directory, exist_ok=True)
+        manifest_path = os.path.join(self.persist_directory, MANIFEST_FILE)
+        tmp_path = manifest_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, manifest_path)
+    
+    def _load_llm(self):
+        """Loads the newest fine-tuned model (or the base model if none has been trained) on first use."""
+        with self._llm_lock:
+            if self.llm is None:
+                model_path = find_latest_artifacts(self.fine_tuned_dir) or self.llm_name
+                try:
+                    self.tokenizer = AutoTokenizer.from_pretrained(model_path)
+                    self.model = AutoModelForCausalLM.from_pretrained(model_path, torch_dtype=torch.float16, device_map="auto")
+                    self.llm = HuggingFacePipeline(model=self.model, tokenizer=self.tokenizer)
+                    logging.info(f"✅ LLM model initialized successfully from {model_path}.")
+                except Exception as e:
+                    logging.error(f"❌ Failed to load LLM model: {e}")
+                    raise e
+        return self.llm
     
     def retrieve_documents(self, query, top_k=5):
         """Retrieve top-k most relevant documents for a query."""
@@ -94,6 +243,11 @@ class RAGChatbot:
             return []
         
         try:
+            if self.ann_index is not None:
+                ids = [doc_id for doc_id, _ in self.ann_index.search(self.embeddings.embed_query(query), k=top_k)]
+                found = self.vectorstore.get(ids=ids, include=["documents"])
+                texts = dict(zip(found["ids"], found["documents"]))
+                return [texts[doc_id] for doc_id in ids if doc_id in texts]
             docs = self.retriever.get_relevant_documents(query, top_k=top_k)
             return [doc.page_content for doc in docs]
         except Exception as e:
@@ -111,25 +265,29 @@ class RAGChatbot:
         final_prompt = f"Context:\n{context}\n\nUser Query: {query}\n\nAnswer:"
         
         try:
-            return self.llm(final_prompt)
+            return self._load_llm()(final_prompt)
         except Exception as e:
             logging.error(f"❌ Error generating response: {e}")
             return "I'm sorry, an error occurred while generating a response."
 
-    def save_vectorstore(self, path="./vectorstore"):
-        """Saves the ChromaDB vectorstore."""
+    def save_vectorstore(self):
+        """Flushes the persistent ChromaDB vectorstore to disk."""
         if self.vectorstore:
             try:
-                self.vectorstore.save_local(path)
-                logging.info(f"✅ Vectorstore saved at {path}")
+                if hasattr(self.vectorstore, "persist"):
+                    self.vectorstore.persist()
+                logging.info(f"✅ Vectorstore saved at {self.persist_directory}")
             except Exception as e:
                 logging.error(f"❌ Error saving vectorstore: {e}")
     
-    def load_vectorstore(self, path="./vectorstore"):
+    def load_vectorstore(self, path=None):
         """Loads a previously saved ChromaDB vectorstore."""
+        path = path or self.persist_directory
         if os.path.exists(path):
             try:
-                self.vectorstore = Chroma.load_local(path, HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2"))
+                self.vectorstore = self._open_collection(path)
+                if self.vector_index == "ivfpq":
+                    self._sync_ann_index(self._load_manifest(path), path)
                 self.retriever = self.vectorstore.as_retriever()
                 logging.info("✅ Vectorstore loaded!")
             except Exception as e:
@@ -1,49 +1,363 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, Depends
+from fastapi import FastAPI, UploadFile, File, HTTPException, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, JSONResponse, PlainTextResponse
 from pydantic import BaseModel
-from transformers import pipeline
-import fitz  # PyMuPDF for reading PDFs
+from transformers import pipeline, TextStreamer, StoppingCriteria, StoppingCriteriaList
+import torch
+import numpy as np
 from deep_translator import GoogleTranslator
-import io
 import uvicorn
-from typing import Optional, Dict, List
+from typing import Optional, Dict, List, Literal, Tuple
 import os
 import time
-from functools import lru_cache
+from functools import wraps
 import logging
 import asyncio
 from contextlib import asynccontextmanager
 import hashlib  # For robust cache key generation
 import json  # For serializing complex arguments
+import queue
+import re
+import math
+import multiprocessing
+import threading
+import weakref
+import gc
+import copy
+import sqlite3
+import tempfile
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from collections import OrderedDict
+
+# Imports only PyMuPDF, so document pool workers don't load this module's models and caches
+from document_text import extract_document_text
 
 # Configure logging
 logging.basicConfig(level=logging.INFO,
                     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-# Global model cache
-MODEL_CACHE = {}
+# Lazy model loading: comma-separated warm-up list ("all" for every model) and idle unloading
+MODEL_WARMUP_SETTING = os.getenv("MODEL_WARMUP", "").strip()
+MODEL_IDLE_TIMEOUT = float(os.getenv("MODEL_IDLE_TIMEOUT", "0"))  # Seconds; 0 disables idle eviction
+MODEL_LOAD_RETRY_SECONDS = float(os.getenv("MODEL_LOAD_RETRY_SECONDS", "60"))
+
+# Per-model inference backend, e.g. "text_generator=int8,qa_model=onnx" (default fp32), and the
+# load-time fidelity thresholds a converted model must meet against its fp32 baseline
+MODEL_BACKENDS = dict(
+    entry.split("=", 1) for entry in os.getenv("MODEL_BACKENDS", "").replace(" ", "").split(",") if "=" in entry
+)
+BACKEND_MIN_TOP1_AGREEMENT = float(os.getenv("BACKEND_MIN_TOP1_AGREEMENT", "0.9"))
+BACKEND_MIN_COSINE = float(os.getenv("BACKEND_MIN_COSINE", "0.98"))
+
+# Micro-batching settings for the text-generation pipeline
+TEXT_BATCH_MAX_SIZE = int(os.getenv("TEXT_BATCH_MAX_SIZE", "8"))
+TEXT_BATCH_WINDOW_MS = float(os.getenv("TEXT_BATCH_WINDOW_MS", "15"))
+
+# Reuse precomputed KV states of the static prompt-template prefixes ("0" to disable)
+PREFIX_KV_CACHE_ENABLED = os.getenv("PREFIX_KV_CACHE", "1") != "0"
+
+# Token budgets per generation endpoint: user fields are truncated so the prompt fits in
+# *_PROMPT_TOKENS, and at most *_MAX_NEW_TOKENS are generated after it
+CHAT_PROMPT_TOKENS = int(os.getenv("CHAT_PROMPT_TOKENS", "384"))
+CHAT_MAX_NEW_TOKENS = int(os.getenv("CHAT_MAX_NEW_TOKENS", "224"))
+NOTICE_PROMPT_TOKENS = int(os.getenv("NOTICE_PROMPT_TOKENS", "640"))
+NOTICE_MAX_NEW_TOKENS = int(os.getenv("NOTICE_MAX_NEW_TOKENS", "384"))
+ROADMAP_PROMPT_TOKENS = int(os.getenv("ROADMAP_PROMPT_TOKENS", "320"))
+ROADMAP_MAX_NEW_TOKENS = int(os.getenv("ROADMAP_MAX_NEW_TOKENS", "384"))
+
+# Inference executor settings: model slots, wait queue and load shedding
+INFERENCE_SLOTS = int(os.getenv("INFERENCE_SLOTS", str(TEXT_BATCH_MAX_SIZE)))
+INFERENCE_QUEUE_SIZE = int(os.getenv("INFERENCE_QUEUE_SIZE", "32"))
+INFERENCE_RETRY_AFTER = int(os.getenv("INFERENCE_RETRY_AFTER", "2"))
+
+# Response cache settings: memory bound per endpoint and TTLs in seconds
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(8 * 1024 * 1024)))
+RESPONSE_CACHE_DEFAULT_TTL = float(os.getenv("RESPONSE_CACHE_DEFAULT_TTL", "3600"))
+CHAT_CACHE_TTL = float(os.getenv("CHAT_CACHE_TTL", "3600"))
+NOTICE_CACHE_TTL = float(os.getenv("NOTICE_CACHE_TTL", "900"))
+ROADMAP_CACHE_TTL = float(os.getenv("ROADMAP_CACHE_TTL", "86400"))
+TRANSLATION_CACHE_TTL = float(os.getenv("TRANSLATION_CACHE_TTL", "86400"))
+
+# Translation backend ("google" or "offline"), per-sentence cache size and batch limit
+TRANSLATION_BACKEND = os.getenv("TRANSLATION_BACKEND", "google")
+TRANSLATION_SENTENCE_CACHE_MAX_BYTES = int(os.getenv("TRANSLATION_SENTENCE_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+MAX_TRANSLATION_BATCH = int(os.getenv("MAX_TRANSLATION_BATCH", "100"))
+
+# Largest item list accepted by the /chat/batch, /roadmap/batch and /generate_notice/batch endpoints
+MAX_GENERATION_BATCH = int(os.getenv("MAX_GENERATION_BATCH", "64"))
+
+# Document upload limits and text extraction workers
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(100 * 1024 * 1024)))
+UPLOAD_CHUNK_BYTES = int(os.getenv("UPLOAD_CHUNK_BYTES", str(1024 * 1024)))
+MAX_DOCUMENT_PAGES = int(os.getenv("MAX_DOCUMENT_PAGES", "500"))
+MAX_DOCUMENT_TEXT_BYTES = int(os.getenv("MAX_DOCUMENT_TEXT_BYTES", str(8 * 1024 * 1024)))
+DOCUMENT_WORKERS = int(os.getenv("DOCUMENT_WORKERS", "2"))
+
+# Cache of extracted text, summaries and QA windows per uploaded document (by SHA-256)
+DOCUMENT_CACHE_MAX_BYTES = int(os.getenv("DOCUMENT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+DOCUMENT_CACHE_TTL = float(os.getenv("DOCUMENT_CACHE_TTL", "86400"))
+
+# Long-document QA: overlapping token windows, BM25 prefilter, top-k windows sent to the model
+QA_WINDOW_TOKENS = int(os.getenv("QA_WINDOW_TOKENS", "384"))
+QA_WINDOW_STRIDE = int(os.getenv("QA_WINDOW_STRIDE", "128"))
+QA_TOP_K = int(os.getenv("QA_TOP_K", "4"))
+
+# Map-reduce summarization: chunk size in tokens, per-chunk summary length and total work budget
+SUMMARY_CHUNK_TOKENS = int(os.getenv("SUMMARY_CHUNK_TOKENS", "900"))
+SUMMARY_CHUNK_MAX_LENGTH = int(os.getenv("SUMMARY_CHUNK_MAX_LENGTH", "120"))
+SUMMARY_CHUNK_MIN_LENGTH = int(os.getenv("SUMMARY_CHUNK_MIN_LENGTH", "20"))
+SUMMARY_BATCH_SIZE = int(os.getenv("SUMMARY_BATCH_SIZE", "4"))
+SUMMARY_MAX_CALLS = int(os.getenv("SUMMARY_MAX_CALLS", "32"))
+
+# Optional on-disk generation cache shared across workers; disabled when no path is set
+GENERATION_CACHE_PATH = os.getenv("GENERATION_CACHE_PATH", "")
+GENERATION_CACHE_TTL = float(os.getenv("GENERATION_CACHE_TTL", str(7 * 24 * 3600)))
+GENERATION_CACHE_MAX_BYTES = int(os.getenv("GENERATION_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+GENERATION_CACHE_COMPACT_INTERVAL = float(os.getenv("GENERATION_CACHE_COMPACT_INTERVAL", "300"))
+
+# Optional semantic answer cache for /chat/: differently worded versions of a past question reuse its answer
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE", "0") == "1"
+SEMANTIC_CACHE_MODEL = os.getenv("SEMANTIC_CACHE_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.9"))  # Minimum cosine similarity
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "4096"))
+SEMANTIC_CACHE_TTL = float(os.getenv("SEMANTIC_CACHE_TTL", os.getenv("CHAT_CACHE_TTL", "3600")))
 
 # Custom exception for model loading failures
 class ModelLoadingError(Exception):
     pass
 
+# Raised by a cached endpoint to answer with an error or apology payload that must not be cached
+class FallbackResponse(Exception):
+    def __init__(self, value: dict):
+        super().__init__("fallback response")
+        self.value = value
+
+# Raised when the inference wait queue is full so the request is shed immediately
+class ServerBusyError(HTTPException):
+    def __init__(self, retry_after: int = INFERENCE_RETRY_AFTER):
+        super().__init__(
+            status_code=503,
+            detail="The legal assistant is handling too many requests. Please retry shortly.",
+            headers={"Retry-After": str(retry_after)}
+        )
+
+# === Metrics ===
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SIZE_BUCKETS = (1e3, 1e4, 1e5, 1e6, 5e6, 1e7, 5e7, 1e8)
+
+def escape_label_value(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    pairs = (f'{key}="{escape_label_value(value)}"' for key, value in sorted(labels.items()))
+    return "{" + ",".join(pairs) + "}"
+
+def format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in self._values.items():
+                lines.append(f"{self.name}{format_labels(dict(key))} {format_value(value)}")
+        return lines
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # label key -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in self._series.items():
+                labels = dict(key)
+                for bound, count in zip(self.buckets, series):
+                    lines.append(f"{self.name}_bucket{format_labels(dict(labels, le=format_value(float(bound))))} {count}")
+                lines.append(f"{self.name}_bucket{format_labels(dict(labels, le='+Inf'))} {series[-1]}")
+                lines.append(f"{self.name}_sum{format_labels(labels)} {format_value(series[-2])}")
+                lines.append(f"{self.name}_count{format_labels(labels)} {series[-1]}")
+        return lines
+
+class MetricsRegistry:
+    """In-process metrics rendered in the Prometheus text exposition format.
+
+    Counters and histograms are updated as requests run; collectors are called at scrape
+    time to report values that already live elsewhere (cache stats, queue depth). Each
+    uvicorn worker keeps its own registry, so scrape every worker or aggregate by instance.
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        metric = Counter(name, help_text)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help_text: str, buckets=LATENCY_BUCKETS) -> Histogram:
+        metric = Histogram(name, help_text, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def collector(self, func):
+        """Register func() -> iterable of (name, type, help, [(labels, value), ...])"""
+        self._collectors.append(func)
+        return func
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collect in self._collectors:
+            try:
+                families = list(collect())
+            except Exception as e:
+                logger.warning(f"Metrics collector {collect.__name__} failed: {e}")
+                continue
+            for name, metric_type, help_text, samples in families:
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {metric_type}")
+                for labels, value in samples:
+                    if value is not None:
+                        lines.append(f"{name}{format_labels(labels)} {format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+METRICS = MetricsRegistry()
+REQUEST_LATENCY = METRICS.histogram("legal_api_request_duration_seconds", "HTTP request latency by endpoint (time to response headers for streams)")
+INFERENCE_LATENCY = METRICS.histogram("legal_api_model_inference_seconds", "Model pipeline call duration by model")
+INFERENCE_INPUT_TOKENS = METRICS.counter("legal_api_model_input_tokens_total", "Tokens fed to each model")
+INFERENCE_OUTPUT_TOKENS = METRICS.counter("legal_api_model_output_tokens_total", "Tokens produced by each model")
+INFERENCE_ITEMS = METRICS.counter("legal_api_model_inference_items_total", "Inputs processed by each model")
+DOCUMENT_UPLOAD_BYTES = METRICS.histogram("legal_api_document_upload_bytes", "Size of documents uploaded to /analyze_document/", SIZE_BUCKETS)
+DOCUMENT_TEXT_CHARS = METRICS.histogram("legal_api_document_text_chars", "Characters of text extracted per analyzed document", SIZE_BUCKETS)
+DOCUMENT_PAGES = METRICS.histogram("legal_api_document_pages", "Pages extracted per analyzed PDF", (1, 5, 10, 25, 50, 100, 250, 500, 1000))
+
+def count_tokens(tokenizer, texts: List[str]) -> Optional[int]:
+    if tokenizer is None or not texts:
+        return None
+    return sum(len(ids) for ids in tokenizer(list(texts), add_special_tokens=False, verbose=False)["input_ids"])
+
+def record_inference(model: str, seconds: float, items: int, tokenizer=None, inputs: Optional[List[str]] = None, outputs: Optional[List[str]] = None, outputs_include_inputs: bool = False):
+    """Record one pipeline call: duration, item count and (when a tokenizer is available) token counts"""
+    INFERENCE_LATENCY.observe(seconds, model=model)
+    INFERENCE_ITEMS.inc(items, model=model)
+    try:
+        input_tokens = count_tokens(tokenizer, inputs)
+        output_tokens = count_tokens(tokenizer, outputs)
+    except Exception as e:
+        logger.debug(f"Could not count tokens for {model}: {e}")
+        return
+    if input_tokens is not None:
+        INFERENCE_INPUT_TOKENS.inc(input_tokens, model=model)
+    if output_tokens is not None:
+        if outputs_include_inputs and input_tokens is not None:
+            output_tokens = max(0, output_tokens - input_tokens)
+        INFERENCE_OUTPUT_TOKENS.inc(output_tokens, model=model)
+
+@METRICS.collector
+def collect_cache_metrics():
+    caches = list(RESPONSE_CACHES.items())
+    for field, metric_type, help_text in (
+        ("hits", "counter", "Response cache hits"),
+        ("misses", "counter", "Response cache misses"),
+        ("evictions", "counter", "Response cache LRU evictions"),
+        ("coalesced", "counter", "Requests that waited on an identical in-flight computation"),
+        ("entries", "gauge", "Entries in the response cache"),
+        ("bytes", "gauge", "Approximate bytes held by the response cache"),
+    ):
+        yield (f"legal_api_response_cache_{field}", metric_type, help_text,
+               [({"cache": name}, cache.stats()[field]) for name, cache in caches])
+
+    if generation_cache is not None:
+        stats = generation_cache.stats()
+        for field, metric_type in (("hits", "counter"), ("misses", "counter"), ("evictions", "counter"), ("entries", "gauge"), ("bytes", "gauge")):
+            yield (f"legal_api_generation_cache_{field}", metric_type, f"Persistent generation cache {field}", [({}, stats[field])])
+
+    if semantic_cache is not None:
+        stats = semantic_cache.stats()
+        for field, metric_type in (("hits", "counter"), ("misses", "counter"), ("evictions", "counter"), ("entries", "gauge")):
+            yield (f"legal_api_semantic_cache_{field}", metric_type, f"Semantic answer cache {field}", [({"cache": semantic_cache.name}, stats[field])])
+
+@METRICS.collector
+def collect_inference_metrics():
+    stats = inference_executor.stats()
+    yield ("legal_api_inference_slots", "gauge", "Model slots in the inference executor", [({}, stats["slots"])])
+    yield ("legal_api_inference_in_flight", "gauge", "Model slots currently busy", [({}, stats["in_flight"])])
+    yield ("legal_api_inference_slot_utilization", "gauge", "Fraction of model slots busy", [({}, stats["in_flight"] / stats["slots"])])
+    yield ("legal_api_inference_queue_depth", "gauge", "Calls waiting for a model slot", [({}, stats["queued"])])
+    yield ("legal_api_inference_rejected", "counter", "Calls shed because the wait queue was full", [({}, stats["rejected"])])
+    yield ("legal_api_text_batcher_queue_depth", "gauge", "Prompts waiting for the next generation batch", [({}, text_batcher.queue_depth())])
+
+    prefix_stats = prefix_kv_cache.stats()
+    yield ("legal_api_prefix_kv_cache_hits", "counter", "Generations that reused a cached prompt-prefix KV state", [({}, prefix_stats["hits"])])
+    yield ("legal_api_prefix_kv_cache_misses", "counter", "Prompt-prefix KV states computed", [({}, prefix_stats["misses"])])
+    yield ("legal_api_prefix_kv_cache_mismatches", "counter", "Prompts whose tokens did not start with the cached prefix's tokens", [({}, prefix_stats["mismatches"])])
+
+    models = MODEL_CACHE.status()
+    yield ("legal_api_model_loaded", "gauge", "Whether each model is loaded", [({"model": name}, int(info["loaded"])) for name, info in models.items()])
+    yield ("legal_api_model_memory_bytes", "gauge", "Approximate weight memory per loaded model", [({"model": name}, info["memory_bytes"]) for name, info in models.items()])
+
 # Lifespan context manager for model loading at startup
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Load models at startup
-    logger.info("Loading models...")
-    try:
-        load_models()
-        logger.info("Models loaded successfully")
-    except ModelLoadingError as e:
-        logger.critical(f"Failed to load models: {e}")
-        # Consider shutting down the app gracefully or alerting an admin here
-        # raise  # Uncomment to stop app startup if models fail
-        pass # Continue even if models fail, but log clearly
+    # Models load lazily on first use; warm up the configured ones in the background so
+    # /health answers immediately and /ready flips once they are in memory
+    logger.info(f"Warming up models: {MODEL_WARMUP or 'none (lazy loading)'}")
+    warmup = asyncio.create_task(asyncio.to_thread(load_models))
+    MODEL_CACHE.start()
+    if generation_cache is not None:
+        generation_cache.start()
+        logger.info(f"Using persistent generation cache at {generation_cache.path}")
     yield
     # Cleanup on shutdown
+    if generation_cache is not None:
+        generation_cache.stop()
+    logger.info("Stopping text generation batcher...")
+    text_batcher.stop()
+    inference_executor.shutdown()
+    if document_process_pool is not None:
+        document_process_pool.shutdown(wait=False, cancel_futures=True)
     logger.info("Clearing model cache...")
+    MODEL_CACHE.stop()
+    if not warmup.done():
+        warmup.cancel()
     MODEL_CACHE.clear()
 
 # Initialize FastAPI app with lifespan
@@ -63,121 +377,1207 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Model loading function
-def load_models():
+# Record request latency per endpoint template (e.g. /chat/) rather than per raw path
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    start_time = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        endpoint = getattr(route, "path", "unmatched")
+        REQUEST_LATENCY.observe(time.perf_counter() - start_time, endpoint=endpoint, method=request.method, status=str(status))
+
+# Inference backends: fp32 (eager PyTorch), int8 (dynamic quantization) or onnx (ONNX Runtime)
+INFERENCE_BACKENDS = ("fp32", "int8", "onnx")
+
+FIDELITY_PROBE_TEXT = "The accused was charged under Section 420 of the Indian Penal Code for cheating and dishonestly inducing delivery of property."
+
+def convert_conv1d_to_linear(model):
+    """Swap GPT-2 style Conv1D layers for nn.Linear so dynamic quantization can reach them"""
+    try:
+        from transformers.pytorch_utils import Conv1D
+    except ImportError:
+        from transformers.modeling_utils import Conv1D
+
+    for parent in list(model.modules()):
+        for child_name, child in list(parent.named_children()):
+            if isinstance(child, Conv1D):
+                in_features, out_features = child.weight.shape
+                linear = torch.nn.Linear(in_features, out_features)
+                linear.weight.data = child.weight.data.t().contiguous()
+                linear.bias.data = child.bias.data
+                setattr(parent, child_name, linear)
+    return model
+
+def probe_logits(model, tokenizer, task: str):
+    """Run one forward pass on a fixed legal sentence and return the output logits"""
+    inputs = tokenizer(FIDELITY_PROBE_TEXT, return_tensors="pt")
+    if task == "question-answering":
+        inputs = tokenizer("What was the accused charged under?", FIDELITY_PROBE_TEXT, return_tensors="pt")
+    with torch.no_grad():
+        if task == "summarization":
+            start_token = model.config.decoder_start_token_id
+            decoder_input_ids = torch.tensor([[start_token] + inputs["input_ids"][0, :8].tolist()])
+            outputs = model(**inputs, decoder_input_ids=decoder_input_ids)
+        else:
+            outputs = model(**inputs)
+    if task == "question-answering":
+        return torch.stack([outputs.start_logits, outputs.end_logits]).float()
+    return outputs.logits.float()
+
+def check_backend_fidelity(baseline_model, candidate_model, tokenizer, task: str) -> Tuple[bool, float, float]:
+    """Compare a converted model to its fp32 baseline on a probe input.
+
+    Returns (passed, top-1 agreement, mean cosine similarity) over the output positions.
+    """
+    baseline = probe_logits(baseline_model, tokenizer, task)
+    candidate = probe_logits(candidate_model, tokenizer, task)
+    baseline = baseline.reshape(-1, baseline.shape[-1])
+    candidate = candidate.reshape(-1, candidate.shape[-1])
+    agreement = (baseline.argmax(dim=-1) == candidate.argmax(dim=-1)).float().mean().item()
+    cosine = torch.nn.functional.cosine_similarity(baseline, candidate, dim=-1).mean().item()
+    passed = agreement >= BACKEND_MIN_TOP1_AGREEMENT and cosine >= BACKEND_MIN_COSINE
+    return passed, agreement, cosine
+
+def build_onnx_model(task: str, model_id: str):
+    # optimum is only needed when a model is configured for the onnx backend
+    from optimum.onnxruntime import ORTModelForCausalLM, ORTModelForQuestionAnswering, ORTModelForSeq2SeqLM
+
+    model_classes = {
+        "text-generation": ORTModelForCausalLM,
+        "question-answering": ORTModelForQuestionAnswering,
+        "summarization": ORTModelForSeq2SeqLM,
+    }
+    return model_classes[task].from_pretrained(model_id, export=True)
+
+def build_pipeline(name: str, task: str, model_id: str, **kwargs):
+    """Create a pipeline on the backend configured for `name` in MODEL_BACKENDS.
+
+    Converted models are checked against the fp32 baseline at load time; if their outputs
+    drift too far, or the conversion fails, the fp32 pipeline is used instead.
+    """
+    backend = MODEL_BACKENDS.get(name, "fp32")
+    baseline = pipeline(task, model=model_id, **kwargs)
+    baseline.inference_backend = "fp32"
+    if backend == "fp32":
+        return baseline
+
+    try:
+        if backend == "int8":
+            candidate_model = torch.quantization.quantize_dynamic(
+                convert_conv1d_to_linear(copy.deepcopy(baseline.model)), {torch.nn.Linear}, dtype=torch.qint8
+            )
+        else:
+            candidate_model = build_onnx_model(task, model_id)
+        passed, agreement, cosine = check_backend_fidelity(baseline.model, candidate_model, baseline.tokenizer, task)
+    except Exception as e:
+        logger.warning(f"Could not build {backend} backend for {name}, using fp32: {e}")
+        return baseline
+
+    if not passed:
+        logger.warning(
+            f"{backend} backend for {name} drifted from fp32 (top-1 agreement {agreement:.3f}, cosine {cosine:.4f}); using fp32"
+        )
+        return baseline
+
+    try:
+        candidate = pipeline(task, model=candidate_model, tokenizer=baseline.tokenizer, **kwargs)
+    except Exception as e:
+        logger.warning(f"Could not build a {task} pipeline on the {backend} backend for {name}, using fp32: {e}")
+        return baseline
+    logger.info(f"Using {backend} backend for {name} (top-1 agreement {agreement:.3f}, cosine {cosine:.4f})")
+    candidate.inference_backend = backend
+    return candidate
+
+# Model loading functions, one per pipeline
+def load_text_generator():
     # Use a smaller, more efficient general-purpose model for faster inference
     try:
         # Attempt to load a smaller model with comparable quality
-        MODEL_CACHE["text_generator"] = pipeline(
+        text_generator = build_pipeline(
+            "text_generator",
             "text-generation",
-            model="distilgpt2",  # Smaller, faster model
-            max_length=512
+            "distilgpt2"  # Smaller, faster model
         )
+        enable_batched_generation(text_generator)
         logger.info("Loaded distilgpt2 for text generation")
+        return text_generator
     except Exception as e:
         logger.error(f"Error loading text generation model: {str(e)}")
         # Emergency fallback to an even smaller model
         try:
-            MODEL_CACHE["text_generator"] = pipeline(
+            text_generator = build_pipeline(
+                "text_generator",
                 "text-generation",
-                model="sshleifer/tiny-gpt2",
-                max_length=512
+                "sshleifer/tiny-gpt2"
             )
+            enable_batched_generation(text_generator)
             logger.info("Loaded tiny-gpt2 for text generation (fallback)")
+            return text_generator
         except Exception as e:
             logger.error(f"Error loading fallback text generation model: {str(e)}")
-            MODEL_CACHE["text_generator"] = None
             raise ModelLoadingError("Failed to load text generation models")  # Raise exception for fatal error
 
+def load_qa_model():
     # Load a smaller QA model
     try:
-        MODEL_CACHE["qa_model"] = pipeline(
+        qa_model = build_pipeline(
+            "qa_model",
             "question-answering",
-            model="distilbert-base-cased-distilled-squad"  # Smaller, faster QA model
+            "distilbert-base-cased-distilled-squad"  # Smaller, faster QA model
         )
         logger.info("Loaded distilbert for QA")
+        return qa_model
     except Exception as e:
         logger.error(f"Error loading QA model: {str(e)}")
-        MODEL_CACHE["qa_model"] = None
+        raise ModelLoadingError("Failed to load QA model")
 
+def load_summarizer():
     # Load a smaller summarization model
     try:
-        MODEL_CACHE["summarizer"] = pipeline(
+        summarizer = build_pipeline(
+            "summarizer",
             "summarization",
-            model="sshleifer/distilbart-cnn-6-6",  # Smaller summarization model
+            "sshleifer/distilbart-cnn-6-6",  # Smaller summarization model
             max_length=250,
             min_length=50
         )
         logger.info("Loaded distilbart for summarization")
+        return summarizer
     except Exception as e:
         logger.error(f"Error loading summarization model: {str(e)}")
-        MODEL_CACHE["summarizer"] = None
+        raise ModelLoadingError("Failed to load summarization model")
 
-# Response cache decorator
-def response_cache():
-    cache = {}
+def load_embedder():
+    # sentence-transformers is only needed when the semantic answer cache is enabled
+    try:
+        from sentence_transformers import SentenceTransformer
 
-    def decorator(func):
-        async def wrapper(data):  # Adjusted for different endpoint models
-            if isinstance(data, Query):  # Handle Query model
-                key = data.question
-            elif isinstance(data, NoticeData): # Handle NoticeData
-                key = f"{data.recipient_name}-{data.subject}"
-            elif isinstance(data, RoadmapRequest): # Handle RoadmapRequest
-                 key = f"{data.issue_type}-{data.jurisdiction}"
-            elif isinstance(data, TranslationRequest):  #Handle TranslationRequest
-                key = f"{data.text}-{data.dest_lang}"
-            else:
-                key = str(hashlib.md5(json.dumps(data, sort_keys=True, default=lambda o: o.__dict__).encode('utf-8')).hexdigest()) # General case, using a hash
-                logger.warning("Using general key creation for caching.  Consider a model specific key")
+        embedder = SentenceTransformer(SEMANTIC_CACHE_MODEL, device="cpu")
+        logger.info(f"Loaded {SEMANTIC_CACHE_MODEL} for question embeddings")
+        return embedder
+    except Exception as e:
+        logger.error(f"Error loading embedding model: {str(e)}")
+        raise ModelLoadingError("Failed to load embedding model")
+
+MODEL_LOADERS = {
+    "text_generator": load_text_generator,
+    "qa_model": load_qa_model,
+    "summarizer": load_summarizer,
+}
+if SEMANTIC_CACHE_ENABLED:
+    MODEL_LOADERS["embedder"] = load_embedder
+
+if MODEL_WARMUP_SETTING == "all":
+    MODEL_WARMUP = list(MODEL_LOADERS)
+else:
+    MODEL_WARMUP = [name.strip() for name in MODEL_WARMUP_SETTING.split(",") if name.strip()]
+
+def estimate_model_bytes(model_pipeline) -> Optional[int]:
+    """Approximate resident size of a pipeline's weights and buffers"""
+    model = getattr(model_pipeline, "model", None)
+    if model is None or not hasattr(model, "parameters"):
+        return None
+    tensors = list(model.parameters()) + list(model.buffers())
+    return sum(tensor.numel() * tensor.element_size() for tensor in tensors)
+
+class ModelRegistry:
+    """Lazily loaded model pipelines.
+
+    get() loads a pipeline on first use and records its load time, approximate memory
+    footprint and last use. Pipelines idle for longer than `idle_timeout` seconds are
+    unloaded by a background thread. Failed loads are remembered for `retry_interval`
+    seconds so a broken model doesn't stall every request. Assigning a pipeline directly
+    (MODEL_CACHE[name] = pipe) pins it: it is never unloaded or reloaded.
+    """
+
+    def __init__(self, loaders: dict, idle_timeout: float = 0, retry_interval: float = 60):
+        self.loaders = loaders
+        self.idle_timeout = idle_timeout
+        self.retry_interval = retry_interval
+        self._models = {}
+        self._info = {name: self._empty_info() for name in loaders}
+        self._locks = {name: threading.Lock() for name in loaders}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def _empty_info():
+        return {"loaded": False, "pinned": False, "backend": None, "memory_bytes": None, "load_seconds": None,
+                "last_used": None, "failed_at": None, "error": None}
+
+    def _model_lock(self, name):
+        with self._lock:
+            if name not in self._locks:
+                self._locks[name] = threading.Lock()
+                self._info.setdefault(name, self._empty_info())
+            return self._locks[name]
+
+    def get(self, name: str):
+        """Return the pipeline, loading it if needed (blocking), or None if it can't be loaded"""
+        model = self._models.get(name)
+        if model is not None:
+            self._info[name]["last_used"] = time.time()
+            return model
+        if name not in self.loaders:
+            return None
+
+        with self._model_lock(name):
+            model = self._models.get(name)
+            if model is not None:
+                self._info[name]["last_used"] = time.time()
+                return model
+            info = self._info[name]
+            if info["failed_at"] is not None and time.time() - info["failed_at"] < self.retry_interval:
+                return None
+
+            start_time = time.time()
+            try:
+                model = self.loaders[name]()
+            except ModelLoadingError as e:
+                logger.critical(f"Failed to load {name}: {e}")
+                info.update(failed_at=time.time(), error=str(e))
+                return None
+            info.update(
+                loaded=True,
+                backend=getattr(model, "inference_backend", "fp32"),
+                memory_bytes=estimate_model_bytes(model),
+                load_seconds=round(time.time() - start_time, 2),
+                last_used=time.time(),
+                failed_at=None,
+                error=None
+            )
+            self._models[name] = model
+            logger.info(f"Loaded {name} in {info['load_seconds']:.2f} seconds ({info['memory_bytes']} bytes)")
+            return model
+
+    async def aget(self, name: str):
+        """get() without blocking the event loop while a model loads"""
+        model = self._models.get(name)
+        if model is not None:
+            self._info[name]["last_used"] = time.time()
+            return model
+        return await asyncio.to_thread(self.get, name)
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._models
+
+    def __setitem__(self, name: str, model):
+        with self._model_lock(name):
+            if model is None:
+                self._models.pop(name, None)
+                self._info[name] = self._empty_info()
+                return
+            self._models[name] = model
+            self._info[name].update(
+                loaded=True, pinned=True, memory_bytes=estimate_model_bytes(model),
+                last_used=time.time(), failed_at=None, error=None
+            )
+
+    def unload(self, name: str):
+        with self._model_lock(name):
+            if self._models.pop(name, None) is not None:
+                self._info[name].update(loaded=False, memory_bytes=None)
+                logger.info(f"Unloaded {name}")
+
+    def clear(self):
+        for name in list(self._models):
+            self.unload(name)
+
+    def evict_idle(self):
+        if self.idle_timeout <= 0:
+            return
+        now = time.time()
+        evicted = False
+        for name, info in list(self._info.items()):
+            if info["loaded"] and not info["pinned"] and info["last_used"] is not None and now - info["last_used"] > self.idle_timeout:
+                logger.info(f"Evicting {name} after {now - info['last_used']:.0f} idle seconds")
+                self.unload(name)
+                evicted = True
+        if evicted:
+            # Release the weights now rather than whenever the collector next runs
+            gc.collect()
+
+    def start(self):
+        if self.idle_timeout > 0 and (self._thread is None or not self._thread.is_alive()):
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._eviction_loop, name="model-evictor", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _eviction_loop(self):
+        interval = max(1.0, min(60.0, self.idle_timeout / 4))
+        while not self._stop.wait(interval):
+            self.evict_idle()
+
+    def status(self):
+        return {name: dict(info) for name, info in self._info.items()}
+
+# Global model cache
+MODEL_CACHE = ModelRegistry(MODEL_LOADERS, idle_timeout=MODEL_IDLE_TIMEOUT, retry_interval=MODEL_LOAD_RETRY_SECONDS)
+
+# Set once the startup warm-up list has been processed; drives /ready
+models_warmed_up = threading.Event()
+
+# Warm-up: load the configured models ahead of the first request
+def load_models(names: Optional[List[str]] = None):
+    names = MODEL_WARMUP if names is None else names
+    for name in names:
+        if name not in MODEL_LOADERS:
+            logger.warning(f"Unknown model in warm-up list: {name}")
+            continue
+        MODEL_CACHE.get(name)
+    models_warmed_up.set()
+
+def enable_batched_generation(text_generator):
+    """Configure a text-generation pipeline so several prompts can be run as one padded batch"""
+    tokenizer = text_generator.tokenizer
+    # GPT-2 style tokenizers ship without a pad token; reuse EOS so batches can be padded
+    if tokenizer.pad_token_id is None:
+        tokenizer.pad_token = tokenizer.eos_token
+        text_generator.model.config.pad_token_id = tokenizer.eos_token_id
+    # Decoder-only models must be padded on the left so generation continues from the real prompt
+    tokenizer.padding_side = "left"
+
+# End-of-answer detection, so generation stops instead of running on to the token cap
+class StopOnPatterns(StoppingCriteria):
+    """Finishes each sequence once its generated text contains one of the given patterns.
+
+    Only the last window_tokens tokens past the prompt are decoded per step, which is
+    enough to see any pattern as soon as its final token is produced.
+    """
+
+    def __init__(self, tokenizer, patterns, window_tokens: int = 32):
+        self.tokenizer = tokenizer
+        self.patterns = tuple(pattern for pattern in patterns if pattern)
+        self.window_tokens = window_tokens
+        self.prompt_length = None
+
+    def __call__(self, input_ids, scores, **kwargs):
+        # Criteria run after every new token, so on the first call exactly one token follows the prompt
+        if self.prompt_length is None:
+            self.prompt_length = input_ids.shape[-1] - 1
+        start = max(self.prompt_length, input_ids.shape[-1] - self.window_tokens)
+        tails = self.tokenizer.batch_decode(input_ids[:, start:], skip_special_tokens=True)
+        done = [any(pattern in tail for pattern in self.patterns) for tail in tails]
+        return torch.tensor(done, dtype=torch.bool, device=input_ids.device)
+
+def trim_at_stop_patterns(text: str, patterns) -> str:
+    """Cut text at the earliest occurrence of any of the patterns"""
+    positions = [text.find(pattern) for pattern in patterns if pattern and pattern in text]
+    return text[:min(positions)] if positions else text
+
+class StopOnEvent(StoppingCriteria):
+    """Stops every sequence once `event` is set, e.g. when a streaming client has disconnected"""
+
+    def __init__(self, event: threading.Event):
+        self.event = event
+
+    def __call__(self, input_ids, scores, **kwargs):
+        return torch.full((input_ids.shape[0],), self.event.is_set(), dtype=torch.bool, device=input_ids.device)
+
+def build_stopping_criteria(text_generator, stop_patterns, cancelled: Optional[threading.Event] = None) -> Optional[StoppingCriteriaList]:
+    criteria = []
+    tokenizer = getattr(text_generator, "tokenizer", None)
+    if stop_patterns and tokenizer is not None:
+        criteria.append(StopOnPatterns(tokenizer, stop_patterns))
+    if cancelled is not None:
+        criteria.append(StopOnEvent(cancelled))
+    return StoppingCriteriaList(criteria) if criteria else None
+
+# Reuse of precomputed key/value attention states for static prompt-template prefixes
+class PrefixKVCache:
+    """Attention key/value states for the fixed text each prompt template starts with.
+
+    The prefix is encoded once per model; generate() then copies its cache, runs the
+    model over the request-specific suffix only and continues generation from there.
+    This applies to single prompts on PyTorch decoder-only models; padded batches and
+    ONNX models go through the pipeline as usual.
+    """
+
+    def __init__(self):
+        # model -> {prefix: (prefix input_ids, past_key_values)}; weak keys, so the states of an
+        # unloaded or replaced model go with it and are never matched to a new one
+        self._entries = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.mismatches = 0
+
+    @staticmethod
+    def supports(text_generator) -> bool:
+        model = getattr(text_generator, "model", None)
+        return (
+            isinstance(model, torch.nn.Module)
+            and hasattr(model, "generate")
+            and not getattr(model.config, "is_encoder_decoder", False)
+        )
+
+    def _prefix_state(self, text_generator, prefix: str):
+        model = text_generator.model
+        with self._lock:
+            states = self._entries.setdefault(model, {})
+            entry = states.get(prefix)
+            if entry is not None:
+                self.hits += 1
+                return entry
+            self.misses += 1
+            prefix_ids = text_generator.tokenizer(prefix, return_tensors="pt").input_ids
+            with torch.no_grad():
+                outputs = model(prefix_ids, use_cache=True)
+            entry = (prefix_ids, outputs.past_key_values)
+            states[prefix] = entry
+            logger.info(f"Cached KV states for a {prefix_ids.shape[-1]}-token prompt prefix")
+        return entry
+
+    def generate(self, text_generator, prompt: str, prefix: str, max_new_tokens: int, stopping_criteria=None, streamer=None):
+        """Generate for a prompt starting with prefix; returns pipeline-shaped output, or None if not applicable"""
+        if not prompt.startswith(prefix) or not self.supports(text_generator):
+            return None
+        tokenizer = text_generator.tokenizer
+        model = text_generator.model
+        prefix_ids, prefix_cache = self._prefix_state(text_generator, prefix)
+        # Tokenize the whole prompt, as the pipeline would, and only reuse the prefix states if the
+        # prompt's tokens really start with the prefix's tokens
+        input_ids = tokenizer(prompt, return_tensors="pt").input_ids
+        prefix_length = prefix_ids.shape[-1]
+        if input_ids.shape[-1] <= prefix_length or not torch.equal(input_ids[:, :prefix_length], prefix_ids):
+            with self._lock:
+                self.mismatches += 1
+            return None
+        suffix_ids = input_ids[:, prefix_length:]
+
+        with torch.no_grad():
+            # generate() mutates the cache it is given, so each request works on its own copy
+            past_key_values = copy.deepcopy(prefix_cache)
+            if suffix_ids.shape[-1] > 1:
+                # Prefill all but the last suffix token; generate() then only has to process that one
+                past_key_values = model(suffix_ids[:, :-1], past_key_values=past_key_values, use_cache=True).past_key_values
+            output_ids = model.generate(
+                input_ids=input_ids,
+                attention_mask=torch.ones_like(input_ids),
+                past_key_values=past_key_values,
+                # Decode exactly as the pipeline would (sampling settings included), so a prompt gets the
+                # same kind of answer whichever path generates it
+                generation_config=getattr(text_generator, "generation_config", None),
+                max_new_tokens=max_new_tokens,
+                pad_token_id=tokenizer.pad_token_id,
+                stopping_criteria=stopping_criteria,
+                streamer=streamer
+            )
+        new_text = tokenizer.decode(output_ids[0, input_ids.shape[-1]:], skip_special_tokens=True)
+        # Same shape as the pipeline's output with return_full_text=True
+        return [{"generated_text": prompt + new_text}]
+
+    def stats(self):
+        with self._lock:
+            prefixes = sum(len(states) for states in self._entries.values())
+            return {"prefixes": prefixes, "hits": self.hits, "misses": self.misses, "mismatches": self.mismatches}
+
+prefix_kv_cache = PrefixKVCache()
+
+def run_text_generator(text_generator, prompts: List[str], max_new_tokens: int, stop_patterns: Tuple[str, ...] = (), streamer=None,
+                       cancelled: Optional[threading.Event] = None) -> list:
+    """Call the text-generation pipeline, reusing a template prefix's KV states for single prompts.
+
+    Generation ends at max_new_tokens, once a stop pattern appears or once `cancelled` is set;
+    the generated text is cut at the stop pattern, so what is returned matches what the
+    endpoints keep.
+    """
+    outputs = None
+    if PREFIX_KV_CACHE_ENABLED and len(prompts) == 1:
+        prefix = match_prompt_prefix(prompts[0])
+        if prefix:
+            try:
+                output = prefix_kv_cache.generate(
+                    text_generator, prompts[0], prefix, max_new_tokens,
+                    build_stopping_criteria(text_generator, stop_patterns, cancelled), streamer
+                )
+                if output is not None:
+                    outputs = [output]
+            except Exception as e:
+                # A stream may already have received tokens, so only fall back when nothing was sent
+                if streamer is not None:
+                    raise
+                logger.warning(f"Prefix KV-cache generation failed, using the pipeline: {e}")
+    if outputs is None:
+        kwargs = {"streamer": streamer} if streamer is not None else {}
+        stopping_criteria = build_stopping_criteria(text_generator, stop_patterns, cancelled)
+        if stopping_criteria is not None:
+            kwargs["stopping_criteria"] = stopping_criteria
+        outputs = text_generator(prompts, max_new_tokens=max_new_tokens, num_return_sequences=1, batch_size=len(prompts), **kwargs)
+    if stop_patterns:
+        for prompt, output in zip(prompts, outputs):
+            for sequence in output:
+                text = sequence["generated_text"]
+                if text.startswith(prompt):
+                    sequence["generated_text"] = prompt + trim_at_stop_patterns(text[len(prompt):], stop_patterns)
+    return outputs
+
+# Micro-batching scheduler for text generation
+class TextGenerationBatcher:
+    """Gathers prompts that arrive within a short window and runs them through the
+    text-generation pipeline as a single padded batch.
+
+    Callers block on the returned future, so this is meant to be used from worker
+    threads (see generate_text), never directly on the event loop.
+    """
+
+    _STOP = object()
+
+    def __init__(self, max_batch_size=8, window_ms=15.0):
+        self.max_batch_size = max(1, max_batch_size)
+        self.window = max(0.0, window_ms) / 1000.0
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="text-batcher", daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+        if thread is not None and thread.is_alive():
+            self._queue.put(self._STOP)
+            thread.join(timeout=5)
+
+    def submit(self, prompt, max_new_tokens=200, stop_patterns=()):
+        """Queue a prompt for generation and return a Future resolving to the pipeline output"""
+        self.start()
+        future = Future()
+        self._queue.put((prompt, (max_new_tokens, tuple(stop_patterns)), future))
+        return future
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is self._STOP:
+                return
+            batch = [item]
+            stopping = False
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is self._STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._process(batch)
+            if stopping:
+                return
+
+    def _process(self, batch):
+        # The pipeline takes one set of generation kwargs per call, so group by token budget and stop patterns
+        groups = {}
+        for prompt, settings, future in batch:
+            groups.setdefault(settings, []).append((prompt, future))
+
+        for (max_new_tokens, stop_patterns), items in groups.items():
+            prompts = [prompt for prompt, _ in items]
+            start_time = time.time()
+            try:
+                text_generator = MODEL_CACHE.get("text_generator")
+                if text_generator is None:
+                    raise RuntimeError("Text generation model is not loaded")
+                outputs = run_text_generator(text_generator, prompts, max_new_tokens, stop_patterns)
+            except Exception as e:
+                for _, future in items:
+                    future.set_exception(e)
+                continue
+            elapsed = time.time() - start_time
+            logger.info(f"Batched text generation of {len(prompts)} prompt(s) took {elapsed:.2f} seconds")
+            for (_, future), output in zip(items, outputs):
+                future.set_result(output)
+            record_inference(
+                "text_generator", elapsed, len(prompts), getattr(text_generator, "tokenizer", None),
+                prompts, [output[0]["generated_text"] for output in outputs], outputs_include_inputs=True
+            )
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+text_batcher = TextGenerationBatcher(max_batch_size=TEXT_BATCH_MAX_SIZE, window_ms=TEXT_BATCH_WINDOW_MS)
+
+# Dedicated executor for blocking model inference
+class InferenceExecutor:
+    """Runs blocking pipeline calls on a fixed pool of model slots, off the event loop.
+
+    At most `slots` calls run at once and at most `queue_size` more may wait for a slot.
+    Anything beyond that is rejected straight away with ServerBusyError (503 + Retry-After),
+    so overload turns into fast refusals instead of every request timing out together.
+    """
+
+    def __init__(self, slots=4, queue_size=32, retry_after=2):
+        self.slots = max(1, slots)
+        self.queue_size = max(0, queue_size)
+        self.retry_after = retry_after
+        self._executor = ThreadPoolExecutor(max_workers=self.slots, thread_name_prefix="inference")
+        # Only touched from the event loop thread, so no lock is needed
+        self._pending = 0
+        self.rejected = 0
+
+    @property
+    def in_flight(self):
+        return min(self._pending, self.slots)
+
+    @property
+    def queued(self):
+        return max(0, self._pending - self.slots)
+
+    def submit(self, func, *args, **kwargs):
+        """Schedule func(*args, **kwargs) in a model slot and return an awaitable future.
+
+        Raises ServerBusyError immediately, before anything is scheduled, when the queue is full.
+        """
+        if self._pending >= self.slots + self.queue_size:
+            self.rejected += 1
+            logger.warning(f"Inference queue full ({self._pending} pending), rejecting {getattr(func, '__name__', 'call')}")
+            raise ServerBusyError(self.retry_after)
+        self._pending += 1
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._executor, partial(func, *args, **kwargs))
+        future.add_done_callback(self._release)
+        return future
+
+    async def run(self, func, *args, **kwargs):
+        """Run func(*args, **kwargs) in a model slot, shedding load when the queue is full"""
+        return await self.submit(func, *args, **kwargs)
+
+    def _release(self, _future):
+        self._pending -= 1
+
+    def stats(self):
+        return {
+            "slots": self.slots,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "queue_size": self.queue_size,
+            "rejected": self.rejected
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+inference_executor = InferenceExecutor(slots=INFERENCE_SLOTS, queue_size=INFERENCE_QUEUE_SIZE, retry_after=INFERENCE_RETRY_AFTER)
+
+# Response cache: LRU + TTL, bounded by memory size, with single-flight coalescing
+class ResponseCache:
+    """Bounded LRU cache for endpoint responses.
+
+    Entries expire after `ttl` seconds and the least recently used ones are evicted once the
+    approximate serialized size of all entries exceeds `max_bytes`. Concurrent misses for the
+    same key share a single computation instead of each running the model.
+    """
+
+    def __init__(self, name: str, ttl: float, max_bytes: int = RESPONSE_CACHE_MAX_BYTES):
+        self.name = name
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.coalesced = 0
+        self._entries = OrderedDict()  # key -> (expires_at, size, value)
+        self._inflight = {}  # key -> asyncio.Future of the running computation
+
+    def get(self, key):
+        """Return (True, value) for a live entry, (False, None) otherwise"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        expires_at, size, value = entry
+        if expires_at <= time.monotonic():
+            self._remove(key)
+            return False, None
+        self._entries.move_to_end(key)
+        return True, value
+
+    def set(self, key, value):
+        size = self._estimate_size(value)
+        if size > self.max_bytes:
+            logger.info(f"Response for {self.name} too large to cache ({size} bytes)")
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (time.monotonic() + self.ttl, size, value)
+        self.current_bytes += size
+        while self.current_bytes > self.max_bytes:
+            oldest_key = next(iter(self._entries))
+            self._remove(oldest_key)
+            self.evictions += 1
+
+    async def get_or_compute(self, key, compute):
+        """Return the cached value for key, awaiting compute() at most once across concurrent callers"""
+        while True:
+            hit, value = self.get(key)
+            if hit:
+                self.hits += 1
+                logger.info(f"Cache hit for {self.name} with key: {key}")
+                return value
+
+            inflight = self._inflight.get(key)
+            if inflight is None:
+                break
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                if not inflight.cancelled():
+                    raise
+                # The request computing this value went away; try again (and possibly compute it ourselves)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await compute()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # Mark as retrieved when nobody else was waiting
+            raise
+        else:
+            self.set(key, value)
+            future.set_result(value)
+            logger.info(f"Cached response for {self.name} with key: {key}")
+            return value
+        finally:
+            self._inflight.pop(key, None)
+
+    def stats(self):
+        return {
+            "entries": len(self._entries),
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._inflight)
+        }
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self.current_bytes -= size
+
+    @staticmethod
+    def _estimate_size(value) -> int:
+        return len(json.dumps(value, default=str).encode("utf-8"))
 
-            if key in cache:
-                logger.info(f"Cache hit for {func.__name__} with key: {key}")
-                return cache[key]
+# All response caches, by endpoint name, for health reporting
+RESPONSE_CACHES: Dict[str, ResponseCache] = {}
 
-            # Generate new response
-            response = await func(data)
+def make_cache_key(data) -> str:
+    """Build a cache key from every field of the request model"""
+    if isinstance(data, BaseModel):
+        payload = data.model_dump()
+    else:
+        payload = data
+    serialized = json.dumps(payload, sort_keys=True, default=lambda o: o.__dict__)
+    return f"{type(data).__name__}:{hashlib.sha256(serialized.encode('utf-8')).hexdigest()}"
 
-            # Store in cache (limit cache size)
-            if len(cache) > 100:
-                oldest_key = next(iter(cache))
-                del cache[oldest_key]
+# Response cache decorator
+def response_cache(ttl: float = RESPONSE_CACHE_DEFAULT_TTL, max_bytes: int = RESPONSE_CACHE_MAX_BYTES):
+    def decorator(func):
+        cache = ResponseCache(func.__name__, ttl=ttl, max_bytes=max_bytes)
+        RESPONSE_CACHES[func.__name__] = cache
 
-            cache[key] = response
-            logger.info(f"Cached response for {func.__name__} with key: {key}")
-            return response
+        # wraps() keeps the endpoint signature so FastAPI still parses the request body model
+        @wraps(func)
+        async def wrapper(data):
+            try:
+                return await cache.get_or_compute(make_cache_key(data), lambda: func(data))
+            except FallbackResponse as e:
+                # Errors are answered but never cached, so the next request tries again
+                return e.value
 
+        wrapper.cache = cache
         return wrapper
 
     return decorator
 
-# Cached text generation - Consider adding generation parameters
-@lru_cache(maxsize=50)
-def generate_text(prompt, max_length=300, temperature=0.7, top_p=0.9): #Added temp and top_p for control
-    """Cached text generation function to avoid repeated identical generations"""
-    start_time = time.time()
+# Persistent generation cache shared by all workers on a host
+class GenerationCache:
+    """SQLite-backed cache of text-generation results.
+
+    Keys are a SHA-256 of the prompt, model name and generation parameters, so every
+    uvicorn worker pointed at the same file shares results and they survive restarts.
+    The database runs in WAL mode; a background thread periodically drops expired
+    entries and trims the least recently used ones down to `max_bytes`.
+    """
+
+    # Only refresh last_access on reads this often, to avoid a write per cache hit
+    ACCESS_UPDATE_INTERVAL = 60.0
+
+    def __init__(self, path: str, ttl: float, max_bytes: int, compact_interval: float):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.compact_interval = compact_interval
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._local = threading.local()
+        self._stop = threading.Event()
+        self._thread = None
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS generations (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_generations_last_access ON generations(last_access)")
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value REAL NOT NULL)")
+        conn.commit()
+
+    @staticmethod
+    def make_key(prompt: str, model_name: str, params: dict) -> str:
+        payload = json.dumps({"prompt": prompt, "model": model_name, "params": params}, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _connect(self):
+        # sqlite3 connections can't be shared between threads, so keep one per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str):
+        now = time.time()
+        try:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT response, created_at, last_access FROM generations WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or row[1] + self.ttl <= now:
+                self.misses += 1
+                return None
+            if now - row[2] > self.ACCESS_UPDATE_INTERVAL:
+                conn.execute("UPDATE generations SET last_access = ? WHERE key = ?", (now, key))
+                conn.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"Generation cache read failed: {e}")
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, key: str, model_name: str, response) -> None:
+        now = time.time()
+        serialized = json.dumps(response)
+        try:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO generations (key, model, response, size, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model_name, serialized, len(serialized.encode("utf-8")), now, now)
+            )
+            conn.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"Generation cache write failed: {e}")
+
+    def compact(self) -> int:
+        """Drop expired entries and trim to max_bytes by last access. Returns rows removed."""
+        conn = self._connect()
+        now = time.time()
+        # BEGIN IMMEDIATE takes the write lock, so only one worker compacts per interval
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT value FROM meta WHERE name = 'last_compaction'").fetchone()
+            if row is not None and now - row[0] < self.compact_interval / 2:
+                conn.rollback()
+                return 0
+            removed = conn.execute("DELETE FROM generations WHERE created_at + ? <= ?", (self.ttl, now)).rowcount
+            entries, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM generations").fetchone()
+            if total > self.max_bytes:
+                # Walk entries from least recently used until enough bytes are freed
+                excess = total - self.max_bytes
+                doomed = []
+                for key, size in conn.execute("SELECT key, size FROM generations ORDER BY last_access"):
+                    if excess <= 0:
+                        break
+                    doomed.append((key,))
+                    excess -= size
+                    total -= size
+                conn.executemany("DELETE FROM generations WHERE key = ?", doomed)
+                removed += len(doomed)
+                entries -= len(doomed)
+            # Recorded for stats(), so health checks and metrics scrapes never scan the table
+            conn.executemany(
+                "INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)",
+                [("last_compaction", now), ("entries", entries), ("bytes", total)]
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        if removed:
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        self.evictions += removed
+        return removed
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._compaction_loop, name="generation-cache-compactor", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _compaction_loop(self):
+        while not self._stop.wait(self.compact_interval):
+            try:
+                removed = self.compact()
+                if removed:
+                    logger.info(f"Generation cache compaction removed {removed} entries")
+            except sqlite3.Error as e:
+                logger.warning(f"Generation cache compaction failed: {e}")
+
+    def stats(self):
+        """Counters plus the entry count and size as of the last compaction by any worker (None before the first)"""
+        try:
+            counts = dict(self._connect().execute(
+                "SELECT name, value FROM meta WHERE name IN ('entries', 'bytes', 'last_compaction')"
+            ).fetchall())
+        except sqlite3.Error:
+            counts = {}
+        entries, size = counts.get("entries"), counts.get("bytes")
+        return {
+            "path": self.path,
+            "entries": int(entries) if entries is not None else None,
+            "bytes": int(size) if size is not None else None,
+            "counted_at": counts.get("last_compaction"),
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions
+        }
+
+generation_cache = None
+if GENERATION_CACHE_PATH:
+    try:
+        generation_cache = GenerationCache(
+            GENERATION_CACHE_PATH,
+            ttl=GENERATION_CACHE_TTL,
+            max_bytes=GENERATION_CACHE_MAX_BYTES,
+            compact_interval=GENERATION_CACHE_COMPACT_INTERVAL
+        )
+    except (sqlite3.Error, OSError) as e:
+        logger.error(f"Could not open generation cache at {GENERATION_CACHE_PATH}: {e}")
+
+def generate_texts(prompts, max_new_tokens=200, stop_patterns=(), temperature=0.7, top_p=0.9):
+    """Generate for many prompts at once, returning the pipeline output or the raised Exception per prompt, in order.
 
+    Results are looked up in and written to the persistent generation_cache when one is
+    configured. All misses are handed to text_batcher together so they run as full padded
+    batches. This blocks until every batch completes; async code should go through
+    inference_executor.
+    """
     # Get text generator from cache
     text_generator = MODEL_CACHE.get("text_generator")
-
     if text_generator is None:
-        # Fallback text if model failed to load
-        return [{
-            "generated_text": f"\n\nI apologize, but I'm currently unable to access my language generation capabilities. "
-                             f"Please try again later or contact support if this issue persists."
-        }]
+        return [ModelLoadingError("Text generation model unavailable")] * len(prompts)
+
+    # Include the backend so int8/onnx generations are never served for fp32 and vice versa
+    model_name = f"{getattr(text_generator.model, 'name_or_path', 'text_generator')}:{getattr(text_generator, 'inference_backend', 'fp32')}"
+    params = {"max_new_tokens": max_new_tokens, "stop_patterns": list(stop_patterns), "temperature": temperature, "top_p": top_p}
+
+    results = [None] * len(prompts)
+    pending = []
+    for index, prompt in enumerate(prompts):
+        cache_key = None
+        if generation_cache is not None:
+            cache_key = GenerationCache.make_key(prompt, model_name, params)
+            cached = generation_cache.get(cache_key)
+            if cached is not None:
+                results[index] = cached
+                continue
+        future = text_batcher.submit(prompt, max_new_tokens=max_new_tokens, stop_patterns=stop_patterns) #, temperature=temperature, top_p=top_p) # Add temperature and top_p in model's generate function
+        pending.append((index, cache_key, future))
+
+    for index, cache_key, future in pending:
+        try:
+            response = future.result()
+        except Exception as e:
+            logger.error(f"Error in text generation: {str(e)}")
+            results[index] = e
+            continue
+        if cache_key is not None:
+            generation_cache.set(cache_key, model_name, response)
+        results[index] = response
+    return results
+
+# Semantic answer cache: nearest past question by embedding similarity
+class SemanticCache:
+    """Answers keyed by what a question means rather than its exact wording.
+
+    Questions are embedded with the "embedder" model and their unit vectors kept in one
+    preallocated matrix, so a lookup is a single matrix-vector product. A past answer is
+    reused when its question's cosine similarity reaches `threshold`. Entries expire after
+    `ttl` seconds, and once `max_entries` are held the least recently used one is replaced.
+    """
+
+    def __init__(self, name: str, threshold: float, max_entries: int, ttl: float):
+        self.name = name
+        self.threshold = threshold
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._matrix = None  # (max_entries, dim) float32, allocated on the first insert; free rows are zero
+        self._entries = [None] * self.max_entries  # row -> [question, value, expires_at, last_used]
+        self._free = list(range(self.max_entries - 1, -1, -1))
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def embed(question: str) -> Optional[np.ndarray]:
+        embedder = MODEL_CACHE.get("embedder")
+        if embedder is None:
+            return None
+        embedding = embedder.encode(" ".join(question.split()), normalize_embeddings=True, convert_to_numpy=True)
+        return embedding.astype(np.float32)
+
+    def lookup(self, question: str) -> Tuple[Optional[np.ndarray], Optional[dict]]:
+        """Embed the question and return (embedding, cached value or None).
+
+        Blocking, since it may load and run the embedding model. Embedding failures are
+        logged and reported as (None, None) so callers simply skip the cache.
+        """
+        try:
+            embedding = self.embed(question)
+        except Exception as e:
+            logger.warning(f"Could not embed question for {self.name}: {e}")
+            return None, None
+        if embedding is None:
+            return None, None
+
+        with self._lock:
+            if self._matrix is None or self._matrix.shape[1] != embedding.shape[0]:
+                self.misses += 1
+                return embedding, None
+            scores = self._matrix @ embedding
+            now = time.monotonic()
+            candidates = np.flatnonzero(scores >= self.threshold)
+            for row in candidates[np.argsort(-scores[candidates])]:
+                entry = self._entries[row]
+                if entry is None:
+                    continue
+                if entry[2] <= now:
+                    self._clear(row)
+                    continue
+                entry[3] = now
+                self.hits += 1
+                logger.info(f"Semantic cache hit for {self.name} (similarity {scores[row]:.3f}): {entry[0]!r}")
+                return embedding, entry[1]
+            self.misses += 1
+            return embedding, None
+
+    def add(self, question: str, embedding: np.ndarray, value: dict):
+        with self._lock:
+            if self._matrix is None or self._matrix.shape[1] != embedding.shape[0]:
+                # First insert, or the embedding model changed: start over with a matrix of the new width
+                self._matrix = np.zeros((self.max_entries, embedding.shape[0]), dtype=np.float32)
+                self._entries = [None] * self.max_entries
+                self._free = list(range(self.max_entries - 1, -1, -1))
+            row = self._free.pop() if self._free else self._evict()
+            now = time.monotonic()
+            self._matrix[row] = embedding
+            self._entries[row] = [question, value, now + self.ttl, now]
+
+    def _evict(self) -> int:
+        # Prefer expired entries, then the least recently used
+        now = time.monotonic()
+        row = min(
+            range(self.max_entries),
+            key=lambda index: (self._entries[index][2] > now, self._entries[index][3])
+        )
+        self._clear(row)
+        self.evictions += 1
+        return self._free.pop()
+
+    def _clear(self, row: int):
+        self._matrix[row] = 0.0
+        self._entries[row] = None
+        self._free.append(row)
+
+    def stats(self):
+        with self._lock:
+            entries = self.max_entries - len(self._free) if self._matrix is not None else 0
+        return {
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "threshold": self.threshold,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions
+        }
 
-    # Generate text with error handling
-    try:
-        response = text_generator(prompt, max_length=max_length, num_return_sequences=1) #, temperature=temperature, top_p=top_p) # Add temperature and top_p in model's generate function
-        logger.info(f"Text generation took {time.time() - start_time:.2f} seconds")
-        return response
-    except Exception as e:
-        logger.error(f"Error in text generation: {str(e)}")
-        return [{
-            "generated_text": f"{prompt}\n\nI apologize, but I encountered an error while generating a response. "
-                             f"Please try again with a simpler request."
-        }]
+semantic_cache = None
+if SEMANTIC_CACHE_ENABLED:
+    semantic_cache = SemanticCache(
+        "chat",
+        threshold=SEMANTIC_CACHE_THRESHOLD,
+        max_entries=SEMANTIC_CACHE_MAX_ENTRIES,
+        ttl=SEMANTIC_CACHE_TTL
+    )
+
+# Text generation - Consider adding generation parameters
+def generate_text(prompt, max_new_tokens=200, stop_patterns=(), temperature=0.7, top_p=0.9): #Added temp and top_p for control
+    """A single-prompt wrapper around generate_texts.
+
+    Repeats are served by the endpoints' response caches and the persistent generation_cache.
+    Raises ModelLoadingError while the model is unavailable and re-raises generation errors;
+    the endpoints turn those into apology text outside any cache. Blocking; async code should
+    go through inference_executor.
+    """
+    start_time = time.time()
+
+    response = generate_texts([prompt], max_new_tokens=max_new_tokens, stop_patterns=stop_patterns, temperature=temperature, top_p=top_p)[0]
+    if isinstance(response, Exception):
+        raise response
+    logger.info(f"Text generation took {time.time() - start_time:.2f} seconds")
+    return response
 
 # === Data Models ===
 
@@ -198,6 +1598,7 @@ class NoticeData(BaseModel):
 # Document Analysis Request
 class DocumentAnalysisRequest(BaseModel):
     query: Optional[str] = "Summarize this document"
+    summary_mode: Literal["map_reduce", "single"] = "map_reduce"  # Anything else is rejected with a 422
 
 # Legal Roadmap Request
 class RoadmapRequest(BaseModel):
@@ -210,6 +1611,11 @@ class TranslationRequest(BaseModel):
     text: str
     dest_lang: str = "en"
 
+# Batch Translation Request
+class TranslationBatchRequest(BaseModel):
+    texts: List[str]
+    dest_lang: str = "en"
+
 # Response Models for better documentation
 class ChatResponse(BaseModel):
     response: str
@@ -227,6 +1633,43 @@ class TranslationResponse(BaseModel):
     source_text: str
     target_language: str
 
+class TranslationBatchResponse(BaseModel):
+    translations: List[str]
+    target_language: str
+
+# Batch requests and per-item results for the generation endpoints
+class ChatBatchRequest(BaseModel):
+    items: List[Query]
+
+class NoticeBatchRequest(BaseModel):
+    items: List[NoticeData]
+
+class RoadmapBatchRequest(BaseModel):
+    items: List[RoadmapRequest]
+
+class ChatBatchResult(BaseModel):
+    response: Optional[str] = None
+    error: Optional[str] = None
+
+class NoticeBatchResult(BaseModel):
+    notice: Optional[str] = None
+    error: Optional[str] = None
+
+class RoadmapBatchResult(BaseModel):
+    steps: Optional[List[str]] = None
+    jurisdiction: Optional[str] = None
+    issue_type: Optional[str] = None
+    error: Optional[str] = None
+
+class ChatBatchResponse(BaseModel):
+    results: List[ChatBatchResult]
+
+class NoticeBatchResponse(BaseModel):
+    results: List[NoticeBatchResult]
+
+class RoadmapBatchResponse(BaseModel):
+    results: List[RoadmapBatchResult]
+
 class DocumentAnalysisResponse(BaseModel):
     answer: Optional[str] = None
     confidence: Optional[float] = None
@@ -235,21 +1678,17 @@ class DocumentAnalysisResponse(BaseModel):
     document_text: Optional[str] = None
     message: Optional[str] = None
 
-# === API Endpoints ===
+# === Prompt Templates ===
 
-# Health check endpoint
-@app.get("/health", status_code=200)
-def health_check():
-    """Health check endpoint to verify API is operational"""
-    return {"status": "healthy", "models_loaded": {k: (v is not None) for k, v in MODEL_CACHE.items()}}
+CHAT_RESPONSE_MARKER = "Legal response:"
+NOTICE_TEXT_MARKER = "THE COMPLETE NOTICE TEXT:"
+ROADMAP_STEPS_MARKER = "THE ROADMAP STEPS:"
 
-# Chat Endpoint with improved performance and error handling
-@app.post("/chat/", response_model=ChatResponse)
-@response_cache()
-async def chat(data: Query):  # Now accepts 'data' which is a Query object
-    try:
-        # Expert prompt engineering for Indian legal context
-        legal_prompt = f"""
+CHAT_FALLBACK_RESPONSE = "I apologize, but I couldn't generate a proper legal response based on Indian law. Please try rephrasing your question with more specific details about your legal situation in India."
+
+def build_chat_prompt(data: Query) -> str:
+    # Expert prompt engineering for Indian legal context
+    legal_prompt = f"""
         You are KanoonSahayak, an expert Indian legal assistant trained in Indian law.
 
         Respond as a knowledgeable Indian legal professional would when answering this question:
@@ -262,43 +1701,11 @@ async def chat(data: Query):  # Now accepts 'data' which is a Query object
 
         Legal response:
         """
+    return legal_prompt.strip()
 
-        # Generate a response with the optimized prompt
-        response = generate_text(legal_prompt.strip(), max_length=300)
-
-        if not response:
-            raise HTTPException(status_code=500, detail="No response from the legal language model.")
-
-        # Extract just the response portion (after the prompt)
-        generated_text = response[0]["generated_text"]
-
-        # Find the "Legal response:" marker and extract content after it
-        marker = "Legal response:"
-        if marker in generated_text:
-            answer = generated_text.split(marker, 1)[1].strip()
-        else:
-            # If marker not found, try to remove the prompt portion
-            answer = generated_text.replace(legal_prompt.strip(), "").strip()
-
-        # Clean up the response
-        answer = answer.replace("\n\n\n", "\n\n").replace("\n\n", "\n").strip()
-
-        # If answer is empty or too short after cleaning, provide a fallback
-        if not answer or len(answer) < 10:
-            answer = "I apologize, but I couldn't generate a proper legal response based on Indian law. Please try rephrasing your question with more specific details about your legal situation in India."
-
-        return {"response": answer}
-    except Exception as e:
-        logger.error(f"Error in chat endpoint: {str(e)}")
-        return {"response": "I apologize for the technical difficulty. Our legal assistant is currently unable to process your request. Please try again in a few moments."}
-
-# Generate Legal Notice Endpoint with optimized prompts
-@app.post("/generate_notice/", response_model=NoticeResponse)
-@response_cache()
-async def generate_notice(data: NoticeData): # Now accepts 'data' which is a NoticeData object
-    try:
-        # Improved prompt with Indian legal context
-        prompt = f"""
+def build_notice_prompt(data: NoticeData) -> str:
+    # Improved prompt with Indian legal context
+    prompt = f"""
         You are drafting an official Indian legal notice. Generate a formal legal notice following standard Indian legal format with these details:
 
         RECIPIENT: {data.recipient_name}
@@ -321,30 +1728,13 @@ async def generate_notice(data: NoticeData): # Now accepts 'data' which is a Not
 
         THE COMPLETE NOTICE TEXT:
         """
+    return prompt.strip()
 
-        response = generate_text(prompt.strip(), max_length=500)
-
-        if not response:
-            raise HTTPException(status_code=500, detail="No response from the legal language model.")
-
-        # Extract the notice from after "THE COMPLETE NOTICE TEXT:" marker
-        generated_text = response[0]["generated_text"]
-        marker = "THE COMPLETE NOTICE TEXT:"
-
-        if marker in generated_text:
-            notice = generated_text.split(marker, 1)[1].strip()
-        else:
-            # Fallback if marker not found
-            notice = generated_text.replace(prompt.strip(), "").strip()
-
-        # Clean up the notice
-        notice = notice.strip()
+def build_fallback_notice(data: NoticeData) -> str:
+    """Basic notice structure used when the model didn't provide one"""
+    current_date = "DATE: [Current Date]"
 
-        # Add basic structure if the model didn't provide it
-        if len(notice) < 100 or "NOTICE" not in notice.upper():
-            current_date = "DATE: [Current Date]"
-
-            notice = f"""
+    return f"""
             LEGAL NOTICE
 
             {current_date}
@@ -369,18 +1759,9 @@ async def generate_notice(data: NoticeData): # Now accepts 'data' which is a Not
             {data.your_name}
             """
 
-        return {"notice": notice}
-    except Exception as e:
-        logger.error(f"Error generating notice: {str(e)}")
-        return {"notice": "Error generating legal notice. Please try again with more specific details."}
-
-# Legal Roadmap Generator with optimized prompts
-@app.post("/roadmap/", response_model=RoadmapResponse)
-@response_cache()
-async def roadmap(data: RoadmapRequest): # Now accepts 'data' which is a RoadmapRequest object
-    try:
-        # Improved prompt with Indian legal context
-        prompt = f"""
+def build_roadmap_prompt(data: RoadmapRequest) -> str:
+    # Improved prompt with Indian legal context
+    prompt = f"""
         Create a detailed Indian legal roadmap for handling '{data.issue_type}' in {data.jurisdiction}.
 
         This roadmap should:
@@ -398,96 +1779,950 @@ async def roadmap(data: RoadmapRequest): # Now accepts 'data' which is a Roadmap
 
         THE ROADMAP STEPS:
         """
+    return prompt.strip()
+
+def build_fallback_roadmap_steps(data: RoadmapRequest) -> List[str]:
+    """Generic steps with Indian context, used when the model didn't provide clear ones"""
+    return [
+        f"Step 1: Initial assessment of your {data.issue_type} situation under Indian law",
+        f"Step 2: Gather necessary documentation including Aadhaar card, PAN card, and relevant evidence for {data.issue_type}",
+        f"Step 3: Consult with an advocate specializing in {data.issue_type} matters in {data.jurisdiction}",
+        f"Step 4: Draft and file appropriate petition/application with the relevant court or authority (District Court/High Court/National Commission as applicable)",
+        f"Step 5: Pay the required court fees and ensure proper filing as per Civil Procedure Code requirements",
+        f"Step 6: Attend hearings as scheduled and follow advocate's guidance",
+        f"Step 7: Monitor progress through the Indian judicial system and prepare for potential appeals if necessary",
+        f"Step 8: Follow the guidance of the legal professionals involved, respecting Indian law and court proceedings"
+    ]
+
+def extract_after_marker(generated_text: str, marker: str, prompt: str) -> str:
+    """Return the generated text after the prompt's marker, or with the prompt removed if the marker is missing"""
+    if marker in generated_text:
+        return generated_text.split(marker, 1)[1].strip()
+    # If marker not found, try to remove the prompt portion
+    return generated_text.replace(prompt, "").strip()
+
+def finalize_chat_answer(answer: str) -> str:
+    # Clean up the response
+    answer = answer.replace("\n\n\n", "\n\n").replace("\n\n", "\n").strip()
+
+    # If answer is empty or too short after cleaning, provide a fallback
+    if not answer or len(answer) < 10:
+        answer = CHAT_FALLBACK_RESPONSE
+    return answer
+
+def finalize_notice(notice: str, data: NoticeData) -> str:
+    # Clean up the notice
+    notice = notice.strip()
+
+    # Add basic structure if the model didn't provide it
+    if len(notice) < 100 or "NOTICE" not in notice.upper():
+        notice = build_fallback_notice(data)
+    return notice
+
+# Static text each template renders before its first user field; their KV states are reused
+PROMPT_FIELD_SENTINEL = "\x00"
+
+def template_prefix(build_prompt, model_class) -> str:
+    """The template's text up to the last line break before its first field, or "" if there is none.
+
+    The cut comes before that line break and the indentation after it, because BPE tokenizers
+    merge whitespace into the next word's token; cutting later would give the prefix and the
+    rest of the prompt different tokens than the whole prompt gets.
+    """
+    fields = {name: PROMPT_FIELD_SENTINEL for name in model_class.model_fields}
+    head = build_prompt(model_class(**fields)).split(PROMPT_FIELD_SENTINEL, 1)[0]
+    cut = head.rfind("\n")
+    return head[:cut].rstrip() if cut > 0 else ""
+
+PROMPT_PREFIXES = sorted(
+    (
+        template_prefix(build_chat_prompt, Query),
+        template_prefix(build_notice_prompt, NoticeData),
+        template_prefix(build_roadmap_prompt, RoadmapRequest),
+    ),
+    key=len,
+    reverse=True
+)
 
-        response = generate_text(prompt.strip(), max_length=500)
+def match_prompt_prefix(prompt: str) -> Optional[str]:
+    """Return the longest template prefix the prompt starts with"""
+    for prefix in PROMPT_PREFIXES:
+        if prefix and prompt.startswith(prefix):
+            return prefix
+    return None
+
+# Per-endpoint token budgets and end-of-answer patterns
+class GenerationBudget:
+    """Prompt and output token limits for one endpoint, plus the text that marks the end of its answer"""
+
+    def __init__(self, prompt_tokens: int, max_new_tokens: int, stop_patterns: Tuple[str, ...] = ()):
+        self.prompt_tokens = prompt_tokens
+        self.max_new_tokens = max_new_tokens
+        self.stop_patterns = tuple(stop_patterns)
+
+    def prompt_limit(self, tokenizer) -> int:
+        # Keep prompt plus output inside the model's context window
+        context = getattr(tokenizer, "model_max_length", None) or 0
+        if 0 < context < 1_000_000:  # Tokenizers without a limit report a huge sentinel value
+            return max(1, min(self.prompt_tokens, context - self.max_new_tokens))
+        return self.prompt_tokens
+
+# The model repeating a template's opening or marker means the answer is over and it is inventing a new prompt
+CHAT_BUDGET = GenerationBudget(CHAT_PROMPT_TOKENS, CHAT_MAX_NEW_TOKENS, (CHAT_RESPONSE_MARKER, "You are KanoonSahayak", "\n\n\n\n"))
+NOTICE_BUDGET = GenerationBudget(NOTICE_PROMPT_TOKENS, NOTICE_MAX_NEW_TOKENS, (NOTICE_TEXT_MARKER, "You are drafting an official", "\n\n\n\n"))
+ROADMAP_BUDGET = GenerationBudget(ROADMAP_PROMPT_TOKENS, ROADMAP_MAX_NEW_TOKENS, (ROADMAP_STEPS_MARKER, "Create a detailed Indian legal roadmap", "\n\n\n\n"))
+
+def fit_prompt(build_prompt, data: BaseModel, max_prompt_tokens: int, tokenizer=None) -> str:
+    """Render the prompt, truncating the request's text fields until it fits in max_prompt_tokens.
+
+    Each field gets an equal share of the tokens the template leaves free, and whatever the
+    shorter fields don't use goes to the longer ones.
+    """
+    prompt = build_prompt(data)
+    if tokenizer is None or len(tokenizer.encode(prompt)) <= max_prompt_tokens:
+        return prompt
+
+    fields = {
+        name: tokenizer.encode(value, add_special_tokens=False)
+        for name, value in data.model_dump().items()
+        if isinstance(value, str) and value
+    }
+    if not fields:
+        return prompt
+    template_tokens = len(tokenizer.encode(build_prompt(data.model_copy(update={name: "" for name in fields}))))
+    available = max(0, max_prompt_tokens - template_tokens)
+    limits = {}
+    by_length = sorted(fields, key=lambda name: len(fields[name]))
+    for position, name in enumerate(by_length):
+        limits[name] = min(len(fields[name]), available // (len(by_length) - position))
+        available -= limits[name]
+
+    # Tokens can merge differently once the fields are back in the template, so re-check the total
+    while True:
+        update = {name: tokenizer.decode(ids[:limits[name]]).strip() for name, ids in fields.items() if limits[name] < len(ids)}
+        prompt = build_prompt(data.model_copy(update=update))
+        overflow = len(tokenizer.encode(prompt)) - max_prompt_tokens
+        longest = max(limits, key=limits.get)
+        if overflow <= 0 or limits[longest] == 0:
+            break
+        limits[longest] = max(0, limits[longest] - overflow)
+    logger.info(f"Truncated {', '.join(update)} to fit the {max_prompt_tokens}-token prompt budget")
+    return prompt
+
+async def build_budgeted_prompts(build_prompt, items: list, budget: GenerationBudget) -> List[str]:
+    """Render one prompt per request model, fitted to the budget with the text generator's tokenizer"""
+    text_generator = await MODEL_CACHE.aget("text_generator")
+    tokenizer = getattr(text_generator, "tokenizer", None)
+    limit = budget.prompt_limit(tokenizer)
+    return await asyncio.to_thread(lambda: [fit_prompt(build_prompt, item, limit, tokenizer) for item in items])
+
+# Turn generated text into each endpoint's response payload
+def chat_result(data: Query, prompt: str, generated_text: str) -> dict:
+    # Extract just the response portion (after the "Legal response:" marker)
+    answer = extract_after_marker(generated_text, CHAT_RESPONSE_MARKER, prompt)
+    return {"response": finalize_chat_answer(answer)}
+
+def notice_result(data: NoticeData, prompt: str, generated_text: str) -> dict:
+    # Extract the notice from after "THE COMPLETE NOTICE TEXT:" marker
+    notice = extract_after_marker(generated_text, NOTICE_TEXT_MARKER, prompt)
+    return {"notice": finalize_notice(notice, data)}
+
+def roadmap_result(data: RoadmapRequest, prompt: str, generated_text: str) -> dict:
+    # Extract the roadmap steps from after "THE ROADMAP STEPS:" marker
+    roadmap_text = extract_after_marker(generated_text, ROADMAP_STEPS_MARKER, prompt)
+
+    # Process into clear steps
+    steps = [line.strip() for line in roadmap_text.split("\n") if line.strip()]
+
+    # If the model didn't provide clear steps, structure them with Indian context
+    if len(steps) < 3:
+        steps = build_fallback_roadmap_steps(data)
+
+    return {"steps": steps, "jurisdiction": data.jurisdiction, "issue_type": data.issue_type}
+
+# === Batch Generation ===
+
+async def run_generation_batch(items: list, cache: ResponseCache, build_prompt, build_result, budget: GenerationBudget) -> List[dict]:
+    """Run many templated generations through the model as real batches.
+
+    Items already in the endpoint's response cache are served from it, duplicates are generated
+    once, and the rest go to generate_texts together in a single inference slot. Returns one
+    result payload per item in input order, with a per-item "error" instead of failing the batch.
+    """
+    if len(items) > MAX_GENERATION_BATCH:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_GENERATION_BATCH} items can be processed per request.")
+
+    results = [None] * len(items)
+    pending = {}  # cache key -> indices of items waiting on that generation
+    for index, item in enumerate(items):
+        key = make_cache_key(item)
+        hit, value = cache.get(key)
+        if hit:
+            cache.hits += 1
+            results[index] = dict(value, error=None)
+        else:
+            pending.setdefault(key, []).append(index)
 
-        if not response:
-            raise HTTPException(status_code=404, detail="No roadmap generated.")
+    if pending:
+        keys = list(pending)
+        cache.misses += len(keys)
+        prompts = await build_budgeted_prompts(build_prompt, [items[pending[key][0]] for key in keys], budget)
+        start_time = time.time()
+        outputs = await inference_executor.run(
+            generate_texts, prompts, max_new_tokens=budget.max_new_tokens, stop_patterns=budget.stop_patterns
+        )
+        logger.info(f"Batch of {len(prompts)} generation(s) for {cache.name} took {time.time() - start_time:.2f} seconds")
 
-        # Extract the roadmap steps from after "THE ROADMAP STEPS:" marker
-        generated_text = response[0]["generated_text"]
-        marker = "THE ROADMAP STEPS:"
+        for key, prompt, output in zip(keys, prompts, outputs):
+            try:
+                if isinstance(output, Exception):
+                    raise output
+                value = build_result(items[pending[key][0]], prompt, output[0]["generated_text"])
+                cache.set(key, value)
+                result = dict(value, error=None)
+            except Exception as e:
+                logger.error(f"Error in batch item for {cache.name}: {str(e)}")
+                result = {"error": f"Generation failed: {e}"}
+            for index in pending[key]:
+                results[index] = result
+    return results
+
+# === Token Streaming ===
+
+class AsyncTextStreamer(TextStreamer):
+    """TextStreamer that hands decoded text from the generation thread to an asyncio queue"""
+
+    def __init__(self, tokenizer, loop):
+        super().__init__(tokenizer, skip_prompt=True, skip_special_tokens=True)
+        self.loop = loop
+        self.queue = asyncio.Queue()
+
+    def on_finalized_text(self, text: str, stream_end: bool = False):
+        if text:
+            self.loop.call_soon_threadsafe(self.queue.put_nowait, text)
+        if stream_end:
+            self.loop.call_soon_threadsafe(self.queue.put_nowait, None)
+
+class IncrementalMarkerStripper:
+    """Applies an endpoint's marker stripping and whitespace cleanup to text as it streams in.
+
+    Nothing is emitted until the marker has been seen in prompt + generated text; after that,
+    leading whitespace is dropped. With collapse_newlines (the chat answer's cleanup) runs of
+    blank lines collapse to single newlines; without it the text keeps its line breaks and is
+    only stripped, like a non-streamed notice. Text from the first stop pattern on is dropped,
+    as it is from non-streamed generations.
+    """
+
+    def __init__(self, marker: str, prompt: str, stop_patterns: Tuple[str, ...] = (), collapse_newlines: bool = True):
+        self.marker = marker
+        self.prompt = prompt
+        self.stop_patterns = tuple(pattern for pattern in stop_patterns if pattern)
+        self.collapse_newlines = collapse_newlines
+        self.text = ""  # Everything emitted so far
+        self._buffer = prompt
+        self._found = False
+        self._started = False
+        self._pending = ""  # Whitespace held back until more text follows it
+        self._unchecked = ""  # Generated text that could still turn out to start a stop pattern
+        self._stopped = False
+
+    def feed(self, chunk: str) -> str:
+        if self._stopped:
+            return ""
+        if not self._found:
+            self._buffer += chunk
+            if self.marker not in self._buffer:
+                return ""
+            self._found = True
+            chunk = self._buffer.split(self.marker, 1)[1]
+            self._buffer = ""
+        return self._clean(self._until_stop(chunk))
+
+    def finish(self) -> str:
+        if self._stopped:
+            return ""
+        if self._found:
+            return self._clean(self._until_stop("", final=True))
+        # Marker never appeared: mirror the non-streaming fallback and drop the prompt
+        remainder = self._buffer.replace(self.prompt, "")
+        self._buffer = ""
+        return self._clean(self._until_stop(remainder, final=True))
+
+    def _until_stop(self, chunk: str, final: bool = False) -> str:
+        """Release text up to the first stop pattern, holding back a tail that may be the start of one"""
+        text = self._unchecked + chunk
+        trimmed = trim_at_stop_patterns(text, self.stop_patterns)
+        if len(trimmed) < len(text):
+            self._stopped = True
+            self._unchecked = ""
+            return trimmed
+        hold = 0 if final else max((len(pattern) - 1 for pattern in self.stop_patterns), default=0)
+        split = max(0, len(text) - hold)
+        self._unchecked = text[split:]
+        return text[:split]
+
+    def _clean(self, chunk: str) -> str:
+        out = []
+        for ch in chunk:
+            if not self._started:
+                if ch.isspace():
+                    continue
+                self._started = True
+            if self.collapse_newlines and ch == "\n":
+                # Hold newlines back so trailing and repeated ones never reach the client
+                self._pending = "\n"
+                continue
+            if not self.collapse_newlines and ch.isspace():
+                # Hold whitespace back so the streamed text ends stripped
+                self._pending += ch
+                continue
+            out.append(self._pending)
+            self._pending = ""
+            out.append(ch)
+        cleaned = "".join(out)
+        self.text += cleaned
+        return cleaned
+
+class TextGenerationStream:
+    """One streaming generation running in a model slot.
+
+    The slot is claimed in the constructor so overload is reported as a 503 before the
+    response starts; chunks() then yields cleaned text as the pipeline produces tokens.
+    """
+
+    def __init__(self, text_generator, prompt: str, budget: GenerationBudget, marker: str, collapse_newlines: bool = True):
+        if text_generator is None:
+            raise HTTPException(status_code=503, detail="Text generation model unavailable.")
+        self.streamer = AsyncTextStreamer(text_generator.tokenizer, asyncio.get_running_loop())
+        self.stripper = IncrementalMarkerStripper(marker, prompt, budget.stop_patterns, collapse_newlines)
+        self.cancelled = threading.Event()
+        self.generation = inference_executor.submit(
+            run_text_generator, text_generator, [prompt], budget.max_new_tokens, budget.stop_patterns,
+            streamer=self.streamer, cancelled=self.cancelled
+        )
+        # Make sure the consumer wakes up even if generation fails before the streamer ends
+        self.generation.add_done_callback(lambda _: self.streamer.queue.put_nowait(None))
+
+    @property
+    def text(self) -> str:
+        return self.stripper.text
 
-        if marker in generated_text:
-            roadmap_text = generated_text.split(marker, 1)[1].strip()
+    def cancel(self):
+        """Stop generating at the next token instead of running to max_new_tokens in the model slot"""
+        if not self.generation.done():
+            self.cancelled.set()
+
+    async def chunks(self):
+        start_time = time.time()
+        first_token_logged = False
+        while True:
+            chunk = await self.streamer.queue.get()
+            if chunk is None:
+                break
+            cleaned = self.stripper.feed(chunk)
+            if cleaned:
+                if not first_token_logged:
+                    logger.info(f"Time to first token: {time.time() - start_time:.2f} seconds")
+                    first_token_logged = True
+                yield cleaned
+        tail = self.stripper.finish()
+        if tail:
+            yield tail
+        # Surface generation errors to the caller
+        await self.generation
+        logger.info(f"Streaming text generation took {time.time() - start_time:.2f} seconds")
+
+def sse_event(payload: dict, event: Optional[str] = None) -> str:
+    """Format a Server-Sent Events message with a JSON payload"""
+    message = f"event: {event}\n" if event else ""
+    return message + f"data: {json.dumps(payload)}\n\n"
+
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+# === Document Ingestion ===
+
+class DocumentTooLargeError(HTTPException):
+    def __init__(self, limit: int):
+        super().__init__(status_code=413, detail=f"Uploaded document exceeds the {limit // (1024 * 1024)} MB limit.")
+
+async def spool_upload(file: UploadFile, max_bytes: int = MAX_UPLOAD_BYTES) -> Tuple[str, str]:
+    """Copy an upload to a temporary file in fixed-size chunks and return (path, sha256 hex digest).
+
+    Memory use stays at one chunk regardless of upload size; uploads over max_bytes are rejected.
+    The digest fingerprints the content the same way Document.generate_hash does in the backend.
+    """
+    suffix = os.path.splitext(file.filename or "")[1] or ".upload"
+    spooled = tempfile.NamedTemporaryFile(prefix="analyze_", suffix=suffix, delete=False)
+    digest = hashlib.sha256()
+    written = 0
+    try:
+        with spooled:
+            while True:
+                chunk = await file.read(UPLOAD_CHUNK_BYTES)
+                if not chunk:
+                    break
+                written += len(chunk)
+                if written > max_bytes:
+                    raise DocumentTooLargeError(max_bytes)
+                digest.update(chunk)
+                spooled.write(chunk)
+    except BaseException:
+        os.unlink(spooled.name)
+        raise
+    return spooled.name, digest.hexdigest()
+
+document_process_pool = None
+
+def get_document_process_pool() -> ProcessPoolExecutor:
+    global document_process_pool
+    if document_process_pool is None:
+        # Start workers fresh instead of forking: by the first upload this process runs the batcher,
+        # evictor, inference and torch threads, and a forked child can deadlock on their locks
+        if "forkserver" in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context("forkserver")
+            # Workers fork from a server that has already imported PyMuPDF and the __main__ script,
+            # so each one starts without importing anything itself
+            context.set_forkserver_preload(["__main__", "document_text"])
         else:
-            # Fallback if marker not found
-            roadmap_text = generated_text.replace(prompt.strip(), "").strip()
-
-        # Process into clear steps
-        steps = []
-        for line in roadmap_text.split("\n"):
-            if line.strip():
-                steps.append(line.strip())
-
-        # If the model didn't provide clear steps, structure them with Indian context
-        if len(steps) < 3:
-            steps = [
-                f"Step 1: Initial assessment of your {data.issue_type} situation under Indian law",
-                f"Step 2: Gather necessary documentation including Aadhaar card, PAN card, and relevant evidence for {data.issue_type}",
-                f"Step 3: Consult with an advocate specializing in {data.issue_type} matters in {data.jurisdiction}",
-                f"Step 4: Draft and file appropriate petition/application with the relevant court or authority (District Court/High Court/National Commission as applicable)",
-                f"Step 5: Pay the required court fees and ensure proper filing as per Civil Procedure Code requirements",
-                f"Step 6: Attend hearings as scheduled and follow advocate's guidance",
-                f"Step 7: Monitor progress through the Indian judicial system and prepare for potential appeals if necessary",
-                f"Step 8: Follow the guidance of the legal professionals involved, respecting Indian law and court proceedings"
-            ]
-
-        return {"steps": steps, "jurisdiction": data.jurisdiction, "issue_type": data.issue_type}
+            context = multiprocessing.get_context("spawn")
+        document_process_pool = ProcessPoolExecutor(max_workers=DOCUMENT_WORKERS, mp_context=context)
+    return document_process_pool
+
+async def run_in_document_pool(func, *args):
+    """Run func in the document process pool, replacing the pool if a worker died.
+
+    A worker killed mid-task (a PDF that crashes MuPDF, the OOM killer) breaks the whole
+    pool, so it is shut down and the call retried once on a fresh one before giving up.
+    """
+    global document_process_pool
+    loop = asyncio.get_running_loop()
+    for attempt in range(2):
+        pool = get_document_process_pool()
+        try:
+            return await loop.run_in_executor(pool, func, *args)
+        except BrokenProcessPool:
+            logger.error("A document worker died; restarting the document process pool")
+            # Concurrent requests may already have replaced it
+            if document_process_pool is pool:
+                document_process_pool = None
+            pool.shutdown(wait=False, cancel_futures=True)
+    raise HTTPException(status_code=503, detail="Document processing is temporarily unavailable. Please try again.")
+
+# Content-addressed cache for analysis results, keyed by "<sha256>:<artifact>"
+document_cache = ResponseCache("analyze_document", ttl=DOCUMENT_CACHE_TTL, max_bytes=DOCUMENT_CACHE_MAX_BYTES)
+RESPONSE_CACHES[document_cache.name] = document_cache
+
+# === Document Question Answering ===
+
+SEARCH_TOKEN_PATTERN = re.compile(r"\w+")
+
+def tokenize_for_search(text: str) -> List[str]:
+    """Lowercased word tokens used for lexical scoring"""
+    return SEARCH_TOKEN_PATTERN.findall(text.lower())
+
+def split_token_windows(document_text: str, tokenizer=None, window_tokens: int = QA_WINDOW_TOKENS, stride: int = QA_WINDOW_STRIDE) -> List[str]:
+    """Split a document into windows of at most `window_tokens` model tokens, overlapping by `stride`.
+
+    Windows are cut on the tokenizer's character offsets so each one fits the model's
+    context; without a fast tokenizer, whitespace-separated words are used instead.
+    """
+    step = max(1, window_tokens - stride)
+    spans = None
+    if tokenizer is not None and getattr(tokenizer, "is_fast", False):
+        encoding = tokenizer(document_text, add_special_tokens=False, return_offsets_mapping=True, verbose=False)
+        spans = encoding["offset_mapping"]
+    if spans is None:
+        spans = [match.span() for match in re.finditer(r"\S+", document_text)]
+
+    windows = []
+    for start in range(0, len(spans), step):
+        chunk = spans[start:start + window_tokens]
+        windows.append(document_text[chunk[0][0]:chunk[-1][1]])
+        if start + window_tokens >= len(spans):
+            break
+    return windows
+
+def bm25_top_k(query: str, passages: List[str], top_k: int, k1: float = 1.5, b: float = 0.75) -> List[int]:
+    """Return indices of the top_k passages for query under Okapi BM25"""
+    query_terms = set(tokenize_for_search(query))
+    passage_terms = [tokenize_for_search(passage) for passage in passages]
+    if not passages:
+        return []
+    avg_length = sum(len(terms) for terms in passage_terms) / len(passages) or 1.0
+
+    document_frequency = {}
+    for terms in passage_terms:
+        for term in query_terms.intersection(terms):
+            document_frequency[term] = document_frequency.get(term, 0) + 1
+
+    scores = []
+    for terms in passage_terms:
+        counts = {}
+        for term in terms:
+            if term in query_terms:
+                counts[term] = counts.get(term, 0) + 1
+        score = 0.0
+        for term, tf in counts.items():
+            idf = math.log(1 + (len(passages) - document_frequency[term] + 0.5) / (document_frequency[term] + 0.5))
+            score += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * len(terms) / avg_length))
+        scores.append(score)
+
+    ranked = sorted(range(len(passages)), key=lambda i: scores[i], reverse=True)
+    return ranked[:top_k]
+
+def answer_from_windows(qa_model, question: str, windows: List[str], top_k: int = QA_TOP_K) -> Optional[dict]:
+    """Run the QA model only on the top_k BM25 windows, in one batch, and return the best span"""
+    if not windows:
+        return None
+    selected = bm25_top_k(question, windows, top_k)
+    qa_inputs = [{"question": question, "context": windows[i]} for i in selected]
+    start_time = time.time()
+    responses = qa_model(qa_inputs, batch_size=len(qa_inputs))
+    # The pipeline returns a bare dict for a single input
+    if isinstance(responses, dict):
+        responses = [responses]
+    elapsed = time.time() - start_time
+    logger.info(f"QA over {len(qa_inputs)} of {len(windows)} windows took {elapsed:.2f} seconds")
+    record_inference(
+        "qa_model", elapsed, len(qa_inputs), getattr(qa_model, "tokenizer", None),
+        [windows[i] for i in selected], [response["answer"] for response in responses]
+    )
+    return max(responses, key=lambda response: response["score"])
+
+def build_qa_windows(qa_model, document_text: str) -> List[str]:
+    return split_token_windows(document_text, getattr(qa_model, "tokenizer", None), QA_WINDOW_TOKENS, QA_WINDOW_STRIDE)
+
+# === Document Summarization ===
+
+def evenly_spaced(items: list, count: int) -> list:
+    """Pick `count` items spread across the list, always keeping the first and last"""
+    if count >= len(items):
+        return items
+    if count <= 1:
+        return items[:1]
+    return [items[round(i * (len(items) - 1) / (count - 1))] for i in range(count)]
+
+def summarize_document(summarizer, document_text: str, mode: str = "map_reduce") -> Optional[str]:
+    """Summarize a document of any length.
+
+    "single" feeds the text to the summarizer as-is, truncated to the model's input limit.
+    "map_reduce" splits it into chunks that fit the model's window, summarizes them in batches,
+    and repeats on the joined chunk summaries until they fit into one final pass. The total
+    number of summarizer inputs is capped at SUMMARY_MAX_CALLS; when a level would exceed it,
+    an evenly spaced subset of chunks is summarized instead.
+    """
+    if mode == "single":
+        start_time = time.time()
+        response = summarizer(document_text, truncation=True)
+        record_inference("summarizer", time.time() - start_time, 1)
+        return response[0]['summary_text'] if response else None
+
+    start_time = time.time()
+    tokenizer = summarizer.tokenizer
+    budget = SUMMARY_MAX_CALLS
+    text = document_text
+    level = 0
+    while True:
+        chunks = split_token_windows(text, tokenizer, SUMMARY_CHUNK_TOKENS, stride=0)
+        # Reserve one call for the final pass
+        allowed = budget - 1
+        if len(chunks) <= 1 or allowed < 2:
+            break
+        if len(chunks) > allowed:
+            logger.info(f"Summary budget allows {allowed} of {len(chunks)} chunks at level {level}")
+            chunks = evenly_spaced(chunks, allowed)
+        level_start = time.time()
+        outputs = summarizer(
+            chunks,
+            batch_size=SUMMARY_BATCH_SIZE,
+            max_length=SUMMARY_CHUNK_MAX_LENGTH,
+            min_length=SUMMARY_CHUNK_MIN_LENGTH,
+            truncation=True
+        )
+        record_inference(
+            "summarizer", time.time() - level_start, len(chunks), tokenizer,
+            chunks, [output['summary_text'] for output in outputs]
+        )
+        budget -= len(chunks)
+        level += 1
+        text = "\n".join(output['summary_text'] for output in outputs)
+
+    final_start = time.time()
+    response = summarizer(text, truncation=True)
+    record_inference(
+        "summarizer", time.time() - final_start, 1, tokenizer,
+        [text], [response[0]['summary_text']] if response else None
+    )
+    logger.info(f"Map-reduce summarization over {level} level(s) took {time.time() - start_time:.2f} seconds")
+    return response[0]['summary_text'] if response else None
+
+# === Translation ===
+
+class TranslationBackend:
+    """Interface for translation providers: translate a list of texts into one target language"""
+
+    name = "base"
+
+    def translate_batch(self, texts: List[str], dest_lang: str) -> List[str]:
+        raise NotImplementedError
+
+class GoogleTranslationBackend(TranslationBackend):
+    """deep_translator's GoogleTranslator, reusing one translator per target language and thread"""
+
+    name = "google"
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def _translator(self, dest_lang: str) -> GoogleTranslator:
+        translators = getattr(self._local, "translators", None)
+        if translators is None:
+            translators = self._local.translators = {}
+        if dest_lang not in translators:
+            translators[dest_lang] = GoogleTranslator(source="auto", target=dest_lang)
+        return translators[dest_lang]
+
+    def translate_batch(self, texts: List[str], dest_lang: str) -> List[str]:
+        return self._translator(dest_lang).translate_batch(texts)
+
+class OfflineTranslationBackend(TranslationBackend):
+    """Deterministic local stand-in for tests and offline development; tags text with the target language"""
+
+    name = "offline"
+
+    def translate_batch(self, texts: List[str], dest_lang: str) -> List[str]:
+        return [f"[{dest_lang}] {text}" for text in texts]
+
+TRANSLATION_BACKENDS = {
+    "google": GoogleTranslationBackend,
+    "offline": OfflineTranslationBackend,
+}
+
+translation_backend = TRANSLATION_BACKENDS.get(TRANSLATION_BACKEND, GoogleTranslationBackend)()
+
+# Per-sentence translations, keyed by "<dest_lang>:<sentence>"
+sentence_translation_cache = ResponseCache(
+    "translation_sentences", ttl=TRANSLATION_CACHE_TTL, max_bytes=TRANSLATION_SENTENCE_CACHE_MAX_BYTES
+)
+RESPONSE_CACHES[sentence_translation_cache.name] = sentence_translation_cache
+
+# Sentence boundaries: ., !, ? and the Devanagari danda, followed by whitespace
+SENTENCE_BOUNDARY_PATTERN = re.compile(r"(?<=[.!?।])(\s+)")
+ABBREVIATION_PATTERN = re.compile(r"(\S+)\.$")
+
+# Words that end in a period inside citations and names rather than at the end of a sentence
+NON_TERMINAL_ABBREVIATIONS = frozenset({
+    "sec", "secs", "ss", "u/s", "v", "vs", "no", "nos", "art", "arts", "cl", "cls", "ch",
+    "para", "paras", "ord", "viz", "cf", "mr", "mrs", "ms", "dr", "smt", "shri", "sh", "hon",
+})
+
+def ends_sentence(text: str, boundary: int, next_start: int) -> bool:
+    """Whether the period just before text[boundary] ends a sentence rather than an abbreviation or initial"""
+    match = ABBREVIATION_PATTERN.search(text, max(0, boundary - 32), boundary)
+    word = match.group(1).lstrip("(\"'[").lower() if match else ""
+    if word in NON_TERMINAL_ABBREVIATIONS or (len(word) == 1 and word.isalpha()):
+        return False
+    # "approx. the", "i.e. a": a sentence doesn't continue in lowercase
+    return next_start >= len(text) or not text[next_start].islower()
+
+def split_sentences(text: str) -> List[str]:
+    """Split text into [sentence, separator, sentence, ...] so it can be reassembled exactly.
+
+    ! ? and the danda always end a sentence; a period doesn't after legal abbreviations such
+    as "u/s.", "Sec." or "v." and initials, or when the next word starts in lowercase, so
+    citations reach the translator whole.
+    """
+    parts = []
+    start = 0
+    for match in SENTENCE_BOUNDARY_PATTERN.finditer(text):
+        if text[match.start() - 1] == "." and not ends_sentence(text, match.start(), match.end()):
+            continue
+        parts.append(text[start:match.start()])
+        parts.append(match.group(1))
+        start = match.end()
+    parts.append(text[start:])
+    return parts
+
+async def translate_texts(texts: List[str], dest_lang: str) -> List[str]:
+    """Translate texts sentence by sentence, sending only uncached unique sentences to the backend"""
+    split_texts = [split_sentences(text) for text in texts]
+    translations = {}
+    missing = []
+    for parts in split_texts:
+        for sentence in parts[::2]:
+            if not sentence.strip() or sentence in translations:
+                continue
+            hit, translated = sentence_translation_cache.get(f"{dest_lang}:{sentence}")
+            if hit:
+                sentence_translation_cache.hits += 1
+                translations[sentence] = translated
+            else:
+                sentence_translation_cache.misses += 1
+                translations[sentence] = None
+                missing.append(sentence)
+
+    if missing:
+        start_time = time.time()
+        translated = await asyncio.to_thread(translation_backend.translate_batch, missing, dest_lang)
+        logger.info(f"Translated {len(missing)} new sentence(s) with {translation_backend.name} in {time.time() - start_time:.2f} seconds")
+        for sentence, result in zip(missing, translated):
+            translations[sentence] = result
+            sentence_translation_cache.set(f"{dest_lang}:{sentence}", result)
+
+    results = []
+    for parts in split_texts:
+        pieces = []
+        for index, part in enumerate(parts):
+            # Even positions are sentences, odd positions are the whitespace between them
+            pieces.append((translations.get(part) or part) if index % 2 == 0 else part)
+        results.append("".join(pieces))
+    return results
+
+# === API Endpoints ===
+
+# Health check endpoint
+@app.get("/health", status_code=200)
+def health_check():
+    """Health check endpoint to verify API is operational"""
+    return {
+        "status": "healthy",
+        "models_loaded": {name: info["loaded"] for name, info in MODEL_CACHE.status().items()},
+        "inference": inference_executor.stats(),
+        "response_caches": {name: cache.stats() for name, cache in RESPONSE_CACHES.items()},
+        "generation_cache": generation_cache.stats() if generation_cache is not None else None,
+        "semantic_cache": semantic_cache.stats() if semantic_cache is not None else None
+    }
+
+# Prometheus text exposition of request, inference, cache and queue metrics
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    return PlainTextResponse(METRICS.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+# Readiness probe: 503 until the warm-up models are loaded
+@app.get("/ready")
+def readiness_check():
+    """Readiness probe: the warm-up list has been processed and every model in it is in memory"""
+    models = MODEL_CACHE.status()
+    missing = [name for name in MODEL_WARMUP if not MODEL_CACHE.is_loaded(name)]
+    ready = models_warmed_up.is_set() and not missing
+    content = {"status": "ready" if ready else "not_ready", "missing": missing, "models": models}
+    return JSONResponse(status_code=200 if ready else 503, content=content)
+
+# Chat Endpoint with improved performance and error handling
+@app.post("/chat/", response_model=ChatResponse)
+@response_cache(ttl=CHAT_CACHE_TTL)
+async def chat(data: Query):  # Now accepts 'data' which is a Query object
+    try:
+        # Differently worded versions of an already answered question reuse that answer
+        embedding = None
+        if semantic_cache is not None:
+            embedding, cached = await inference_executor.run(semantic_cache.lookup, data.question)
+            if cached is not None:
+                return cached
+
+        legal_prompt = (await build_budgeted_prompts(build_chat_prompt, [data], CHAT_BUDGET))[0]
+
+        # Generate a response with the optimized prompt; generate_texts hands back the exception when it fails
+        response = (await inference_executor.run(
+            generate_texts, [legal_prompt], max_new_tokens=CHAT_BUDGET.max_new_tokens, stop_patterns=CHAT_BUDGET.stop_patterns
+        ))[0]
+        if isinstance(response, Exception):
+            raise response
+
+        if not response:
+            raise HTTPException(status_code=500, detail="No response from the legal language model.")
+
+        result = chat_result(data, legal_prompt, response[0]["generated_text"])
+        # Only answers the model actually produced are reused for similar questions, never error or fallback text
+        if embedding is not None and result["response"] != CHAT_FALLBACK_RESPONSE:
+            semantic_cache.add(data.question, embedding, result)
+        return result
+    except ServerBusyError:
+        raise
+    except Exception as e:
+        logger.error(f"Error in chat endpoint: {str(e)}")
+        raise FallbackResponse({"response": "I apologize for the technical difficulty. Our legal assistant is currently unable to process your request. Please try again in a few moments."})
+
+# Streaming chat endpoint: sends tokens as Server-Sent Events while they are generated
+@app.post("/chat/stream")
+async def chat_stream(data: Query):
+    """Stream the chat answer as `data: {"token": ...}` events, then an `event: done` with the full response"""
+    text_generator = await MODEL_CACHE.aget("text_generator")
+    prompt = (await build_budgeted_prompts(build_chat_prompt, [data], CHAT_BUDGET))[0]
+    stream = TextGenerationStream(text_generator, prompt, CHAT_BUDGET, marker=CHAT_RESPONSE_MARKER)
+
+    async def events():
+        try:
+            async for chunk in stream.chunks():
+                yield sse_event({"token": chunk})
+            yield sse_event({"response": finalize_chat_answer(stream.text)}, event="done")
+        except Exception as e:
+            logger.error(f"Error in chat stream: {str(e)}")
+            yield sse_event({"detail": "Our legal assistant is currently unable to process your request. Please try again in a few moments."}, event="error")
+        finally:
+            # Runs when the client disconnects mid-stream too
+            stream.cancel()
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+# Batch chat endpoint: many questions, generated as real model batches
+@app.post("/chat/batch", response_model=ChatBatchResponse)
+async def chat_batch(data: ChatBatchRequest):
+    results = await run_generation_batch(data.items, chat.cache, build_chat_prompt, chat_result, CHAT_BUDGET)
+    return {"results": results}
+
+# Generate Legal Notice Endpoint with optimized prompts
+@app.post("/generate_notice/", response_model=NoticeResponse)
+@response_cache(ttl=NOTICE_CACHE_TTL)
+async def generate_notice(data: NoticeData): # Now accepts 'data' which is a NoticeData object
+    try:
+        prompt = (await build_budgeted_prompts(build_notice_prompt, [data], NOTICE_BUDGET))[0]
+
+        response = await inference_executor.run(
+            generate_text, prompt, max_new_tokens=NOTICE_BUDGET.max_new_tokens, stop_patterns=NOTICE_BUDGET.stop_patterns
+        )
+
+        if not response:
+            raise HTTPException(status_code=500, detail="No response from the legal language model.")
+
+        return notice_result(data, prompt, response[0]["generated_text"])
+    except ServerBusyError:
+        raise
+    except Exception as e:
+        logger.error(f"Error generating notice: {str(e)}")
+        raise FallbackResponse({"notice": "Error generating legal notice. Please try again with more specific details."})
+
+# Streaming notice endpoint: sends the notice text as Server-Sent Events while it is generated
+@app.post("/generate_notice/stream")
+async def generate_notice_stream(data: NoticeData):
+    """Stream the notice as `data: {"token": ...}` events, then an `event: done` with the final notice.
+
+    If the model's notice lacks basic structure, the `done` event carries the templated fallback
+    notice instead, so clients should replace the streamed text with it.
+    """
+    text_generator = await MODEL_CACHE.aget("text_generator")
+    prompt = (await build_budgeted_prompts(build_notice_prompt, [data], NOTICE_BUDGET))[0]
+    # Notices keep their paragraph breaks, as finalize_notice does for /generate_notice/
+    stream = TextGenerationStream(text_generator, prompt, NOTICE_BUDGET, marker=NOTICE_TEXT_MARKER, collapse_newlines=False)
+
+    async def events():
+        try:
+            async for chunk in stream.chunks():
+                yield sse_event({"token": chunk})
+            yield sse_event({"notice": finalize_notice(stream.text, data)}, event="done")
+        except Exception as e:
+            logger.error(f"Error in notice stream: {str(e)}")
+            yield sse_event({"detail": "Error generating legal notice. Please try again with more specific details."}, event="error")
+        finally:
+            # Runs when the client disconnects mid-stream too
+            stream.cancel()
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+# Batch notice endpoint: many notices, generated as real model batches
+@app.post("/generate_notice/batch", response_model=NoticeBatchResponse)
+async def generate_notice_batch(data: NoticeBatchRequest):
+    results = await run_generation_batch(data.items, generate_notice.cache, build_notice_prompt, notice_result, NOTICE_BUDGET)
+    return {"results": results}
+
+# Legal Roadmap Generator with optimized prompts
+@app.post("/roadmap/", response_model=RoadmapResponse)
+@response_cache(ttl=ROADMAP_CACHE_TTL)
+async def roadmap(data: RoadmapRequest): # Now accepts 'data' which is a RoadmapRequest object
+    try:
+        prompt = (await build_budgeted_prompts(build_roadmap_prompt, [data], ROADMAP_BUDGET))[0]
+
+        response = await inference_executor.run(
+            generate_text, prompt, max_new_tokens=ROADMAP_BUDGET.max_new_tokens, stop_patterns=ROADMAP_BUDGET.stop_patterns
+        )
+
+        if not response:
+            raise HTTPException(status_code=404, detail="No roadmap generated.")
+
+        return roadmap_result(data, prompt, response[0]["generated_text"])
+    except ServerBusyError:
+        raise
     except Exception as e:
         logger.error(f"Error generating roadmap: {str(e)}")
-        return {"steps": [], "jurisdiction": data.jurisdiction, "issue_type": data.issue_type}
+        raise FallbackResponse({"steps": [], "jurisdiction": data.jurisdiction, "issue_type": data.issue_type})
+
+# Batch roadmap endpoint: many issue types, generated as real model batches
+@app.post("/roadmap/batch", response_model=RoadmapBatchResponse)
+async def roadmap_batch(data: RoadmapBatchRequest):
+    results = await run_generation_batch(data.items, roadmap.cache, build_roadmap_prompt, roadmap_result, ROADMAP_BUDGET)
+    return {"results": results}
 
 # Multilingual Translation Endpoint - Working as before
 @app.post("/translate/", response_model=TranslationResponse)
-@response_cache()
+@response_cache(ttl=TRANSLATION_CACHE_TTL)
 async def translate_text(data: TranslationRequest): # Now accepts 'data' which is a TranslationRequest object
     try:
-        translated_text = GoogleTranslator(source="auto", target=data.dest_lang).translate(data.text)
+        translated_text = (await translate_texts([data.text], data.dest_lang))[0]
         return {"translated_text": translated_text, "source_text": data.text, "target_language": data.dest_lang}
     except Exception as e:
         logger.error(f"Error translating text: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Translation failed: {e}")
 
+# Batch Translation Endpoint - many texts, one target language, sentence-level reuse
+@app.post("/translate/batch", response_model=TranslationBatchResponse)
+async def translate_batch(data: TranslationBatchRequest):
+    if len(data.texts) > MAX_TRANSLATION_BATCH:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_TRANSLATION_BATCH} texts can be translated per request.")
+    try:
+        translations = await translate_texts(data.texts, data.dest_lang)
+        return {"translations": translations, "target_language": data.dest_lang}
+    except Exception as e:
+        logger.error(f"Error translating batch: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Translation failed: {e}")
+
 # Document Analysis Endpoint with enhanced QA and summarization
 @app.post("/analyze_document/", response_model=DocumentAnalysisResponse)
 async def analyze_document(file: UploadFile = File(...), request: DocumentAnalysisRequest = Depends()):
     try:
         start_time = time.time()
-        file_bytes = await file.read()
-        document_text = ""
+        upload_path, content_hash = await spool_upload(file)
+        DOCUMENT_UPLOAD_BYTES.observe(os.path.getsize(upload_path))
         try:
-            doc = fitz.open(stream=io.BytesIO(file_bytes), filetype="pdf")
-            document_text = "\n".join(page.get_text("text") for page in doc)
-        except Exception as e:
-            logger.warning(f"Could not process PDF: {e}")
-            try:
-                document_text = io.BytesIO(file_bytes).read().decode("utf-8") #Try assuming it's a text file
-            except Exception as e2:
-                raise HTTPException(status_code=400, detail=f"Could not process document: {e}, {e2}") #Now it's bad
+            # Repeat uploads of the same file skip parsing, summarization and windowing
+            extracted = await document_cache.get_or_compute(
+                f"{content_hash}:text",
+                lambda: run_in_document_pool(extract_document_text, upload_path, MAX_DOCUMENT_PAGES, MAX_DOCUMENT_TEXT_BYTES)
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e)) #Now it's bad
+        finally:
+            os.unlink(upload_path)
 
+        document_text = extracted["text"]
         document_length = len(document_text)
+        DOCUMENT_TEXT_CHARS.observe(document_length)
+        if extracted["pages"] is not None:
+            DOCUMENT_PAGES.observe(extracted["pages"])
 
-        qa_model = MODEL_CACHE.get("qa_model")
-        summarizer = MODEL_CACHE.get("summarizer")
+        # Only load the QA model when there is a question to answer
+        qa_model = await MODEL_CACHE.aget("qa_model") if request.query else None
+        summarizer = await MODEL_CACHE.aget("summarizer")
 
         answer = None
         confidence = None
         if request.query and qa_model:
-            qa_input = {
-                'question': request.query,
-                'context': document_text
-            }
-            qa_response = qa_model(qa_input)
-            answer = qa_response['answer']
-            confidence = qa_response['score']
+            windows = await document_cache.get_or_compute(
+                f"{content_hash}:qa_windows", lambda: asyncio.to_thread(build_qa_windows, qa_model, document_text)
+            )
+            qa_response = await inference_executor.run(answer_from_windows, qa_model, request.query, windows)
+            if qa_response:
+                answer = qa_response['answer']
+                confidence = qa_response['score']
 
         summary = None
         if summarizer:
-            summary_input = document_text
             try:
-                summary_response = summarizer(summary_input) #, max_length=500, min_length=100, do_sample=False) #You can try this
-                summary = summary_response[0]['summary_text'] if summary_response else None
+                summary = await document_cache.get_or_compute(
+                    f"{content_hash}:summary:{request.summary_mode}",
+                    lambda: inference_executor.run(summarize_document, summarizer, document_text, request.summary_mode)
+                )
+            except ServerBusyError:
+                raise
             except Exception as e:
                 logger.warning(f"Summarization failed: {e}")
                 summary = "Summary could not be generated."
@@ -497,6 +2732,11 @@ async def analyze_document(file: UploadFile = File(...), request: DocumentAnalys
         message = None
         if not qa_model and not summarizer:
             message = "No analysis models available."
+        elif extracted["truncated"]:
+            if extracted["pages"] is not None:
+                message = f"Document was truncated: analyzed {extracted['pages']} of {extracted['page_count']} pages."
+            else:
+                message = "Document was truncated to the maximum supported text size."
 
         logger.info(f"Document analysis took {time.time() - start_time:.2f} seconds. Document length: {document_length}")
 
@@ -508,6 +2748,8 @@ async def analyze_document(file: UploadFile = File(...), request: DocumentAnalys
             "document_text": None, #Return document text? Security concerns?
             "message": message
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.exception(f"General error analyzing document: {e}") #Good to log the full exception!
         raise HTTPException(status_code=500, detail=f"Document analysis failed: {e}")
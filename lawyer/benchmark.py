@@ -0,0 +1,352 @@
+"""Load-testing and latency benchmark for the Legal Aid Chatbot API (app.py).
+
+Starts the app in-process under uvicorn with tiny stub pipelines pinned into MODEL_CACHE,
+so no network access or model downloads are needed, then drives a configurable mix of
+concurrent traffic across /chat/, /roadmap/, /translate/ and /analyze_document/.
+
+Reports throughput, p50/p95/p99 latency per endpoint and cache hit rates as JSON:
+
+    python benchmark.py --concurrency 32 --duration 30 --mix chat=4,roadmap=2,translate=3,analyze=1
+    python benchmark.py --requests 2000 --repeat-ratio 0.5 --output bench.json
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import socket
+import sys
+import threading
+import time
+from typing import Dict, List
+
+# Configure the app before importing it: offline translation and no model warm-up
+os.environ.setdefault("TRANSLATION_BACKEND", "offline")
+os.environ.setdefault("MODEL_WARMUP", "")
+
+import fitz  # PyMuPDF, used to build the sample PDF
+import httpx
+import uvicorn
+
+import app as legal_app
+
+ENDPOINTS = ("chat", "roadmap", "translate", "analyze")
+
+SAMPLE_QUESTIONS = [
+    "How do I file an FIR for a stolen phone?",
+    "What is the punishment for cheating under the Indian Penal Code?",
+    "Can my landlord evict me without notice?",
+    "How do I apply for anticipatory bail?",
+    "What are my rights if I am arrested?",
+    "How long does a consumer complaint take in the District Commission?",
+]
+
+SAMPLE_ISSUES = ["property dispute", "divorce", "cheque bounce", "consumer complaint", "wrongful termination"]
+
+SAMPLE_TEXTS = [
+    "You are hereby requested to respond to this notice within 15 days. Failing which legal proceedings will be initiated.",
+    "This notice is issued without prejudice to my other legal rights and remedies. All rights are expressly reserved.",
+    "The tenant shall vacate the premises on or before the date mentioned. Rent arrears must be cleared in full.",
+]
+
+# === Stub pipelines ===
+
+class StubModel:
+    def __init__(self, name):
+        self.name_or_path = name
+
+class StubTextGenerator:
+    """Stands in for the text-generation pipeline: sleeps per batch and echoes the prompt"""
+
+    def __init__(self, base_ms, per_item_ms):
+        self.base = base_ms / 1000.0
+        self.per_item = per_item_ms / 1000.0
+        self.model = StubModel("stub-text-generator")
+        self.tokenizer = None
+        self.inference_backend = "stub"
+
+    def __call__(self, prompts, max_new_tokens=200, num_return_sequences=1, batch_size=None, **kwargs):
+        single = isinstance(prompts, str)
+        batch = [prompts] if single else list(prompts)
+        time.sleep(self.base + self.per_item * len(batch))
+        outputs = [[{
+            "generated_text": f"{prompt}\n1. Under Section 154 CrPC, approach the police station.\n"
+                              f"2. Keep copies of all documents as evidence.\n3. Consult an advocate for NOTICE drafting."
+        }] for prompt in batch]
+        return outputs[0] if single else outputs
+
+class StubQAModel:
+    """Stands in for the QA pipeline: returns the first few words of each context"""
+
+    def __init__(self, base_ms, per_item_ms):
+        self.base = base_ms / 1000.0
+        self.per_item = per_item_ms / 1000.0
+        self.model = StubModel("stub-qa")
+        self.tokenizer = None
+
+    def __call__(self, inputs, batch_size=None, **kwargs):
+        single = isinstance(inputs, dict)
+        batch = [inputs] if single else list(inputs)
+        time.sleep(self.base + self.per_item * len(batch))
+        outputs = [{"answer": " ".join(item["context"].split()[:5]), "score": random.random(), "start": 0, "end": 0} for item in batch]
+        return outputs[0] if single else outputs
+
+class StubSummarizer:
+    """Stands in for the summarization pipeline: returns the first words of each input"""
+
+    def __init__(self, base_ms, per_item_ms):
+        self.base = base_ms / 1000.0
+        self.per_item = per_item_ms / 1000.0
+        self.model = StubModel("stub-summarizer")
+        self.tokenizer = None
+
+    def __call__(self, texts, batch_size=None, **kwargs):
+        single = isinstance(texts, str)
+        batch = [texts] if single else list(texts)
+        time.sleep(self.base + self.per_item * len(batch))
+        return [{"summary_text": " ".join(text.split()[:40])} for text in batch]
+
+def install_stub_models(args):
+    legal_app.MODEL_CACHE["text_generator"] = StubTextGenerator(args.gen_latency_ms, args.gen_per_item_ms)
+    legal_app.MODEL_CACHE["qa_model"] = StubQAModel(args.qa_latency_ms, args.qa_per_item_ms)
+    legal_app.MODEL_CACHE["summarizer"] = StubSummarizer(args.summary_latency_ms, args.summary_per_item_ms)
+
+def build_sample_pdf(pages: int) -> bytes:
+    doc = fitz.open()
+    paragraph = " ".join(SAMPLE_TEXTS)
+    for page_number in range(pages):
+        page = doc.new_page()
+        page.insert_textbox(fitz.Rect(72, 72, 540, 770), f"Page {page_number + 1}. {paragraph * 4}", fontsize=9)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+# === Server ===
+
+def free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+class BackgroundServer:
+    """Runs the app under uvicorn in a background thread"""
+
+    def __init__(self, port: int):
+        config = uvicorn.Config(legal_app.app, host="127.0.0.1", port=port, log_level="warning")
+        self.server = uvicorn.Server(config)
+        self.thread = threading.Thread(target=self.server.run, name="benchmark-server", daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        deadline = time.time() + 30
+        while not self.server.started:
+            if time.time() > deadline or not self.thread.is_alive():
+                raise RuntimeError("Server failed to start")
+            time.sleep(0.05)
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join(timeout=10)
+
+# === Traffic ===
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    weights = {}
+    for entry in mix.split(","):
+        name, _, weight = entry.partition("=")
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise ValueError(f"Unknown endpoint in mix: {name}")
+        weights[name] = float(weight or 1)
+    return weights
+
+class TrafficGenerator:
+    """Builds request payloads; repeat_ratio of them come from a small pool so caches can hit"""
+
+    def __init__(self, repeat_ratio: float, pdf_bytes: bytes):
+        self.repeat_ratio = repeat_ratio
+        self.pdf_bytes = pdf_bytes
+        self.counter = 0
+
+    def _unique_suffix(self) -> str:
+        if random.random() < self.repeat_ratio:
+            return ""
+        self.counter += 1
+        return f" (case {self.counter})"
+
+    def request(self, endpoint: str) -> dict:
+        suffix = self._unique_suffix()
+        if endpoint == "chat":
+            return {"url": "/chat/", "json": {"question": random.choice(SAMPLE_QUESTIONS) + suffix}}
+        if endpoint == "roadmap":
+            return {"url": "/roadmap/", "json": {"issue_type": random.choice(SAMPLE_ISSUES) + suffix, "jurisdiction": "Delhi"}}
+        if endpoint == "translate":
+            return {"url": "/translate/", "json": {"text": random.choice(SAMPLE_TEXTS) + suffix, "dest_lang": "hi"}}
+        pdf = self.pdf_bytes if not suffix else self.pdf_bytes + suffix.encode()
+        return {
+            "url": "/analyze_document/",
+            "params": {"query": random.choice(SAMPLE_QUESTIONS)},
+            "files": {"file": ("notice.pdf", pdf, "application/pdf")},
+        }
+
+def percentile(sorted_values: List[float], pct: float):
+    if not sorted_values:
+        return None
+    # Nearest-rank percentile
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100.0 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+async def run_load(base_url: str, args, weights: Dict[str, float], traffic: TrafficGenerator) -> dict:
+    names = list(weights)
+    name_weights = [weights[name] for name in names]
+    records = {name: {"latencies": [], "errors": 0, "rejected": 0} for name in names}
+    issued = 0
+    deadline = time.perf_counter() + args.duration if args.requests is None else None
+
+    def next_endpoint():
+        nonlocal issued
+        if args.requests is not None:
+            if issued >= args.requests:
+                return None
+        elif time.perf_counter() >= deadline:
+            return None
+        issued += 1
+        return random.choices(names, weights=name_weights)[0]
+
+    async def worker(client: httpx.AsyncClient):
+        while True:
+            endpoint = next_endpoint()
+            if endpoint is None:
+                return
+            request = traffic.request(endpoint)
+            url = request.pop("url")
+            start = time.perf_counter()
+            try:
+                response = await client.post(url, **request)
+                status = response.status_code
+            except httpx.HTTPError:
+                status = None
+            elapsed = time.perf_counter() - start
+            record = records[endpoint]
+            if status == 200:
+                record["latencies"].append(elapsed)
+            elif status in (429, 503):
+                record["rejected"] += 1
+            else:
+                record["errors"] += 1
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(args.concurrency)))
+        wall_time = time.perf_counter() - started
+        health = (await client.get("/health")).json()
+
+    return summarize(records, wall_time, health)
+
+def summarize(records: dict, wall_time: float, health: dict) -> dict:
+    def latency_stats(latencies):
+        latencies = sorted(latencies)
+        return {
+            "p50_ms": round(percentile(latencies, 50) * 1000, 2) if latencies else None,
+            "p95_ms": round(percentile(latencies, 95) * 1000, 2) if latencies else None,
+            "p99_ms": round(percentile(latencies, 99) * 1000, 2) if latencies else None,
+            "mean_ms": round(sum(latencies) / len(latencies) * 1000, 2) if latencies else None,
+        }
+
+    endpoints = {}
+    all_latencies = []
+    for name, record in records.items():
+        all_latencies.extend(record["latencies"])
+        endpoints[name] = {
+            "ok": len(record["latencies"]),
+            "errors": record["errors"],
+            "rejected": record["rejected"],
+            "throughput_rps": round(len(record["latencies"]) / wall_time, 2),
+            **latency_stats(record["latencies"]),
+        }
+
+    caches = {}
+    for name, stats in (health.get("response_caches") or {}).items():
+        lookups = stats["hits"] + stats["misses"]
+        caches[name] = {
+            "hits": stats["hits"],
+            "misses": stats["misses"],
+            "coalesced": stats.get("coalesced", 0),
+            "evictions": stats["evictions"],
+            "hit_rate": round(stats["hits"] / lookups, 4) if lookups else None,
+        }
+    generation_cache = health.get("generation_cache")
+    if generation_cache:
+        lookups = generation_cache["hits"] + generation_cache["misses"]
+        caches["generation_cache"] = {
+            "hits": generation_cache["hits"],
+            "misses": generation_cache["misses"],
+            "evictions": generation_cache["evictions"],
+            "hit_rate": round(generation_cache["hits"] / lookups, 4) if lookups else None,
+        }
+
+    total_ok = len(all_latencies)
+    return {
+        "wall_time_s": round(wall_time, 3),
+        "total": {
+            "ok": total_ok,
+            "errors": sum(record["errors"] for record in records.values()),
+            "rejected": sum(record["rejected"] for record in records.values()),
+            "throughput_rps": round(total_ok / wall_time, 2),
+            **latency_stats(all_latencies),
+        },
+        "endpoints": endpoints,
+        "caches": caches,
+        "inference": health.get("inference"),
+    }
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the Legal Aid Chatbot API with stub models")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent client connections")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds to run (ignored with --requests)")
+    parser.add_argument("--requests", type=int, default=None, help="Total requests to send instead of a duration")
+    parser.add_argument("--mix", default="chat=4,roadmap=2,translate=3,analyze=1", help="Endpoint weights, e.g. chat=4,analyze=1")
+    parser.add_argument("--repeat-ratio", type=float, default=0.3, help="Fraction of requests drawn from a small repeated pool")
+    parser.add_argument("--pdf-pages", type=int, default=20, help="Pages in the generated sample PDF")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Per-request timeout in seconds")
+    parser.add_argument("--gen-latency-ms", type=float, default=40.0, help="Stub text generation latency per batch")
+    parser.add_argument("--gen-per-item-ms", type=float, default=5.0, help="Stub text generation latency per prompt")
+    parser.add_argument("--qa-latency-ms", type=float, default=10.0)
+    parser.add_argument("--qa-per-item-ms", type=float, default=2.0)
+    parser.add_argument("--summary-latency-ms", type=float, default=30.0)
+    parser.add_argument("--summary-per-item-ms", type=float, default=10.0)
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--output", default=None, help="Write the JSON report here instead of stdout")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    random.seed(args.seed)
+    weights = parse_mix(args.mix)
+    install_stub_models(args)
+    traffic = TrafficGenerator(args.repeat_ratio, build_sample_pdf(args.pdf_pages))
+
+    port = free_port()
+    with BackgroundServer(port):
+        report = asyncio.run(run_load(f"http://127.0.0.1:{port}", args, weights, traffic))
+
+    report["config"] = {
+        "concurrency": args.concurrency,
+        "duration": args.duration if args.requests is None else None,
+        "requests": args.requests,
+        "mix": weights,
+        "repeat_ratio": args.repeat_ratio,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as handle:
+            handle.write(output + "\n")
+    else:
+        print(output)
+    return 0 if report["total"]["errors"] == 0 else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
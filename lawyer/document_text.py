@@ -0,0 +1,49 @@
+"""Text extraction for uploaded documents, run in app.py's document process pool.
+
+Kept apart from app.py so pool workers only import PyMuPDF: a worker started with
+forkserver or spawn imports the module of the function it runs, and importing app.py
+would load torch and transformers and rebuild the app's caches and executors in every
+worker.
+"""
+import fitz  # PyMuPDF for reading PDFs
+
+def iter_pdf_page_text(doc, max_pages: int, max_bytes: int):
+    """Yield the text of one page at a time, stopping at the page or byte limit"""
+    used = 0
+    for page_number, page in enumerate(doc):
+        if page_number >= max_pages:
+            return
+        text = page.get_text("text")
+        encoded = text.encode("utf-8")
+        if used + len(encoded) > max_bytes:
+            yield encoded[:max_bytes - used].decode("utf-8", errors="ignore")
+            return
+        used += len(encoded)
+        yield text
+
+def extract_document_text(path: str, max_pages: int, max_bytes: int) -> dict:
+    """Extract text from a spooled upload within the page and byte limits.
+
+    Runs in the document process pool, so fitz never holds the GIL on the request path.
+    Non-PDF uploads are read as UTF-8 text. Errors are raised as ValueError so they
+    pickle cleanly back to the parent process.
+    """
+    try:
+        with fitz.open(path, filetype="pdf") as doc:
+            page_count = doc.page_count
+            pages = list(iter_pdf_page_text(doc, max_pages, max_bytes))
+        text = "\n".join(pages)
+        truncated = len(pages) < page_count or len(text.encode("utf-8")) >= max_bytes
+        return {"text": text, "pages": len(pages), "page_count": page_count, "truncated": truncated}
+    except Exception as e:
+        pdf_error = str(e)
+
+    # Try assuming it's a text file
+    try:
+        with open(path, "rb") as handle:
+            raw = handle.read(max_bytes + 1)
+        truncated = len(raw) > max_bytes
+        text = raw[:max_bytes].decode("utf-8", errors="ignore" if truncated else "strict")
+    except Exception as e:
+        raise ValueError(f"Could not process document: {pdf_error}, {e}")
+    return {"text": text, "pages": None, "page_count": None, "truncated": truncated}
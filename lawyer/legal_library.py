@@ -0,0 +1,304 @@
+"""Local full-text index over a directory of statutes and judgments, for main.py's /legal-library.
+
+Documents (.txt, .md and, when PyMuPDF is installed, .pdf) are tokenized into an inverted
+index and ranked with BM25. The index lives on disk next to the corpus:
+
+    manifest.json   corpus fingerprint, BM25 stats and per-document metadata
+    vocab.json      term -> [offset into postings, document frequency]
+    postings.u32    (doc_id, term_frequency) pairs as little-endian uint32, grouped by term
+    texts.bin       UTF-8 text of every document, for snippets
+
+postings.u32 and texts.bin are memory-mapped, so opening the index reads only the
+manifest and vocabulary, and a lookup touches just the postings of its query terms and the
+text of the documents it returns. The index is rebuilt when the corpus changes.
+"""
+import heapq
+import json
+import logging
+import math
+import mmap
+import os
+import re
+import shutil
+import sys
+import tempfile
+from array import array
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: builds are not serialized across processes
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+LEGAL_LIBRARY_DIR = os.getenv("LEGAL_LIBRARY_DIR", "legal_library")
+LEGAL_LIBRARY_INDEX_DIR = os.getenv("LEGAL_LIBRARY_INDEX_DIR", "")  # Defaults to <LEGAL_LIBRARY_DIR>/.index
+LEGAL_LIBRARY_SNIPPET_CHARS = int(os.getenv("LEGAL_LIBRARY_SNIPPET_CHARS", "320"))
+
+INDEX_VERSION = 1
+DOCUMENT_EXTENSIONS = (".txt", ".md", ".pdf")
+TOKEN_PATTERN = re.compile(r"\w+")
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+def read_document(path: str) -> Optional[str]:
+    if path.lower().endswith(".pdf"):
+        try:
+            import fitz  # PyMuPDF is optional here; PDFs are skipped without it
+        except ImportError:
+            logger.warning(f"Skipping {path}: PyMuPDF is not installed")
+            return None
+        with fitz.open(path) as doc:
+            return "\n".join(page.get_text() for page in doc)
+    with open(path, encoding="utf-8", errors="replace") as handle:
+        return handle.read()
+
+def document_title(path: str, text: str) -> str:
+    for line in text.splitlines():
+        line = line.strip().lstrip("#").strip()  # Markdown headings
+        if line:
+            return line[:120]
+    return os.path.splitext(os.path.basename(path))[0]
+
+def list_corpus(corpus_dir: str) -> List[str]:
+    paths = []
+    for root, dirs, files in os.walk(corpus_dir):
+        dirs[:] = sorted(d for d in dirs if not d.startswith("."))  # Skips the .index directory
+        paths.extend(os.path.join(root, name) for name in sorted(files) if name.lower().endswith(DOCUMENT_EXTENSIONS))
+    return paths
+
+def corpus_fingerprint(corpus_dir: str, paths: List[str]) -> List[list]:
+    fingerprint = []
+    for path in paths:
+        stat = os.stat(path)
+        fingerprint.append([os.path.relpath(path, corpus_dir), stat.st_size, stat.st_mtime_ns])
+    return fingerprint
+
+def build_index(corpus_dir: str, index_dir: str, fingerprint: Optional[List[list]] = None):
+    """Tokenize every document in corpus_dir and write the index files to index_dir"""
+    paths = list_corpus(corpus_dir)
+    if fingerprint is None:
+        fingerprint = corpus_fingerprint(corpus_dir, paths)
+    postings: Dict[str, list] = {}
+    docs = []
+    parent = os.path.dirname(os.path.abspath(index_dir))
+    os.makedirs(parent, exist_ok=True)
+    build_dir = tempfile.mkdtemp(prefix=".index-build-", dir=parent)
+    try:
+        with open(os.path.join(build_dir, "texts.bin"), "wb") as texts:
+            for path in paths:
+                try:
+                    text = read_document(path)
+                except Exception as e:
+                    logger.warning(f"Skipping {path}: {e}")
+                    continue
+                if not text or not text.strip():
+                    continue
+                doc_id = len(docs)
+                counts: Dict[str, int] = {}
+                tokens = tokenize(text)
+                for token in tokens:
+                    counts[token] = counts.get(token, 0) + 1
+                for term, tf in counts.items():
+                    postings.setdefault(term, []).append((doc_id, tf))
+                encoded = text.encode("utf-8")
+                docs.append({
+                    "path": os.path.relpath(path, corpus_dir),
+                    "title": document_title(path, text),
+                    "length": len(tokens),
+                    "text_offset": texts.tell(),
+                    "text_bytes": len(encoded),
+                })
+                texts.write(encoded)
+
+        vocab = {}
+        flat = array("I")
+        for term in sorted(postings):
+            entries = postings[term]
+            vocab[term] = [len(flat) // 2, len(entries)]
+            for doc_id, tf in entries:
+                flat.append(doc_id)
+                flat.append(tf)
+        if sys.byteorder != "little":
+            flat.byteswap()
+        with open(os.path.join(build_dir, "postings.u32"), "wb") as handle:
+            flat.tofile(handle)
+        with open(os.path.join(build_dir, "vocab.json"), "w", encoding="utf-8") as handle:
+            json.dump(vocab, handle, separators=(",", ":"))
+
+        total_length = sum(doc["length"] for doc in docs)
+        manifest = {
+            "version": INDEX_VERSION,
+            "fingerprint": fingerprint,
+            "doc_count": len(docs),
+            "avg_doc_length": total_length / len(docs) if docs else 0.0,
+            "docs": docs,
+        }
+        with open(os.path.join(build_dir, "manifest.json"), "w", encoding="utf-8") as handle:
+            json.dump(manifest, handle)
+
+        # Swap the finished build in so readers never see a half-written index
+        if os.path.exists(index_dir):
+            old_dir = tempfile.mkdtemp(prefix=".index-old-", dir=parent)
+            os.rmdir(old_dir)
+            os.replace(index_dir, old_dir)
+            os.replace(build_dir, index_dir)
+            shutil.rmtree(old_dir, ignore_errors=True)
+        else:
+            os.replace(build_dir, index_dir)
+    except Exception:
+        shutil.rmtree(build_dir, ignore_errors=True)
+        raise
+    logger.info(f"Indexed {len(docs)} legal library documents ({len(vocab)} terms) into {index_dir}")
+
+@contextmanager
+def build_lock(index_dir: str):
+    """Exclusive lock serializing index builds across processes, e.g. uvicorn workers starting together"""
+    parent = os.path.dirname(os.path.abspath(index_dir))
+    os.makedirs(parent, exist_ok=True)
+    with open(os.path.abspath(index_dir) + ".lock", "a") as handle:
+        if fcntl is not None:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+def index_is_current(index_dir: str, fingerprint: List[list]) -> bool:
+    manifest_path = os.path.join(index_dir, "manifest.json")
+    if not os.path.exists(manifest_path):
+        return False
+    with open(manifest_path, encoding="utf-8") as handle:
+        manifest = json.load(handle)
+    return manifest.get("version") == INDEX_VERSION and manifest.get("fingerprint") == fingerprint
+
+def map_file(path: str):
+    """Read-only mmap of a file, or None for an empty one (mmap rejects zero-length files)"""
+    if os.path.getsize(path) == 0:
+        return None
+    with open(path, "rb") as handle:
+        return mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+
+class LegalLibrary:
+    """BM25 search over an on-disk legal library index. Use LegalLibrary.open() to load or build one."""
+
+    def __init__(self, index_dir: str, k1: float = 1.5, b: float = 0.75):
+        with open(os.path.join(index_dir, "manifest.json"), encoding="utf-8") as handle:
+            manifest = json.load(handle)
+        with open(os.path.join(index_dir, "vocab.json"), encoding="utf-8") as handle:
+            self.vocab = json.load(handle)
+        self.index_dir = index_dir
+        self.k1 = k1
+        self.b = b
+        self.docs = manifest["docs"]
+        self.doc_count = manifest["doc_count"]
+        self.avg_doc_length = manifest["avg_doc_length"] or 1.0
+        self._postings_map = map_file(os.path.join(index_dir, "postings.u32"))
+        self._texts_map = map_file(os.path.join(index_dir, "texts.bin"))
+        if self._postings_map is None:
+            self._postings = memoryview(b"").cast("I")
+        elif sys.byteorder == "little":
+            self._postings = memoryview(self._postings_map).cast("I")
+        else:
+            # The file is little-endian; big-endian hosts read a byte-swapped copy instead of the mapping
+            postings = array("I")
+            postings.frombytes(self._postings_map[:])
+            postings.byteswap()
+            self._postings = memoryview(postings)
+
+    @classmethod
+    def open(cls, corpus_dir: str = LEGAL_LIBRARY_DIR, index_dir: Optional[str] = None) -> "LegalLibrary":
+        """Open the index for corpus_dir, rebuilding it first if documents were added, changed or removed"""
+        index_dir = index_dir or LEGAL_LIBRARY_INDEX_DIR or os.path.join(corpus_dir, ".index")
+        fingerprint = corpus_fingerprint(corpus_dir, list_corpus(corpus_dir))
+        if not index_is_current(index_dir, fingerprint):
+            with build_lock(index_dir):
+                # Another process may have built it while this one waited for the lock
+                if not index_is_current(index_dir, fingerprint):
+                    logger.info(f"Building legal library index for {corpus_dir}")
+                    build_index(corpus_dir, index_dir, fingerprint)
+        return cls(index_dir)
+
+    def close(self):
+        self._postings.release()
+        for mapped in (self._postings_map, self._texts_map):
+            if mapped is not None:
+                mapped.close()
+
+    def document_text(self, doc_id: int) -> str:
+        doc = self.docs[doc_id]
+        start = doc["text_offset"]
+        return self._texts_map[start:start + doc["text_bytes"]].decode("utf-8")
+
+    def search(self, query: str, top_k: int = 5) -> List[dict]:
+        """Return the top_k documents by BM25 score, each with a snippet around the query terms"""
+        terms = list(dict.fromkeys(tokenize(query)))
+        scores: Dict[int, float] = {}
+        for term in terms:
+            entry = self.vocab.get(term)
+            if entry is None:
+                continue
+            start, df = entry
+            idf = math.log(1 + (self.doc_count - df + 0.5) / (df + 0.5))
+            pairs = self._postings[start * 2:(start + df) * 2]
+            for i in range(0, len(pairs), 2):
+                doc_id, tf = pairs[i], pairs[i + 1]
+                norm = 1 - self.b + self.b * self.docs[doc_id]["length"] / self.avg_doc_length
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + self.k1 * norm)
+
+        hits = []
+        for doc_id, score in heapq.nlargest(top_k, scores.items(), key=lambda item: item[1]):
+            doc = self.docs[doc_id]
+            hits.append({
+                "title": doc["title"],
+                "path": doc["path"],
+                "score": round(score, 4),
+                "snippet": make_snippet(self.document_text(doc_id), terms),
+            })
+        return hits
+
+    def stats(self) -> dict:
+        return {"documents": self.doc_count, "terms": len(self.vocab), "index_dir": self.index_dir}
+
+def make_snippet(text: str, terms: List[str], size: int = LEGAL_LIBRARY_SNIPPET_CHARS) -> str:
+    """The window of about `size` characters covering the most distinct query terms"""
+    matches = []
+    if terms:
+        pattern = re.compile(r"\b(" + "|".join(re.escape(term) for term in terms) + r")\b", re.IGNORECASE)
+        matches = [(match.start(), match.group(1).lower()) for match in pattern.finditer(text)]
+    best_start, best_count = 0, 0
+    left = 0
+    window: Dict[str, int] = {}
+    for right, (position, term) in enumerate(matches):
+        window[term] = window.get(term, 0) + 1
+        while position - matches[left][0] > size:
+            left_term = matches[left][1]
+            window[left_term] -= 1
+            if not window[left_term]:
+                del window[left_term]
+            left += 1
+        if len(window) > best_count:
+            best_count = len(window)
+            best_start = matches[left][0]
+
+    start = max(0, best_start - size // 8)
+    end = min(len(text), start + size)
+    # Don't cut words in half at either end
+    if start > 0:
+        boundary = text.find(" ", start, best_start)
+        start = boundary + 1 if boundary >= 0 else start
+    if end < len(text):
+        boundary = text.rfind(" ", start, end)
+        end = boundary if boundary > start else end
+    snippet = " ".join(text[start:end].split())
+    return ("..." if start > 0 else "") + snippet + ("..." if end < len(text) else "")
+
+if __name__ == "__main__":
+    # Build or refresh the index ahead of time: python legal_library.py [corpus_dir]
+    logging.basicConfig(level=logging.INFO)
+    library = LegalLibrary.open(sys.argv[1] if len(sys.argv) > 1 else LEGAL_LIBRARY_DIR)
+    print(json.dumps(library.stats()))
@@ -0,0 +1,216 @@
+"""Pooled async client for the hosted LLM behind main.py's call_claude.
+
+One LLMClient is shared by every request. It keeps a bounded pool of keep-alive
+connections, caps concurrent upstream calls, rate-limits them with a token bucket and
+retries transient failures with jittered exponential backoff. Point LLM_API_URL at
+mock_llm_server.py to run without network access.
+"""
+import asyncio
+import logging
+import os
+import random
+import time
+from typing import Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Upstream endpoint (Anthropic Messages API format) and model
+LLM_API_URL = os.getenv("LLM_API_URL", "https://api.anthropic.com/v1/messages")
+LLM_API_KEY = os.getenv("LLM_API_KEY", os.getenv("ANTHROPIC_API_KEY", ""))
+LLM_API_VERSION = os.getenv("LLM_API_VERSION", "2023-06-01")
+LLM_MODEL = os.getenv("LLM_MODEL", "claude-3-5-haiku-latest")
+LLM_MAX_TOKENS = int(os.getenv("LLM_MAX_TOKENS", "1024"))
+
+# Connection pool and concurrency: at most LLM_MAX_CONCURRENCY calls in flight, over at most LLM_MAX_CONNECTIONS sockets
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "16"))
+LLM_MAX_KEEPALIVE = int(os.getenv("LLM_MAX_KEEPALIVE", str(LLM_MAX_CONNECTIONS)))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", str(LLM_MAX_CONNECTIONS)))
+
+# Token-bucket rate limit: sustained requests per second and burst size
+LLM_RATE_LIMIT_RPS = float(os.getenv("LLM_RATE_LIMIT_RPS", "5"))
+LLM_RATE_LIMIT_BURST = int(os.getenv("LLM_RATE_LIMIT_BURST", "10"))
+
+# Timeouts (seconds); LLM_QUEUE_TIMEOUT bounds the wait for a concurrency slot and a rate-limit token
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+LLM_READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", "60"))
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "30"))
+
+# Retries for connection errors, timeouts, 429 and 5xx responses
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "8"))
+
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504, 529}
+
+class LLMClientError(Exception):
+    """The upstream call failed for good: retries exhausted, a non-retryable status, or no capacity"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+class LLMBusyError(LLMClientError):
+    """No concurrency slot or rate-limit token became free within the queue timeout"""
+
+class TokenBucket:
+    """Async token bucket: `rate` tokens per second refill up to `capacity`"""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return  # Rate limiting disabled
+        # The lock makes waiters take tokens in arrival order
+        async with self._lock:
+            self._refill()
+            if self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= 1
+
+def backoff_delay(attempt: int, base: float = LLM_BACKOFF_BASE, cap: float = LLM_BACKOFF_MAX) -> float:
+    """Full-jitter exponential backoff: uniform in [0, min(cap, base * 2**attempt)]"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+def retry_after_seconds(response: httpx.Response) -> Optional[float]:
+    value = response.headers.get("retry-after")
+    try:
+        return max(0.0, float(value)) if value is not None else None
+    except ValueError:
+        return None
+
+class LLMClient:
+    """Shared async client for the upstream LLM.
+
+    start() opens the connection pool and aclose() releases it; complete() may be called
+    from any number of requests at once. Calls beyond the concurrency limit or the rate
+    limit wait up to `queue_timeout` seconds and then fail with LLMBusyError.
+    """
+
+    def __init__(
+        self,
+        api_url: str = LLM_API_URL,
+        api_key: str = LLM_API_KEY,
+        model: str = LLM_MODEL,
+        max_tokens: int = LLM_MAX_TOKENS,
+        max_connections: int = LLM_MAX_CONNECTIONS,
+        max_keepalive: int = LLM_MAX_KEEPALIVE,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        rate_limit_rps: float = LLM_RATE_LIMIT_RPS,
+        rate_limit_burst: int = LLM_RATE_LIMIT_BURST,
+        connect_timeout: float = LLM_CONNECT_TIMEOUT,
+        read_timeout: float = LLM_READ_TIMEOUT,
+        queue_timeout: float = LLM_QUEUE_TIMEOUT,
+        max_retries: int = LLM_MAX_RETRIES,
+    ):
+        self.api_url = api_url
+        self.api_key = api_key
+        self.model = model
+        self.max_tokens = max_tokens
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive)
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout, pool=queue_timeout)
+        self.queue_timeout = queue_timeout
+        self.max_retries = max_retries
+        self._semaphore = asyncio.Semaphore(max(1, max_concurrency))
+        self._bucket = TokenBucket(rate_limit_rps, rate_limit_burst)
+        self._client: Optional[httpx.AsyncClient] = None
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+        self.rejected = 0
+        self.in_flight = 0
+
+    async def start(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(limits=self.limits, timeout=self.timeout, headers=self._headers())
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _headers(self) -> dict:
+        headers = {"content-type": "application/json", "anthropic-version": LLM_API_VERSION}
+        if self.api_key:
+            headers["x-api-key"] = self.api_key
+        return headers
+
+    async def complete(self, prompt: str, max_tokens: Optional[int] = None) -> str:
+        """Send a single-turn prompt and return the model's text reply"""
+        await self.start()
+        payload = {
+            "model": self.model,
+            "max_tokens": max_tokens or self.max_tokens,
+            "messages": [{"role": "user", "content": prompt}],
+        }
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise LLMBusyError("Too many concurrent LLM requests")
+        self.in_flight += 1
+        try:
+            return await self._post_with_retries(payload)
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    async def _post_with_retries(self, payload: dict) -> str:
+        for attempt in range(self.max_retries + 1):
+            try:
+                await asyncio.wait_for(self._bucket.acquire(), timeout=self.queue_timeout)
+            except asyncio.TimeoutError:
+                self.rejected += 1
+                raise LLMBusyError("LLM rate limit wait exceeded the queue timeout")
+
+            self.requests += 1
+            delay = None
+            try:
+                response = await self._client.post(self.api_url, json=payload)
+            except (httpx.TimeoutException, httpx.TransportError) as e:
+                error = LLMClientError(f"LLM request failed: {e.__class__.__name__}: {e}")
+            else:
+                if response.status_code == 200:
+                    return self._parse(response)
+                error = LLMClientError(f"LLM returned HTTP {response.status_code}: {response.text[:200]}", response.status_code)
+                if response.status_code not in RETRYABLE_STATUS_CODES:
+                    self.failures += 1
+                    raise error
+                delay = retry_after_seconds(response)
+
+            if attempt == self.max_retries:
+                self.failures += 1
+                raise error
+            delay = backoff_delay(attempt) if delay is None else min(delay, LLM_BACKOFF_MAX)
+            self.retries += 1
+            logger.warning(f"{error}; retrying in {delay:.2f}s (attempt {attempt + 1}/{self.max_retries})")
+            await asyncio.sleep(delay)
+
+    @staticmethod
+    def _parse(response: httpx.Response) -> str:
+        try:
+            body = response.json()
+            return "".join(block.get("text", "") for block in body["content"] if block.get("type") == "text")
+        except (ValueError, KeyError, TypeError) as e:
+            raise LLMClientError(f"Unexpected LLM response format: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "requests": self.requests,
+            "retries": self.retries,
+            "failures": self.failures,
+            "rejected": self.rejected,
+        }
@@ -1,15 +1,41 @@
 from fastapi import FastAPI, HTTPException, Request
 from pydantic import BaseModel
 from typing import List, Dict, Optional
+from contextlib import asynccontextmanager
 import asyncio
+import os
+
+from llm_client import LLMClient, LLMClientError, LLMBusyError
+from legal_library import LegalLibrary, LEGAL_LIBRARY_DIR
+
+# One pooled client shared by every request; see llm_client.py for the pool, rate-limit and retry settings
+llm_client = LLMClient()
+
+# Local BM25 index over the statutes and judgments in LEGAL_LIBRARY_DIR; None when there is no corpus
+legal_library: Optional[LegalLibrary] = None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global legal_library
+    await llm_client.start()
+    if os.path.isdir(LEGAL_LIBRARY_DIR):
+        legal_library = await asyncio.to_thread(LegalLibrary.open, LEGAL_LIBRARY_DIR)
+    yield
+    if legal_library is not None:
+        legal_library.close()
+    await llm_client.aclose()
 
 # Initialize FastAPI app
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
-# Placeholder for Claude API integration
+# Claude API integration
 async def call_claude(prompt: str) -> str:
-    # Replace this with actual API call to Claude LLM
-    return f"Response from Claude for prompt: {prompt}"
+    try:
+        return await llm_client.complete(prompt)
+    except LLMBusyError:
+        raise HTTPException(status_code=503, detail="The language model is busy. Please try again shortly.", headers={"Retry-After": "5"})
+    except LLMClientError as e:
+        raise HTTPException(status_code=502, detail=f"Language model request failed: {e}")
 
 # Models
 class NoticeRequest(BaseModel):
@@ -27,6 +53,8 @@ class MultilingualRequest(BaseModel):
 
 class LegalLibraryRequest(BaseModel):
     query: str
+    top_k: int = 5
+    summarize: bool = False  # Also ask the LLM to summarize the matching passages
 
 # Endpoints
 
@@ -89,9 +117,16 @@ async def legal_library_search(library_request: LegalLibraryRequest):
     """
     Search through the legal library for relevant information.
     """
-    prompt = f"Search the legal library and provide information about:\n{library_request.query}"
-    library_response = await call_claude(prompt)
-    return {"result": library_response}
+    if legal_library is None:
+        raise HTTPException(status_code=503, detail="The legal library index is not available.")
+    hits = await asyncio.to_thread(legal_library.search, library_request.query, max(1, min(library_request.top_k, 50)))
+
+    library_response = None
+    if library_request.summarize and hits:
+        excerpts = "\n\n".join(f"[{i}] {hit['title']}\n{hit['snippet']}" for i, hit in enumerate(hits, 1))
+        prompt = f"Using only these excerpts from the legal library, summarize what they say about:\n{library_request.query}\n\n{excerpts}"
+        library_response = await call_claude(prompt)
+    return {"result": library_response, "hits": hits}
 
 @app.post("/encrypt-data")
 async def encrypt_data(data: Dict[str, str]):
@@ -0,0 +1,118 @@
+"""Local stand-in for the upstream LLM's Messages API, for tests and offline development.
+
+Answers POST /v1/messages with a canned reply that echoes the prompt, after a configurable
+latency, and can inject 429/500 responses to exercise the client's retries:
+
+    python mock_llm_server.py --port 8090 --latency-ms 200 --error-rate 0.1
+    LLM_API_URL=http://127.0.0.1:8090/v1/messages uvicorn main:app
+
+In tests, run it in-process and point an LLMClient at it:
+
+    with MockLLMServer(latency_ms=50, error_rate=0.2) as server:
+        client = LLMClient(api_url=server.url)
+"""
+import argparse
+import asyncio
+import random
+import socket
+import threading
+import time
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+def create_mock_app(latency_ms: float = 0.0, error_rate: float = 0.0, rate_limit_rate: float = 0.0) -> FastAPI:
+    """Build the mock app; error_rate and rate_limit_rate are the fractions of calls answered with 500 and 429"""
+    mock_app = FastAPI()
+    mock_app.state.stats = {"requests": 0, "errors": 0, "rate_limited": 0, "in_flight": 0, "max_in_flight": 0}
+
+    @mock_app.post("/v1/messages")
+    async def messages(request: Request):
+        stats = mock_app.state.stats
+        stats["requests"] += 1
+        stats["in_flight"] += 1
+        stats["max_in_flight"] = max(stats["max_in_flight"], stats["in_flight"])
+        try:
+            body = await request.json()
+            await asyncio.sleep(latency_ms / 1000.0)
+            roll = random.random()
+            if roll < rate_limit_rate:
+                stats["rate_limited"] += 1
+                return JSONResponse(status_code=429, headers={"retry-after": "0"},
+                                    content={"type": "error", "error": {"type": "rate_limit_error", "message": "Rate limited"}})
+            if roll < rate_limit_rate + error_rate:
+                stats["errors"] += 1
+                return JSONResponse(status_code=500, content={"type": "error", "error": {"type": "api_error", "message": "Injected failure"}})
+
+            prompt = " ".join(
+                message["content"] for message in body.get("messages", []) if isinstance(message.get("content"), str)
+            )
+            text = f"Mock response for prompt: {prompt}"
+            return {
+                "id": f"msg_mock_{stats['requests']}",
+                "type": "message",
+                "role": "assistant",
+                "model": body.get("model", "mock"),
+                "content": [{"type": "text", "text": text}],
+                "stop_reason": "end_turn",
+                "usage": {"input_tokens": len(prompt.split()), "output_tokens": len(text.split())},
+            }
+        finally:
+            stats["in_flight"] -= 1
+
+    @mock_app.get("/stats")
+    async def mock_stats():
+        return mock_app.state.stats
+
+    return mock_app
+
+def free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+class MockLLMServer:
+    """Runs the mock under uvicorn in a background thread; `url` is its Messages endpoint"""
+
+    def __init__(self, port: int = None, **options):
+        self.port = port or free_port()
+        self.app = create_mock_app(**options)
+        config = uvicorn.Config(self.app, host="127.0.0.1", port=self.port, log_level="warning")
+        self.server = uvicorn.Server(config)
+        self.thread = threading.Thread(target=self.server.run, name="mock-llm-server", daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/v1/messages"
+
+    @property
+    def stats(self) -> dict:
+        return dict(self.app.state.stats)
+
+    def __enter__(self):
+        self.thread.start()
+        deadline = time.time() + 30
+        while not self.server.started:
+            if time.time() > deadline or not self.thread.is_alive():
+                raise RuntimeError("Mock LLM server failed to start")
+            time.sleep(0.05)
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join(timeout=10)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a mock LLM Messages API server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency-ms", type=float, default=100.0, help="Delay before each response")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of calls answered with HTTP 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of calls answered with HTTP 429")
+    args = parser.parse_args(argv)
+    mock_app = create_mock_app(args.latency_ms, args.error_rate, args.rate_limit_rate)
+    uvicorn.run(mock_app, host=args.host, port=args.port)
+
+if __name__ == "__main__":
+    main()
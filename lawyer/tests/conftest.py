@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The lawyer modules import each other as top-level modules (`import app`)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
@@ -0,0 +1,64 @@
+from tokenizers import Tokenizer
+from tokenizers.models import WordLevel
+from tokenizers.pre_tokenizers import Whitespace
+from transformers import PreTrainedTokenizerFast
+
+from app import bm25_top_k, split_token_windows
+
+
+def numbered_words(count):
+    return " ".join(f"w{i}" for i in range(count))
+
+
+def test_word_windows_overlap_by_stride():
+    windows = split_token_windows(numbered_words(10), window_tokens=4, stride=2)
+    assert windows == ["w0 w1 w2 w3", "w2 w3 w4 w5", "w4 w5 w6 w7", "w6 w7 w8 w9"]
+
+
+def test_word_windows_cover_the_tail():
+    windows = split_token_windows(numbered_words(11), window_tokens=4, stride=1)
+    assert windows == ["w0 w1 w2 w3", "w3 w4 w5 w6", "w6 w7 w8 w9", "w9 w10"]
+    assert all(len(window.split()) <= 4 for window in windows)
+
+
+def test_short_and_empty_documents():
+    assert split_token_windows("  a short clause  ", window_tokens=4, stride=2) == ["a short clause"]
+    assert split_token_windows("", window_tokens=4, stride=2) == []
+
+
+def test_stride_larger_than_window_still_advances():
+    windows = split_token_windows(numbered_words(3), window_tokens=2, stride=5)
+    assert windows == ["w0 w1", "w1 w2"]
+
+
+def test_fast_tokenizer_windows_keep_original_text():
+    text = "The tenant, per clause 4, shall pay rent monthly."
+    vocab = {"[UNK]": 0}
+    backend = Tokenizer(WordLevel(vocab, unk_token="[UNK]"))
+    backend.pre_tokenizer = Whitespace()
+    tokenizer = PreTrainedTokenizerFast(tokenizer_object=backend, unk_token="[UNK]")
+
+    # Whitespace() splits punctuation into its own tokens: The tenant , per clause 4 , shall pay rent monthly .
+    windows = split_token_windows(text, tokenizer, window_tokens=5, stride=1)
+    assert windows == ["The tenant, per clause", "clause 4, shall pay", "pay rent monthly."]
+
+
+def test_bm25_ranks_matching_passages_first():
+    passages = [
+        "The lease may be terminated with thirty days notice.",
+        "Rent is payable on the first day of each month.",
+        "Late rent attracts interest; unpaid rent may be recovered from the deposit.",
+        "The parties submit to the jurisdiction of Delhi courts.",
+    ]
+    assert bm25_top_k("unpaid rent", passages, 2) == [2, 1]
+    assert bm25_top_k("jurisdiction", passages, 1) == [3]
+
+
+def test_bm25_prefers_shorter_passages_for_equal_term_frequency():
+    passages = ["deposit " + "filler " * 30, "other words", "deposit refund"]
+    assert bm25_top_k("deposit", passages, 3)[:2] == [2, 0]
+
+
+def test_bm25_handles_empty_input_and_large_top_k():
+    assert bm25_top_k("rent", [], 3) == []
+    assert sorted(bm25_top_k("rent", ["rent due", "notice"], 10)) == [0, 1]
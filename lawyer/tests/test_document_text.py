@@ -0,0 +1,66 @@
+import asyncio
+import os
+
+import fitz
+import pytest
+from fastapi import HTTPException
+
+import app
+from document_text import extract_document_text
+
+
+def make_pdf(path, pages):
+    doc = fitz.open()
+    for text in pages:
+        doc.new_page().insert_text((72, 72), text)
+    doc.save(path)
+    doc.close()
+
+
+def test_pdf_text_stops_at_the_page_limit(tmp_path):
+    path = str(tmp_path / "deed.pdf")
+    make_pdf(path, ["Sale deed between the parties", "Schedule of property", "Signatures of witnesses"])
+
+    extracted = extract_document_text(path, max_pages=2, max_bytes=10_000)
+    assert extracted["pages"] == 2
+    assert extracted["page_count"] == 3
+    assert extracted["truncated"]
+    assert "Sale deed between the parties" in extracted["text"]
+    assert "Schedule of property" in extracted["text"]
+    assert "witnesses" not in extracted["text"]
+
+
+def test_text_uploads_are_cut_at_the_byte_limit(tmp_path):
+    path = tmp_path / "notes.txt"
+    path.write_text("Hearing adjourned. " * 10, encoding="utf-8")
+
+    extracted = extract_document_text(str(path), max_pages=10, max_bytes=18)
+    assert extracted == {"text": "Hearing adjourned.", "pages": None, "page_count": None, "truncated": True}
+    assert not extract_document_text(str(path), max_pages=10, max_bytes=10_000)["truncated"]
+
+
+def test_unreadable_uploads_raise_value_error(tmp_path):
+    path = tmp_path / "scan.bin"
+    path.write_bytes(b"\xff\xfe\x00\x81 not a pdf")
+    with pytest.raises(ValueError, match="Could not process document"):
+        extract_document_text(str(path), max_pages=10, max_bytes=10_000)
+
+
+def test_document_pool_is_replaced_after_a_worker_dies(tmp_path):
+    path = tmp_path / "notes.txt"
+    path.write_text("Order reserved.", encoding="utf-8")
+
+    async def run():
+        # A worker exiting mid-task breaks the pool; the retry on a fresh pool dies too
+        with pytest.raises(HTTPException) as raised:
+            await app.run_in_document_pool(os._exit, 1)
+        assert raised.value.status_code == 503
+        assert app.document_process_pool is None
+        return await app.run_in_document_pool(extract_document_text, str(path), 10, 10_000)
+
+    try:
+        assert asyncio.run(run())["text"] == "Order reserved."
+    finally:
+        if app.document_process_pool is not None:
+            app.document_process_pool.shutdown()
+            app.document_process_pool = None
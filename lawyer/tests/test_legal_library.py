@@ -0,0 +1,118 @@
+import os
+import threading
+
+import pytest
+
+import legal_library
+from legal_library import LegalLibrary, make_snippet
+
+CORPUS = {
+    "rent_control.txt": "Rent Control Act\nA landlord shall not recover rent above the standard rent. "
+                        "The tenant may deposit the rent in court if the landlord refuses it.",
+    "contract_act.md": "# Indian Contract Act\nA contract without consideration is void, "
+                       "except a promise to compensate for something done voluntarily.",
+    "bail.txt": "Code of Criminal Procedure\nBail in bailable offences is a right of the accused.",
+    "notes/ignored.docx": "Not an indexed format: rent rent rent",
+}
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    for name, text in CORPUS.items():
+        path = tmp_path / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(text, encoding="utf-8")
+    return tmp_path
+
+
+def test_search_ranks_documents_and_builds_snippets(corpus):
+    library = LegalLibrary.open(str(corpus))
+    try:
+        assert library.stats()["documents"] == 3
+        hits = library.search("landlord rent", top_k=5)
+        assert [hit["path"] for hit in hits] == ["rent_control.txt"]
+        assert hits[0]["title"] == "Rent Control Act"
+        assert "landlord" in hits[0]["snippet"]
+        assert hits[0]["score"] > 0
+
+        hits = library.search("Contract consideration")
+        assert hits[0]["title"] == "Indian Contract Act"
+        assert hits[0]["path"] == "contract_act.md"
+    finally:
+        library.close()
+
+
+def test_search_limits_results_and_ignores_unknown_terms(corpus):
+    library = LegalLibrary.open(str(corpus))
+    try:
+        assert library.search("habeas corpus") == []
+        assert library.search("") == []
+        assert len(library.search("a the of", top_k=1)) == 1
+    finally:
+        library.close()
+
+
+def test_index_is_reused_until_the_corpus_changes(corpus, monkeypatch):
+    builds = []
+    build_index = legal_library.build_index
+    monkeypatch.setattr(legal_library, "build_index", lambda *args: builds.append(args) or build_index(*args))
+
+    LegalLibrary.open(str(corpus)).close()
+    LegalLibrary.open(str(corpus)).close()
+    assert len(builds) == 1
+
+    (corpus / "bail.txt").write_text("Bail Reform\nAnticipatory bail under section 438.", encoding="utf-8")
+    library = LegalLibrary.open(str(corpus))
+    try:
+        assert len(builds) == 2
+        assert library.search("anticipatory")[0]["title"] == "Bail Reform"
+        assert library.search("bailable") == []
+    finally:
+        library.close()
+
+
+def test_concurrent_opens_build_the_index_once(corpus, monkeypatch):
+    builds = []
+    build_index = legal_library.build_index
+    monkeypatch.setattr(legal_library, "build_index", lambda *args: builds.append(args) or build_index(*args))
+    results, errors = [], []
+
+    def open_library():
+        try:
+            library = LegalLibrary.open(str(corpus))
+            results.append(library.stats()["documents"])
+            library.close()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=open_library) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert results == [3] * 6
+    assert len(builds) == 1
+    assert os.path.exists(os.path.join(str(corpus), ".index.lock"))
+
+
+def test_empty_corpus(tmp_path):
+    library = LegalLibrary.open(str(tmp_path))
+    try:
+        assert library.search("rent") == []
+    finally:
+        library.close()
+
+
+def test_snippet_centres_on_the_query_terms_without_cutting_words():
+    text = " ".join(["preamble"] * 40) + " the tenant must pay rent monthly " + " ".join(["schedule"] * 40)
+    snippet = make_snippet(text, ["tenant", "rent"], size=60)
+    assert snippet.startswith("...") and snippet.endswith("...")
+    assert "tenant must pay rent" in snippet
+    for word in snippet.strip(".").split():
+        assert word in {"preamble", "the", "tenant", "must", "pay", "rent", "monthly", "schedule"}
+
+
+def test_snippet_without_matches_starts_at_the_beginning():
+    assert make_snippet("Short judgment text.", ["appeal"], size=100) == "Short judgment text."
+    assert make_snippet("one two three four five", [], size=12) == "one two..."
@@ -0,0 +1,133 @@
+import asyncio
+
+import pytest
+
+import llm_client
+import mock_llm_server
+from llm_client import LLMBusyError, LLMClient, LLMClientError, backoff_delay
+from mock_llm_server import MockLLMServer
+
+
+@pytest.fixture
+def backoffs(monkeypatch):
+    """Record the attempts the client backs off after, without sleeping"""
+    attempts = []
+
+    def no_wait(attempt):
+        attempts.append(attempt)
+        return 0.0
+
+    monkeypatch.setattr(llm_client, "backoff_delay", no_wait)
+    return attempts
+
+
+def scripted_rolls(monkeypatch, *rolls):
+    """Make the mock's error injection deterministic: one roll per request, then always succeed"""
+    remaining = list(rolls)
+    monkeypatch.setattr(mock_llm_server.random, "random", lambda: remaining.pop(0) if remaining else 1.0)
+
+
+def run_client(server, calls, **options):
+    """Run `calls(client)` against the mock and return (result, client stats)"""
+    options.setdefault("rate_limit_rps", 0)
+
+    async def run():
+        client = LLMClient(api_url=server.url, api_key="test", **options)
+        try:
+            return await calls(client), client.stats()
+        finally:
+            await client.aclose()
+
+    return asyncio.run(run())
+
+
+def test_completion_returns_the_reply_text():
+    with MockLLMServer() as server:
+        reply, stats = run_client(server, lambda client: client.complete("Is a verbal lease valid?"))
+    assert reply == "Mock response for prompt: Is a verbal lease valid?"
+    assert stats == {"in_flight": 0, "requests": 1, "retries": 0, "failures": 0, "rejected": 0}
+
+
+def test_server_errors_are_retried_with_backoff_until_success(monkeypatch, backoffs):
+    scripted_rolls(monkeypatch, 0.1, 0.1)  # Two 500s, then a reply
+    with MockLLMServer(error_rate=0.5) as server:
+        reply, stats = run_client(server, lambda client: client.complete("hello"), max_retries=3)
+        assert server.stats["errors"] == 2
+    assert reply.endswith("hello")
+    assert backoffs == [0, 1]
+    assert stats["requests"] == 3
+    assert stats["retries"] == 2
+    assert stats["failures"] == 0
+
+
+def test_rate_limited_calls_honour_retry_after(monkeypatch, backoffs):
+    scripted_rolls(monkeypatch, 0.1)  # One 429 (with retry-after: 0), then a reply
+    with MockLLMServer(rate_limit_rate=0.5) as server:
+        reply, stats = run_client(server, lambda client: client.complete("hello"), max_retries=3)
+        assert server.stats["rate_limited"] == 1
+    assert reply.endswith("hello")
+    assert backoffs == []  # The server's retry-after replaces the client's own backoff
+    assert stats["retries"] == 1
+
+
+@pytest.mark.parametrize("options, status_code", [
+    ({"error_rate": 1.0}, 500),
+    ({"rate_limit_rate": 1.0}, 429),
+])
+def test_persistent_failures_raise_after_max_retries(backoffs, options, status_code):
+    with MockLLMServer(**options) as server:
+        async def calls(client):
+            with pytest.raises(LLMClientError) as raised:
+                await client.complete("hello")
+            return raised.value
+
+        error, stats = run_client(server, calls, max_retries=2)
+        assert server.stats["requests"] == 3
+    assert error.status_code == status_code
+    assert not isinstance(error, LLMBusyError)
+    assert stats["requests"] == 3
+    assert stats["retries"] == 2
+    assert stats["failures"] == 1
+
+
+def test_concurrent_calls_are_capped(backoffs):
+    with MockLLMServer(latency_ms=100) as server:
+        async def calls(client):
+            return await asyncio.gather(*(client.complete(f"question {i}") for i in range(8)))
+
+        replies, stats = run_client(server, calls, max_concurrency=2)
+        assert server.stats["max_in_flight"] == 2
+    assert len(replies) == 8
+    assert stats["requests"] == 8
+    assert stats["in_flight"] == 0
+
+
+def test_calls_waiting_too_long_for_a_slot_are_rejected():
+    with MockLLMServer(latency_ms=300) as server:
+        async def calls(client):
+            return await asyncio.gather(client.complete("first"), client.complete("second"), return_exceptions=True)
+
+        results, stats = run_client(server, calls, max_concurrency=1, queue_timeout=0.05)
+        assert server.stats["requests"] == 1
+    assert results[0].endswith("first")
+    assert isinstance(results[1], LLMBusyError)
+    assert stats["rejected"] == 1
+
+
+def test_rate_limit_spaces_out_calls_beyond_the_burst():
+    with MockLLMServer() as server:
+        async def calls(client):
+            loop = asyncio.get_running_loop()
+            started = loop.time()
+            await asyncio.gather(*(client.complete("hello") for _ in range(4)))
+            return loop.time() - started
+
+        elapsed, _ = run_client(server, calls, rate_limit_rps=20, rate_limit_burst=2)
+    # Two calls go out at once, the other two wait about 1/20 s each for a token
+    assert elapsed >= 0.09
+
+
+def test_backoff_delay_is_bounded():
+    for attempt in range(8):
+        for _ in range(50):
+            assert 0 <= backoff_delay(attempt, base=0.5, cap=4) <= min(4, 0.5 * 2 ** attempt)
@@ -0,0 +1,82 @@
+import gc
+
+import pytest
+import torch
+from tokenizers import ByteLevelBPETokenizer
+from transformers import GPT2Config, GPT2LMHeadModel, PreTrainedTokenizerFast, pipeline
+
+from app import PrefixKVCache, Query, build_chat_prompt, match_prompt_prefix
+
+
+@pytest.fixture(scope="module")
+def tokenizer():
+    bpe = ByteLevelBPETokenizer()
+    bpe.train_from_iterator([build_chat_prompt(Query(question="How do I file an FIR for theft?"))] * 20, vocab_size=400, min_frequency=1)
+    return PreTrainedTokenizerFast(tokenizer_object=bpe._tokenizer, eos_token="</s>", pad_token="</s>")
+
+
+def tiny_model(tokenizer, seed=0):
+    torch.manual_seed(seed)
+    config = GPT2Config(vocab_size=len(tokenizer), n_layer=2, n_head=2, n_embd=32, n_positions=512)
+    return GPT2LMHeadModel(config).eval()
+
+
+@pytest.fixture
+def text_generator(tokenizer):
+    generator = pipeline("text-generation", model=tiny_model(tokenizer), tokenizer=tokenizer)
+    generator.generation_config.do_sample = False
+    return generator
+
+
+PROMPT = build_chat_prompt(Query(question="Can I file an FIR online?"))
+
+
+def test_greedy_output_matches_the_pipeline(text_generator):
+    cache = PrefixKVCache()
+    prefix = match_prompt_prefix(PROMPT)
+    expected = text_generator([PROMPT], max_new_tokens=12)[0][0]["generated_text"]
+
+    assert cache.generate(text_generator, PROMPT, prefix, 12) == [{"generated_text": expected}]
+    assert cache.generate(text_generator, PROMPT, prefix, 12) == [{"generated_text": expected}]
+    assert cache.stats() == {"prefixes": 1, "hits": 1, "misses": 1, "mismatches": 0}
+
+
+def test_decoding_follows_the_pipeline_generation_config(text_generator, tokenizer):
+    text_generator.generation_config.do_sample = True
+    text_generator.generation_config.top_k = 0
+    cache = PrefixKVCache()
+    input_ids = tokenizer(PROMPT, return_tensors="pt").input_ids
+
+    torch.manual_seed(1)
+    sampled = text_generator.model.generate(
+        input_ids, attention_mask=torch.ones_like(input_ids), generation_config=text_generator.generation_config,
+        max_new_tokens=12, pad_token_id=tokenizer.pad_token_id
+    )
+    torch.manual_seed(1)
+    output = cache.generate(text_generator, PROMPT, match_prompt_prefix(PROMPT), 12)
+    assert output == [{"generated_text": PROMPT + tokenizer.decode(sampled[0, input_ids.shape[-1]:])}]
+
+
+def test_states_are_not_reused_for_a_replaced_model(text_generator, tokenizer):
+    cache = PrefixKVCache()
+    prefix = match_prompt_prefix(PROMPT)
+    cache.generate(text_generator, PROMPT, prefix, 4)
+
+    text_generator.model = tiny_model(tokenizer, seed=1)
+    gc.collect()
+    assert cache.stats()["prefixes"] == 0  # The old model's states were dropped with it
+
+    expected = text_generator([PROMPT], max_new_tokens=12)[0][0]["generated_text"]
+    assert cache.generate(text_generator, PROMPT, prefix, 12) == [{"generated_text": expected}]
+    assert cache.stats() == {"prefixes": 1, "hits": 0, "misses": 2, "mismatches": 0}
+
+
+def test_prefix_cut_inside_a_token_falls_back(text_generator):
+    cache = PrefixKVCache()
+    prefix = match_prompt_prefix(PROMPT)
+    assert cache.generate(text_generator, "An unrelated prompt", prefix, 4) is None
+
+    # The prompt has no token boundary after "questi", so a prefix cut there doesn't line up with its tokens
+    cut = prefix[:prefix.index("question:") + len("questi")]
+    assert cache.generate(text_generator, PROMPT, cut, 4) is None
+    assert cache.stats()["mismatches"] == 1
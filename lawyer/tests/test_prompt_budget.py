@@ -0,0 +1,90 @@
+import warnings
+
+from app import (
+    CHAT_RESPONSE_MARKER, NOTICE_TEXT_MARKER, GenerationBudget, NoticeData, Query,
+    build_chat_prompt, build_notice_prompt, fit_prompt
+)
+
+
+class WhitespaceTokenizer:
+    """One token per whitespace-separated word, enough to exercise the budget arithmetic"""
+
+    def __init__(self, model_max_length=None):
+        self.model_max_length = model_max_length
+
+    def encode(self, text, add_special_tokens=True):
+        return text.split()
+
+    def decode(self, ids):
+        return " ".join(ids)
+
+
+def count_tokens(text):
+    return len(text.split())
+
+
+def make_notice(case_details):
+    return NoticeData(
+        recipient_name="Ravi Kumar",
+        recipient_address="12 MG Road, Pune",
+        subject="Unpaid rent",
+        case_details=case_details,
+        your_name="Anita Sharma"
+    )
+
+
+def test_prompt_that_fits_is_unchanged():
+    data = Query(question="Can my landlord keep the deposit?")
+    prompt = build_chat_prompt(data)
+    assert fit_prompt(build_chat_prompt, data, count_tokens(prompt), WhitespaceTokenizer()) == prompt
+    assert fit_prompt(build_chat_prompt, data, 1, None) == prompt
+
+
+def test_long_question_is_truncated_to_the_budget():
+    question = " ".join(f"word{i}" for i in range(500))
+    template_tokens = count_tokens(build_chat_prompt(Query(question="")))
+    limit = template_tokens + 50
+
+    prompt = fit_prompt(build_chat_prompt, Query(question=question), limit, WhitespaceTokenizer())
+    assert count_tokens(prompt) <= limit
+    assert prompt.endswith(CHAT_RESPONSE_MARKER)
+    assert "word0 " in prompt and "word49" in prompt and "word50" not in prompt
+
+
+def test_short_fields_keep_their_text_and_the_long_one_gets_the_rest():
+    case_details = " ".join(f"fact{i}" for i in range(1000))
+    data = make_notice(case_details)
+    limit = count_tokens(build_notice_prompt(make_notice(""))) + 100
+
+    prompt = fit_prompt(build_notice_prompt, data, limit, WhitespaceTokenizer())
+    assert count_tokens(prompt) <= limit
+    assert prompt.endswith(NOTICE_TEXT_MARKER)
+    for value in ("Ravi Kumar", "12 MG Road, Pune", "Unpaid rent", "Anita Sharma", "Legal Notice", "JURISDICTION: India"):
+        assert value in prompt
+    # Every token the short fields leave free goes to the case details
+    assert count_tokens(prompt) == limit
+    assert "fact0 " in prompt and "fact999" not in prompt
+
+
+def test_truncation_emits_no_deprecation_warnings():
+    data = make_notice(" ".join(["fact"] * 500))
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        fit_prompt(build_notice_prompt, data, count_tokens(build_notice_prompt(make_notice(""))) + 10, WhitespaceTokenizer())
+
+
+def test_prompt_limit_leaves_room_for_the_output():
+    budget = GenerationBudget(prompt_tokens=900, max_new_tokens=200)
+    assert budget.prompt_limit(WhitespaceTokenizer(model_max_length=1024)) == 824
+    assert budget.prompt_limit(WhitespaceTokenizer(model_max_length=4096)) == 900
+
+
+def test_prompt_limit_ignores_missing_or_sentinel_context_sizes():
+    budget = GenerationBudget(prompt_tokens=900, max_new_tokens=200)
+    assert budget.prompt_limit(None) == 900
+    assert budget.prompt_limit(WhitespaceTokenizer(model_max_length=int(1e30))) == 900
+    assert GenerationBudget(prompt_tokens=900, max_new_tokens=2000).prompt_limit(WhitespaceTokenizer(model_max_length=1024)) == 1
+
+
+def test_stop_patterns_are_stored_as_a_tuple():
+    assert GenerationBudget(10, 10, [CHAT_RESPONSE_MARKER]).stop_patterns == (CHAT_RESPONSE_MARKER,)
@@ -0,0 +1,138 @@
+import asyncio
+
+import pytest
+
+import app
+from app import ResponseCache
+
+
+def test_concurrent_misses_share_one_computation():
+    cache = ResponseCache("test", ttl=60)
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"answer": "42"}
+
+    async def run():
+        return await asyncio.gather(*(cache.get_or_compute("key", compute) for _ in range(5)))
+
+    results = asyncio.run(run())
+    assert results == [{"answer": "42"}] * 5
+    assert len(calls) == 1
+    stats = cache.stats()
+    assert stats["misses"] == 1
+    assert stats["coalesced"] == 4
+    assert stats["entries"] == 1
+    assert stats["in_flight"] == 0
+
+    # Later callers are served from the cache
+    assert asyncio.run(cache.get_or_compute("key", compute)) == {"answer": "42"}
+    assert len(calls) == 1
+    assert cache.stats()["hits"] == 1
+
+
+def test_exception_reaches_every_waiter_and_is_not_cached():
+    cache = ResponseCache("test", ttl=60)
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        raise ValueError("model failed")
+
+    async def run():
+        return await asyncio.gather(*(cache.get_or_compute("key", compute) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert len(calls) == 1
+    assert all(isinstance(result, ValueError) for result in results)
+    assert cache.stats()["entries"] == 0
+    assert cache.stats()["in_flight"] == 0
+
+    async def succeed():
+        return "ok"
+
+    assert asyncio.run(cache.get_or_compute("key", succeed)) == "ok"
+
+
+def test_waiter_recomputes_when_the_computing_request_is_cancelled():
+    cache = ResponseCache("test", ttl=60)
+    started = []
+
+    async def compute():
+        started.append(1)
+        await asyncio.sleep(0.1)
+        return len(started)
+
+    async def run():
+        first = asyncio.create_task(cache.get_or_compute("key", compute))
+        await asyncio.sleep(0.01)
+        second = asyncio.create_task(cache.get_or_compute("key", compute))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    # The waiter is not cancelled with the original request; it takes over the computation
+    assert asyncio.run(run()) == 2
+    assert cache.stats()["coalesced"] == 1
+    assert cache.stats()["misses"] == 2
+    assert cache.get("key") == (True, 2)
+
+
+def test_cancelled_waiter_does_not_cancel_the_computation():
+    cache = ResponseCache("test", ttl=60)
+
+    async def compute():
+        await asyncio.sleep(0.05)
+        return "value"
+
+    async def run():
+        first = asyncio.create_task(cache.get_or_compute("key", compute))
+        await asyncio.sleep(0.01)
+        second = asyncio.create_task(cache.get_or_compute("key", compute))
+        await asyncio.sleep(0.01)
+        second.cancel()
+        return await first
+
+    assert asyncio.run(run()) == "value"
+    assert cache.get("key") == (True, "value")
+
+
+def test_least_recently_used_entries_are_evicted_by_size():
+    value = "x" * 40  # 42 bytes once serialized
+    cache = ResponseCache("test", ttl=60, max_bytes=100)
+    cache.set("a", value)
+    cache.set("b", value)
+    assert cache.get("a") == (True, value)  # "b" is now the least recently used
+
+    cache.set("c", value)
+    assert cache.get("b") == (False, None)
+    assert cache.get("a") == (True, value)
+    assert cache.get("c") == (True, value)
+    stats = cache.stats()
+    assert stats["evictions"] == 1
+    assert stats["bytes"] == 84
+
+
+def test_oversized_values_are_not_cached():
+    cache = ResponseCache("test", ttl=60, max_bytes=10)
+    cache.set("key", "x" * 100)
+    assert cache.get("key") == (False, None)
+    assert cache.stats()["bytes"] == 0
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(app.time, "monotonic", lambda: now[0])
+    cache = ResponseCache("test", ttl=10)
+    cache.set("key", "value")
+    assert cache.get("key") == (True, "value")
+
+    now[0] += 10
+    assert cache.get("key") == (False, None)
+    assert cache.stats()["entries"] == 0
+    assert cache.stats()["bytes"] == 0
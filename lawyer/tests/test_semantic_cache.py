@@ -0,0 +1,122 @@
+import numpy as np
+import pytest
+
+import app
+from app import SemanticCache
+
+VOCABULARY = ["deposit", "landlord", "refund", "bail", "police", "divorce"]
+
+
+def bag_of_words(question, vocabulary=VOCABULARY):
+    """A unit vector over a few keywords, standing in for the sentence embedder"""
+    words = question.lower().replace("?", "").split()
+    vector = np.array([words.count(term) for term in vocabulary], dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(app.time, "monotonic", lambda: now[0])
+    return now
+
+
+def make_cache(**options):
+    settings = {"name": "test", "threshold": 0.9, "max_entries": 8, "ttl": 60}
+    settings.update(options)
+    cache = SemanticCache(**settings)
+    cache.embed = bag_of_words
+    return cache
+
+
+def remember(cache, question, value):
+    embedding, cached = cache.lookup(question)
+    assert cached is None
+    cache.add(question, embedding, value)
+
+
+def test_rephrased_question_hits_and_unrelated_one_misses():
+    cache = make_cache()
+    remember(cache, "Will my landlord refund the deposit?", {"response": "Yes"})
+
+    _, value = cache.lookup("Landlord refund of deposit")
+    assert value == {"response": "Yes"}
+    embedding, value = cache.lookup("How do I get bail from the police?")
+    assert value is None
+    assert embedding is not None
+
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 2
+    assert stats["entries"] == 1
+
+
+def test_best_match_above_threshold_wins():
+    cache = make_cache(threshold=0.5)
+    remember(cache, "deposit landlord", {"response": "landlord"})
+    remember(cache, "deposit refund", {"response": "refund"})
+    assert cache.lookup("deposit refund refund")[1] == {"response": "refund"}
+
+
+def test_entries_expire(clock):
+    cache = make_cache(ttl=10)
+    remember(cache, "bail police", {"response": "Apply to the magistrate"})
+    assert cache.lookup("bail police")[1] is not None
+
+    clock[0] += 10
+    assert cache.lookup("bail police")[1] is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_least_recently_used_entry_is_replaced_when_full(clock):
+    cache = make_cache(max_entries=2)
+    remember(cache, "deposit", {"response": "deposit"})
+    clock[0] += 1
+    remember(cache, "bail", {"response": "bail"})
+    clock[0] += 1
+    assert cache.lookup("deposit")[1] is not None  # "bail" is now the least recently used
+
+    clock[0] += 1
+    remember(cache, "divorce", {"response": "divorce"})
+    assert cache.lookup("bail")[1] is None
+    assert cache.lookup("deposit")[1] == {"response": "deposit"}
+    assert cache.lookup("divorce")[1] == {"response": "divorce"}
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["entries"] == 2
+
+
+def test_expired_entries_are_replaced_before_live_ones(clock):
+    cache = make_cache(max_entries=2, ttl=10)
+    remember(cache, "deposit", {"response": "deposit"})
+    clock[0] += 5
+    remember(cache, "bail", {"response": "bail"})
+    clock[0] += 6  # "deposit" has expired, "bail" has not
+    cache.lookup("police")  # A miss, so neither entry is touched
+
+    remember(cache, "divorce", {"response": "divorce"})
+    assert cache.lookup("bail")[1] == {"response": "bail"}
+
+
+def test_embedding_failures_skip_the_cache():
+    cache = make_cache()
+
+    def broken(question):
+        raise RuntimeError("embedder unavailable")
+
+    cache.embed = broken
+    assert cache.lookup("deposit") == (None, None)
+    cache.embed = lambda question: None
+    assert cache.lookup("deposit") == (None, None)
+
+
+def test_new_embedding_width_starts_a_fresh_cache():
+    cache = make_cache()
+    remember(cache, "deposit", {"response": "old model"})
+
+    cache.embed = lambda question: bag_of_words(question, VOCABULARY + ["appeal"])
+    embedding, value = cache.lookup("deposit")
+    assert value is None
+    cache.add("deposit", embedding, {"response": "new model"})
+    assert cache.lookup("deposit")[1] == {"response": "new model"}
+    assert cache.stats()["entries"] == 1